@@ -1,12 +1,12 @@
-from typing import List, Dict, Tuple
-import ctypes
+from typing import List, Dict
 import glm
-from formats import gltf_loader, buffer_types
+from formats import gltf_loader
 from formats.transform import Transform
 from formats.node import Node
 from humanoid.humanoid_bones import HumanoidBone
 from scene.mesh_renderer import MeshRenderer
 from .hierarchy import Hierarchy
+from . import mesh_builder
 
 
 CESIUMMAN_HUMANOID_MAP = {
@@ -32,7 +32,10 @@ CESIUMMAN_HUMANOID_MAP = {
 }
 
 
-def build(gltf: gltf_loader.Gltf) -> Hierarchy:
+def build(gltf: gltf_loader.Gltf, *, skeleton_only: bool = False) -> Hierarchy:
+    '''
+    skeleton_only: mesh を作らずに node だけ
+    '''
 
     node_humanoid_map: Dict[Node, HumanoidBone] = {}
     vrm = None
@@ -55,65 +58,8 @@ def build(gltf: gltf_loader.Gltf) -> Hierarchy:
             node.name, HumanoidBone.unknown)
 
     meshes = []
-    for gltf_mesh in gltf.gltf.get('meshes', []):
-        vertices_len, indices_len = gltf_loader.vertices_indices_len(
-            gltf.gltf, gltf_mesh)
-
-        # merge submesh
-        vertices = (buffer_types.Vertex4BoneWeights * vertices_len)()
-        indices = (ctypes.c_uint16 * indices_len)()
-        vertex_offset = 0
-        index_offset = 0
-
-        for prim in gltf_mesh['primitives']:
-            # merge indices
-            indices_accessor = prim.get('indices')
-            assert isinstance(indices_accessor, int)
-            sub_indices = gltf.load_accessor(indices_accessor)
-
-            for i, src in enumerate(sub_indices):
-                indices[i+index_offset] = src
-            index_offset += len(sub_indices)
-
-            # merge vertices
-            attributes = [(k, gltf.load_accessor(
-                v)) for k, v in prim.get('attributes', {}).items()]
-
-            keys = {k: i for i, (k, v) in enumerate(attributes)}
-            position_ref = keys['POSITION']
-            normal_ref = keys['NORMAL']
-            uv_ref = keys['TEXCOORD_0']
-            bone_ref = keys.get('JOINTS_0')
-            weight_ref = keys.get('WEIGHTS_0')
-            values = [v for k, v, in attributes]
-
-            for i, src in enumerate(zip(*values)):
-                dst = vertices[vertex_offset]
-                if vrm == 0:
-                    dst.position = src[position_ref].rotate_y180()
-                    dst.normal = src[normal_ref].rotate_y180()
-                else:
-                    dst.position = src[position_ref]
-                    dst.normal = src[normal_ref]
-                dst.uv = src[uv_ref]
-
-                if isinstance(bone_ref, int) and isinstance(weight_ref, int):
-                    bones = src[bone_ref]
-                    weights = src[weight_ref]
-
-                    dst.bone = buffer_types.Float4(
-                        bones.x, bones.y, bones.z, bones.w)
-                    dst.weight = weights
-                else:
-                    # 0 番に identity 行列を入れて rendering する
-                    dst.bone = buffer_types.Float4(0, 0, 0, 0)
-                    dst.weight = buffer_types.Float4(1, 1, 1, 1)
-
-                vertex_offset += 1
-
-        assert vertex_offset == len(vertices)
-        assert index_offset == len(indices)
-        meshes.append((vertices, indices))
+    for gltf_mesh in ([] if skeleton_only else gltf.gltf.get('meshes', [])):
+        meshes.append(mesh_builder.merge_primitives(gltf, gltf_mesh, vrm))
 
     # build hierarchy
     nodes: List[Node] = []
@@ -133,6 +79,8 @@ def build(gltf: gltf_loader.Gltf) -> Hierarchy:
             child = nodes[child_index]
             node.add_child(child)
 
+        if skeleton_only:
+            continue
         mesh_index = gltf_node.get('mesh')
         skin_index = gltf_node.get('skin')
         if isinstance(mesh_index, int):
@@ -143,16 +91,12 @@ def build(gltf: gltf_loader.Gltf) -> Hierarchy:
                     joints = [nodes[joint]
                               for joint in gltf_skin['joints']]
 
-                    bind_index = gltf_skin.get('inverseBindMatrices')
-                    if bind_index:
-                        m = gltf.load_accessor(bind_index)
-                        # for m, j in zip(m, joints):
-                        #     j.inverse_bind_matrix = glm.transpose(glm.mat4(
-                        #         *m
-                        #     ))
+                    inverse_bind_matrices = mesh_builder.load_inverse_bind_matrices(
+                        gltf, gltf_skin, vrm)
 
                     node.renderer = MeshRenderer("assets/shader",
-                                                 vertices, indices, joints=joints)
+                                                 vertices, indices, joints=joints,
+                                                 inverse_bind_matrices=inverse_bind_matrices)
                 else:
                     node.renderer = MeshRenderer("assets/shader",
                                                  vertices, indices)
@@ -2,6 +2,7 @@ from typing import Optional, Dict
 import glm
 from glglue.camera import Camera
 from formats.node import Node
+from formats.node_array import NodeArray
 from humanoid.bone import (
     Skeleton,
     Joint,
@@ -17,8 +18,10 @@ from humanoid.humanoid_bones import HumanoidBone
 class Hierarchy:
     def __init__(self, root: Node, node_humanoid_map: Dict[Node, HumanoidBone]) -> None:
         self.root = root
-        self.root.calc_world_matrix(glm.mat4())
-        self.root.calc_bind_matrix(glm.mat4())
+        # 毎 frame の world 行列は配列でまとめて計算する
+        self.nodes = NodeArray(root)
+        self.nodes.calc_world_matrices()
+        self.nodes.calc_bind_matrices()
         self.node_humanoid_map = node_humanoid_map
         self.humanoid_node_map: Dict[HumanoidBone, Node] = {
             v: k for k, v in self.node_humanoid_map.items()
@@ -28,6 +31,8 @@ class Hierarchy:
             for node, _ in self.root.traverse_node_and_parent()
             if node.renderer
         ]
+        for _, renderer in self.renders:
+            renderer.set_node_array(self.nodes)
 
     def __getitem__(self, key: HumanoidBone) -> Node:
         return self.humanoid_node_map[key]
@@ -35,6 +40,12 @@ class Hierarchy:
     def get(self, key: HumanoidBone) -> Optional[Node]:
         return self.humanoid_node_map.get(key)
 
+    def calc_world_matrix(self) -> bool:
+        '''
+        pose が変わった node の subtree だけ計算する。変化が無ければ False
+        '''
+        return self.nodes.calc_world_matrices()
+
     def render(self, camera: Camera):
         for node, renderer in self.renders:
             renderer.render(camera, node)
@@ -42,7 +53,7 @@ class Hierarchy:
     def to_skeleton(self) -> Skeleton:
         node_humanoid_map = self.node_humanoid_map
         root = self.root
-        root.calc_world_matrix(glm.mat4())
+        self.calc_world_matrix()
         # root.print_tree()
 
         def node_to_joint(node: Node, parent: Optional[Joint] = None) -> Joint:
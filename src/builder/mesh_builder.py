@@ -0,0 +1,153 @@
+'''
+MeshRenderer に渡す頂点と index を作る
+
+OpenGL に依存しないので renderer 無しで test できる
+'''
+from typing import Tuple, Optional
+import ctypes
+import numpy
+from formats import gltf_loader, pmd_loader, pmx_loader, buffer_types
+
+
+def vertex_array(vertices) -> numpy.ndarray:
+    '''
+    Vertex4BoneWeights の ctypes 配列を (n, 16) の float32 として見る
+    '''
+    return numpy.frombuffer(vertices, dtype=numpy.float32).reshape(len(vertices), -1)
+
+
+def reverse_z_vertices(vertices):
+    array = vertex_array(vertices)
+    # position.z, normal.z
+    array[:, 2] *= -1
+    array[:, 5] *= -1
+
+
+def flip_winding(indices):
+    '''
+    三角形の 2 番目と 3 番目を入れ替える。indices の memory を直接書き換える
+    '''
+    triangles = numpy.ctypeslib.as_array(indices).reshape(-1, 3)
+    triangles[:, [1, 2]] = triangles[:, [2, 1]]
+
+
+def copy_array(array: ctypes.Array) -> ctypes.Array:
+    return type(array).from_buffer_copy(array)
+
+
+def pmd_mesh(pmd: pmd_loader.Pmd) -> Tuple[ctypes.Array, ctypes.Array]:
+    '''
+    pmd の頂点を Vertex4BoneWeights にして reverse z する。
+    pmd は書き換えないので何度 build しても同じ結果になる
+    '''
+    src = pmd.vertex_array
+    vertices = (buffer_types.Vertex4BoneWeights * len(src))()
+    dst = vertex_array(vertices)
+    dst[:, 0:3] = src['position']
+    dst[:, 3:6] = src['normal']
+    dst[:, 6:8] = src['uv']
+    dst[:, 8] = src['bone0']
+    dst[:, 9] = src['bone1']
+    w = src['weight'] * 0.01
+    dst[:, 12] = w
+    dst[:, 13] = 1 - w
+
+    reverse_z_vertices(vertices)
+    indices = copy_array(pmd.indices)
+    flip_winding(indices)
+    return vertices, indices
+
+
+def pmx_mesh(pmx: pmx_loader.Pmx) -> Tuple[ctypes.Array, ctypes.Array]:
+    '''
+    pmx の buffer を複製して reverse z する。
+    pmx は書き換えないので何度 build しても同じ結果になる
+    '''
+    vertices = copy_array(pmx.vertices)
+    indices = copy_array(pmx.indices)
+    reverse_z_vertices(vertices)
+    flip_winding(indices)
+    return vertices, indices
+
+
+def merge_primitives(gltf: gltf_loader.Gltf, gltf_mesh, vrm: Optional[int]) -> Tuple[ctypes.Array, ctypes.Array]:
+    '''
+    primitive の頂点と index を一つにまとめる。
+
+    index は 65536 頂点までは uint16, 超えたら uint32
+    '''
+    positions = []
+    normals = []
+    uvs = []
+    bones = []
+    weights = []
+    sub_indices = []
+    vertex_count = 0
+    for prim in gltf_mesh['primitives']:
+        attributes = prim.get('attributes', {})
+        position = gltf.load_accessor(attributes['POSITION'])
+        count = len(position)
+        positions.append(position)
+
+        def get_attribute(key: str, size: int, default: float) -> numpy.ndarray:
+            accessor = attributes.get(key)
+            if isinstance(accessor, int):
+                return gltf.load_accessor(accessor)
+            return numpy.full((count, size), default, dtype=numpy.float32)
+
+        normals.append(get_attribute('NORMAL', 3, 0))
+        uvs.append(get_attribute('TEXCOORD_0', 2, 0))
+        if 'JOINTS_0' in attributes and 'WEIGHTS_0' in attributes:
+            bones.append(get_attribute('JOINTS_0', 4, 0))
+            weights.append(get_attribute('WEIGHTS_0', 4, 0))
+        else:
+            # 0 番に identity 行列を入れて rendering する
+            bones.append(numpy.zeros((count, 4), dtype=numpy.float32))
+            weights.append(numpy.ones((count, 4), dtype=numpy.float32))
+
+        indices_accessor = prim.get('indices')
+        if isinstance(indices_accessor, int):
+            indices = gltf.load_accessor(indices_accessor).astype(numpy.uint32)
+        else:
+            indices = numpy.arange(count, dtype=numpy.uint32)
+        # primitive の先頭の頂点にずらす
+        sub_indices.append(indices + vertex_count)
+        vertex_count += count
+
+    vertices = (buffer_types.Vertex4BoneWeights * vertex_count)()
+    dst = numpy.frombuffer(vertices, dtype=numpy.float32).reshape(
+        vertex_count, -1)
+    if vertex_count:
+        dst[:, 0:3] = numpy.concatenate(positions)
+        dst[:, 3:6] = numpy.concatenate(normals)
+        dst[:, 6:8] = numpy.concatenate(uvs)
+        dst[:, 8:12] = numpy.concatenate(bones)
+        dst[:, 12:16] = numpy.concatenate(weights)
+    if vrm == 0:
+        # vrm-0.x: rotate y180。position と normal の x, z
+        dst[:, [0, 2, 3, 5]] *= -1
+
+    index_array = numpy.concatenate(sub_indices) if sub_indices else numpy.zeros(
+        0, dtype=numpy.uint32)
+    index_type = ctypes.c_uint16 if vertex_count <= 65536 else ctypes.c_uint32
+    indices = (index_type * len(index_array))()
+    numpy.ctypeslib.as_array(indices)[:] = index_array
+    return vertices, indices
+
+
+def load_inverse_bind_matrices(gltf: gltf_loader.Gltf, gltf_skin, vrm: Optional[int]) -> Optional[numpy.ndarray]:
+    '''
+    skin の inverseBindMatrices を (J, 4, 4) の float32 で返す。
+
+    列優先の mat4 なので MeshRenderer の配列と同じ並び
+    '''
+    bind_index = gltf_skin.get('inverseBindMatrices')
+    if not isinstance(bind_index, int):
+        return None
+    inverse_bind_matrices = gltf.load_accessor(
+        bind_index).astype(numpy.float32)
+    if vrm == 0:
+        # vrm-0.x: rotate y180。inv(bind) を Y180 で挟む
+        y180 = numpy.array([-1, 1, -1, 1], dtype=numpy.float32)
+        inverse_bind_matrices *= y180[None, :, None] * y180[None, None, :]
+    return inverse_bind_matrices
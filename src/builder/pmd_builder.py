@@ -1,18 +1,32 @@
 from typing import List, Dict
 import glm
-from ..formats import pmd_loader, bytesreader, buffer_types
-from ..formats.transform import Transform
-from ..formats.node import Node
-from ..humanoid.humanoid_bones import HumanoidBone
-from ..scene.mesh_renderer import MeshRenderer
+import numpy
+from formats import pmd_loader, bytesreader
+from formats.transform import Transform
+from formats.node import Node
+from humanoid.humanoid_bones import HumanoidBone
+from humanoid import batch_math
+from scene.mesh_renderer import MeshRenderer
 from .hierarchy import Hierarchy
+from . import mesh_builder
 
 
-def reverse_z(v: glm.vec3) -> glm.vec3:
-    return glm.vec3(v.x, v.y, -v.z)
+def get_local_positions(positions: numpy.ndarray, parents: numpy.ndarray) -> numpy.ndarray:
+    '''
+    bone の model 座標 (n, 3) を親からの相対位置にして reverse_z する
 
+    parents: 親の index。root は負
+    '''
+    has_parent = parents >= 0
+    local = numpy.array(positions, dtype=numpy.float32)
+    local[has_parent] -= local[parents[has_parent]]
+    return batch_math.reverse_z(local)[0]
 
-def build(pmd: pmd_loader.Pmd) -> Hierarchy:
+
+def build(pmd: pmd_loader.Pmd, *, skeleton_only: bool = False) -> Hierarchy:
+    '''
+    skeleton_only: mesh を作らずに node だけ
+    '''
     root = Node('__root__', Transform.identity())
     node_humanoid_map: Dict[Node, HumanoidBone] = {}
 
@@ -26,43 +40,22 @@ def build(pmd: pmd_loader.Pmd) -> Hierarchy:
         node.has_weighted_vertices = i in pmd.deform_bones
         nodes.append(node)
 
-    for i, (node, bone) in enumerate(zip(nodes, pmd.bones)):
-        t = glm.vec3(*bone.position)
-        if bone.parent_index == 65535:
-            node.init_trs = node.init_trs._replace(translation=reverse_z(t))
+    parents = pmd.bone_array['parent_index'].astype(numpy.int32)
+    parents[parents == 65535] = -1
+    positions = get_local_positions(pmd.bone_array['position'], parents)
+    for node, parent, (x, y, z) in zip(nodes, parents.tolist(), positions.tolist()):
+        node.init_trs = node.init_trs._replace(translation=glm.vec3(x, y, z))
+        if parent < 0:
             root.add_child(node)
         else:
-            parent = nodes[bone.parent_index]
-            t -= glm.vec3(*pmd.bones[bone.parent_index].position)
-            node.init_trs = node.init_trs._replace(translation=reverse_z(t))
-            parent.add_child(node)
-
-    # setup vertex and skinning
-    vertices = (buffer_types.Vertex4BoneWeights * len(pmd.vertices))()
-    # skining_info = (SkinningInfo * len(pmd.vertices))()
-    for i, v in enumerate(pmd.vertices):
-        vv = v.render
-        o = v.option
-        dst = vertices[i]
-        dst.position = vv.position.reverse_z()
-        dst.normal = vv.normal.reverse_z()
-        dst.uv = vv.uv
-        dst.bone = buffer_types.Float4(o.bone0, o.bone1, 0, 0)
-        w = o.weight * 0.01
-        dst.weight = buffer_types.Float4(w, 1-w, 0, 0)
+            nodes[parent].add_child(node)
 
-        # skining_info[i] = SkinningInfo(
-        #     Float3(vv.position.x, vv.position.y, vv.position.z),
-        #     UShort4(o.bone0, o.bone1, 0, 0),
-        #     Float4(w, 1-w, 0, 0))
+    if skeleton_only:
+        return Hierarchy(root, node_humanoid_map)
 
-    for i in range(0, len(pmd.indices), 3):
-        i0, i1, i2 = pmd.indices[i:i+3]
-        pmd.indices[i+0] = i0
-        pmd.indices[i+1] = i2
-        pmd.indices[i+2] = i1
+    vertices, indices = mesh_builder.pmd_mesh(pmd)
 
     # set renderer
     root.renderer = MeshRenderer("assets/shader",
-                                 vertices, pmd.indices, joints=nodes)
+                                 vertices, indices, joints=nodes)
     return Hierarchy(root, node_humanoid_map)
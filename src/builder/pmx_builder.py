@@ -1,15 +1,21 @@
 from typing import List, Dict
 import glm
-from ..formats import pmx_loader, pmd_loader
-from ..formats.transform import Transform
-from ..formats.node import Node
-from ..humanoid.humanoid_bones import HumanoidBone
-from ..scene.mesh_renderer import MeshRenderer
-from .pmd_builder import reverse_z
+import numpy
+from formats import pmx_loader, pmd_loader
+from formats.transform import Transform
+from formats.node import Node
+from humanoid.humanoid_bones import HumanoidBone
+from humanoid import batch_math
+from scene.mesh_renderer import MeshRenderer
+from .pmd_builder import get_local_positions
 from .hierarchy import Hierarchy
+from . import mesh_builder
 
 
-def build(pmx: pmx_loader.Pmx) -> Hierarchy:
+def build(pmx: pmx_loader.Pmx, *, skeleton_only: bool = False) -> Hierarchy:
+    '''
+    skeleton_only: mesh を作らずに node だけ
+    '''
     root = Node('__root__',  Transform.identity())
     node_humanoid_map: Dict[Node, HumanoidBone] = {}
     bone_map: Dict[HumanoidBone, Node] = {}
@@ -27,21 +33,23 @@ def build(pmx: pmx_loader.Pmx) -> Hierarchy:
         node.has_weighted_vertices = i in pmx.deform_bones
         nodes.append(node)
 
-    for i, (node, bone) in enumerate(zip(nodes, pmx.bones)):
-        assert isinstance(bone, pmx_loader.Bone)
-        t = glm.vec3(*bone.position)
-        if bone.parent_index == -1:
-            node.init_trs = node.init_trs._replace(translation=reverse_z(t))
+    parents = numpy.array(
+        [bone.parent_index for bone in pmx.bones], dtype=numpy.int32)
+    positions = get_local_positions(
+        [tuple(bone.position) for bone in pmx.bones], parents)
+    tail_positions, _ = batch_math.reverse_z(numpy.array(
+        [tuple(bone.tail_position) for bone in pmx.bones if bone.tail_position], dtype=numpy.float32).reshape(-1, 3))
+    tails = iter(tail_positions.tolist())
+    for node, bone, parent, (x, y, z) in zip(nodes, pmx.bones, parents.tolist(), positions.tolist()):
+        node.init_trs = node.init_trs._replace(translation=glm.vec3(x, y, z))
+        if parent < 0:
             root.add_child(node)
         else:
-            t -= glm.vec3(*pmx.bones[bone.parent_index].position)
-            node.init_trs = node.init_trs._replace(translation=reverse_z(t))
-            parent = nodes[bone.parent_index]
-            parent.add_child(node)
+            nodes[parent].add_child(node)
 
         if bone.tail_position:
             node.add_child(
-                Node(f'{bone.name_ja}先', Transform(reverse_z(glm.vec3(*bone.tail_position)), glm.quat(), glm.vec3(1))))
+                Node(f'{bone.name_ja}先', Transform(glm.vec3(*next(tails)), glm.quat(), glm.vec3(1))))
 
     leftUpperLegD = root.find(lambda x: x.name == '左足D')
     leftLowerLegD = root.find(lambda x: x.name == '左ひざD')
@@ -68,19 +76,13 @@ def build(pmx: pmx_loader.Pmx) -> Hierarchy:
     #     replace(HumanoidBone.rightFoot, rightFootD, rightToesD)
     #     replace(HumanoidBone.rightToes, rightToesD, rightTip)
 
-    # reverse z
-    for i, v in enumerate(pmx.vertices):
-        v.position = v.position.reverse_z()
-        v.normal = v.normal.reverse_z()
+    if skeleton_only:
+        return Hierarchy(root, node_humanoid_map)
 
-    for i in range(0, len(pmx.indices), 3):
-        i0, i1, i2 = pmx.indices[i:i+3]
-        pmx.indices[i+0] = i0
-        pmx.indices[i+1] = i2
-        pmx.indices[i+2] = i1
+    vertices, indices = mesh_builder.pmx_mesh(pmx)
 
     # set renderer
     root.renderer = MeshRenderer("assets/shader",
-                                 pmx.vertices, pmx.indices, joints=nodes)
+                                 vertices, indices, joints=nodes)
 
     return Hierarchy(root, node_humanoid_map)
@@ -0,0 +1,98 @@
+'''
+MMD の補間曲線
+
+P0=(0, 0), P1=(x1, y1), P2=(x2, y2), P3=(1, 1) の 3次ベジェ。
+
+x(t) = 3(1-t)^2t x1 + 3(1-t)t^2 x2 + t^3
+
+x から t を解いて y(t) を得る。
+'''
+from typing import Union
+import numpy
+
+# x(t) の lookup table の分割数
+LUT_SIZE = 16
+NEWTON_ITERATIONS = 4
+EPSILON = 1e-6
+
+
+def _bezier(p1, p2, t):
+    s = 1 - t
+    return 3 * s * s * t * p1 + 3 * s * t * t * p2 + t * t * t
+
+
+def _bezier_derivative(p1, p2, t):
+    s = 1 - t
+    return 3 * s * s * p1 + 6 * s * t * (p2 - p1) + 3 * t * t * (1 - p2)
+
+
+def decode_vmd_interpolation(interpolation: numpy.ndarray) -> numpy.ndarray:
+    '''
+    (N, 64) の補間パラメータから (N, 4, 4) の制御点を得る。
+
+    channel: x, y, z, rotation
+    control point: x1, y1, x2, y2
+    '''
+    raw = interpolation.reshape(-1, 64)[:, 0:16]
+    # [x1(ch0..3), y1(ch0..3), x2(ch0..3), y2(ch0..3)] => [ch][x1, y1, x2, y2]
+    return numpy.ascontiguousarray(raw.reshape(-1, 4, 4).transpose(0, 2, 1))
+
+
+class BezierTable:
+    '''
+    重複を除いた制御点と x(t) の lookup table
+    '''
+
+    def __init__(self, control_points: numpy.ndarray) -> None:
+        '''
+        control_points: (..., 4) uint8 の x1, y1, x2, y2 (0 ~ 127)
+        '''
+        shape = control_points.shape[:-1]
+        # 4byte を uint32 とみなして重複を除く
+        packed = numpy.ascontiguousarray(
+            control_points, dtype=numpy.uint8).view(numpy.uint32)
+        unique, inverse = numpy.unique(packed, return_inverse=True)
+        self.control_points = unique.view(numpy.uint8).reshape(
+            -1, 4).astype(numpy.float32) / 127.0
+        # 各キーの曲線番号
+        self.indices = inverse.reshape(shape).astype(numpy.int32)
+        x1 = self.control_points[:, 0:1]
+        x2 = self.control_points[:, 2:3]
+        self.lut = _bezier(x1, x2, numpy.linspace(
+            0, 1, LUT_SIZE+1, dtype=numpy.float32))
+        self.is_linear = (self.control_points[:, 0] == self.control_points[:, 1]) & (
+            self.control_points[:, 2] == self.control_points[:, 3])
+
+    def evaluate(self, curve: Union[int, numpy.ndarray], x: Union[float, numpy.ndarray]) -> numpy.ndarray:
+        '''
+        曲線 curve の x における y
+        '''
+        curve = numpy.asarray(curve)
+        x = numpy.clip(numpy.broadcast_to(
+            numpy.asarray(x, dtype=numpy.float32), curve.shape), 0, 1)
+        x1, y1, x2, y2 = numpy.moveaxis(self.control_points[curve], -1, 0)
+
+        # lookup table で初期値の区間を得る
+        lut = self.lut[curve]
+        i = numpy.clip(numpy.count_nonzero(
+            lut <= x[..., None], axis=-1) - 1, 0, LUT_SIZE-1)
+        lo = i / LUT_SIZE
+        hi = (i + 1) / LUT_SIZE
+        x_lo = numpy.take_along_axis(lut, i[..., None], axis=-1)[..., 0]
+        x_hi = numpy.take_along_axis(lut, i[..., None]+1, axis=-1)[..., 0]
+        span = x_hi - x_lo
+        t = lo + (hi - lo) * numpy.where(span > EPSILON,
+                                         (x - x_lo) / numpy.where(span > EPSILON, span, 1), 0)
+
+        # newton 法。区間を外れたら二分法
+        for _ in range(NEWTON_ITERATIONS):
+            error = _bezier(x1, x2, t) - x
+            hi = numpy.where(error > 0, t, hi)
+            lo = numpy.where(error > 0, lo, t)
+            d = _bezier_derivative(x1, x2, t)
+            newton = t - error / numpy.where(d > EPSILON, d, 1)
+            t = numpy.where(numpy.abs(error) < EPSILON, t,
+                            numpy.where((d > EPSILON) & (newton > lo) & (newton < hi),
+                                        newton, (lo + hi) * 0.5))
+
+        return numpy.where(self.is_linear[curve], x, _bezier(y1, y2, t)).astype(numpy.float32)
@@ -1,89 +1,64 @@
-from typing import Optional, List, Iterable
-import math
-from enum import Enum, auto
+from typing import Optional, List, Iterable, Dict, Tuple
 import glm
-from ...humanoid.humanoid_bones import HumanoidBone
-from ..transform import Transform
+import numpy
+from humanoid.humanoid_bones import HumanoidBone
+from humanoid import batch_math
 
 
-def to_radian(degree):
-    return degree / 180.0 * math.pi
+class BvhException(RuntimeError):
+    pass
 
 
-class Channels(Enum):
-    # ZXY
-    PosXYZ_RotZXY = auto()
-    RotZXY = auto()
-    # ZYX
-    PosXYZ_RotZYX = auto()
-    RotZYX = auto()
+def euler_to_quaternion(degrees: numpy.ndarray, order: str) -> numpy.ndarray:
+    '''
+    (..., 3) の degree から (..., 4) の quaternion(x, y, z, w)
+
+    order は channel の順。ZXY なら qz * qx * qy
+    '''
+    return batch_math.from_euler(numpy.radians(numpy.asarray(degrees, dtype=numpy.float64)), order)
+
+
+class Channels:
+    '''
+    CHANNELS の並び。
+
+    position, rotation とも何個でもよい。
+    無い position の軸は 0、rotation は channel の順に掛けて無ければ identity。
+    '''
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self.names = tuple(names)
+        position: Dict[int, int] = {}
+        rotation: List[Tuple[str, int]] = []
+        for i, name in enumerate(self.names):
+            match name:
+                case 'Xposition' | 'Yposition' | 'Zposition':
+                    position['XYZ'.index(name[0])] = i
+                case 'Xrotation' | 'Yrotation' | 'Zrotation':
+                    rotation.append((name[0], i))
+                case _:
+                    raise BvhException(
+                        f'unknown channel {name}: {" ".join(self.names)}')
+        # position の軸(X: 0, Y: 1, Z: 2)と channel の位置
+        self.position_axes = tuple(sorted(position))
+        self.position_index = tuple(position[axis]
+                                    for axis in self.position_axes)
+        # 回転順 'ZXY' など
+        self.order = ''.join(axis for axis, _ in rotation)
+        # order 順の channel の位置
+        self.rotation_index = tuple(i for _, i in rotation)
+
+    def __repr__(self) -> str:
+        return f'Channels({" ".join(self.names)})'
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Channels) and self.names == other.names
+
+    def __hash__(self) -> int:
+        return hash(self.names)
 
     def count(self) -> int:
-        match self:
-            case (Channels.PosXYZ_RotZXY | Channels.PosXYZ_RotZYX):
-                return 6
-            case (Channels.RotZXY | Channels.RotZYX):
-                return 3
-            case _:
-                return 0
-
-    def get_matrix(self, it) -> glm.mat4:
-        match self:
-            # zxy
-            case Channels.PosXYZ_RotZXY:
-                t = glm.translate(glm.vec3(next(it), next(it), next(it)))
-                z = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 0, 1))
-                x = glm.angleAxis(to_radian(next(it)), glm.vec3(1, 0, 0))
-                y = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 1, 0))
-                return t * glm.mat4(z * x * y)
-            case Channels.RotZXY:
-                z = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 0, 1))
-                x = glm.angleAxis(to_radian(next(it)), glm.vec3(1, 0, 0))
-                y = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 1, 0))
-                return glm.mat4(z * x * y)
-            # zyx
-            case Channels.PosXYZ_RotZYX:
-                t = glm.translate(glm.vec3(next(it), next(it), next(it)))
-                z = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 0, 1))
-                y = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 1, 0))
-                x = glm.angleAxis(to_radian(next(it)), glm.vec3(1, 0, 0))
-                return t * glm.mat4(z * y * x)
-            case Channels.RotZYX:
-                z = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 0, 1))
-                y = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 1, 0))
-                x = glm.angleAxis(to_radian(next(it)), glm.vec3(1, 0, 0))
-                return glm.mat4(z * y * x)
-            case _:
-                raise NotImplementedError()
-
-    def get_transform(self, it, scale: float) -> Transform:
-        match self:
-            # zxy
-            case Channels.PosXYZ_RotZXY:
-                t = glm.vec3(next(it), next(it), next(it)) * scale
-                z = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 0, 1))
-                x = glm.angleAxis(to_radian(next(it)), glm.vec3(1, 0, 0))
-                y = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 1, 0))
-                return Transform(t, z * x * y, glm.vec3(1))
-            case Channels.RotZXY:
-                z = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 0, 1))
-                x = glm.angleAxis(to_radian(next(it)), glm.vec3(1, 0, 0))
-                y = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 1, 0))
-                return Transform.from_rotation(z * x * y)
-            # zyx
-            case Channels.PosXYZ_RotZYX:
-                t = glm.vec3(next(it), next(it), next(it)) * scale
-                z = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 0, 1))
-                y = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 1, 0))
-                x = glm.angleAxis(to_radian(next(it)), glm.vec3(1, 0, 0))
-                return Transform(t, z * y * x, glm.vec3(1))
-            case Channels.RotZYX:
-                z = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 0, 1))
-                y = glm.angleAxis(to_radian(next(it)), glm.vec3(0, 1, 0))
-                x = glm.angleAxis(to_radian(next(it)), glm.vec3(1, 0, 0))
-                return Transform.from_rotation(z * y * x)
-            case _:
-                raise NotImplementedError()
+        return len(self.names)
 
 
 class Node:
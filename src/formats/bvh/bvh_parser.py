@@ -1,20 +1,16 @@
-from typing import Iterable, Iterator, Optional, List, Set
+from typing import Iterable, Iterator, Optional, List, Set, Tuple, Dict
 import logging
 import pathlib
-import ctypes
 import glm
-from ...humanoid.humanoid_bones import HumanoidBone
-from ...humanoid.pose import Motion, Pose, BonePose
+import numpy
+from humanoid.humanoid_bones import HumanoidBone
+from humanoid.pose import Motion, Pose, BonePose
 from ..transform import Transform
-from .bvh_node import Node, Channels
+from .bvh_node import Node, Channels, BvhException, euler_to_quaternion
 
 LOGGER = logging.getLogger(__name__)
 
 
-class BvhException(RuntimeError):
-    pass
-
-
 def parse_offset_channels(it: Iterator[str], name: Optional[str]) -> Node:
     if next(it).strip() != '{':
         raise BvhException()
@@ -27,25 +23,11 @@ def parse_offset_channels(it: Iterator[str], name: Optional[str]) -> Node:
                 channels = next(it).strip()
                 node = None
                 match channels.split():
-                    # ZXY
-                    case 'CHANNELS', '6', 'Xposition', 'Yposition', 'Zposition', 'Zrotation', 'Xrotation', 'Yrotation':
-                        node = Node(name, HumanoidBone.unknown, offset,
-                                    Channels.PosXYZ_RotZXY, [])
-                    case 'CHANNELS', '3', 'Zrotation', 'Xrotation', 'Yrotation':
-                        node = Node(name, HumanoidBone.unknown,
-                                    offset, Channels.RotZXY, [])
-                    # ZYX
-                    case 'CHANNELS', '6', 'Xposition', 'Yposition', 'Zposition', 'Zrotation', 'Yrotation', 'Xrotation':
+                    case 'CHANNELS', count, *names if count.isdigit() and int(count) == len(names):
                         node = Node(name, HumanoidBone.unknown, offset,
-                                    Channels.PosXYZ_RotZYX, [])
-                    case 'CHANNELS', '3', 'Zrotation', 'Yrotation', 'Xrotation':
-                        node = Node(name, HumanoidBone.unknown,
-                                    offset, Channels.RotZYX, [])
-                    #
+                                    Channels(names), [])
                     case _:
-                        # CHANNELS 6 Xposition Yposition Zposition Yrotation Xrotation Zrotation
-                        # CHANNELS 6 Xposition Yposition Zposition Zrotation Yrotation Xrotation
-                        raise NotImplementedError(channels)
+                        raise BvhException(channels)
                 # children
                 while True:
                     head = next(it).strip()
@@ -76,8 +58,83 @@ def parse_recursive(it: Iterator[str], head: str) -> Node:
             raise NotImplementedError()
 
 
+class EvaluationPlan:
+    '''
+    Node の木を set_time 用の flat な配列にしたもの
+    '''
+
+    def __init__(self, root: Node) -> None:
+        # end site 以外の traverse 順
+        self.joints = [node for node in root.traverse() if node.name]
+        self.names = [node.name for node in self.joints]
+        self.humanoid_bones = [node.humanoid_bone for node in self.joints]
+        # joint 毎の data の先頭の列。channel が無ければ -1
+        self.channel_offsets = numpy.full(
+            len(self.joints), -1, dtype=numpy.int32)
+
+        # 回転順毎に joint と data の列をまとめる
+        rotation_map: Dict[str, Tuple[List[int], List[Tuple[int, ...]]]] = {}
+        # position は channel 1 個ずつ (joint, 軸, data の列)
+        position_joints: List[int] = []
+        position_axes: List[int] = []
+        position_columns: List[int] = []
+        offset = 0
+        for i, node in enumerate(self.joints):
+            if not node.channels:
+                continue
+            self.channel_offsets[i] = offset
+            if node.channels.order:
+                joints, columns = rotation_map.setdefault(
+                    node.channels.order, ([], []))
+                joints.append(i)
+                columns.append(
+                    tuple(offset + x for x in node.channels.rotation_index))
+            for axis, x in zip(node.channels.position_axes, node.channels.position_index):
+                position_joints.append(i)
+                position_axes.append(axis)
+                position_columns.append(offset + x)
+            offset += node.channels.count()
+        self.channel_count = offset
+
+        # (order, (joints,), (joints, len(order)))
+        self.rotation_groups = [(order, numpy.array(joints, dtype=numpy.int32), numpy.array(columns, dtype=numpy.int32))
+                                for order, (joints, columns) in rotation_map.items()]
+        self.position_joints = numpy.array(position_joints, dtype=numpy.int32)
+        self.position_axes = numpy.array(position_axes, dtype=numpy.int32)
+        self.position_columns = numpy.array(
+            position_columns, dtype=numpy.int32)
+
+    def evaluate(self, data: numpy.ndarray, scale: float,
+                 rotations: Optional[numpy.ndarray] = None, translations: Optional[numpy.ndarray] = None) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        '''
+        data: (..., channel_count)
+
+        (..., joints, 4) の x, y, z, w と (..., joints, 3) を返す。
+        rotations, translations を渡すとそこに書き込む
+        '''
+        shape = data.shape[:-1] + (len(self.joints),)
+        if rotations is None:
+            rotations = numpy.empty(shape + (4,), dtype=numpy.float32)
+        if translations is None:
+            translations = numpy.empty(shape + (3,), dtype=numpy.float32)
+        rotations[...] = (0, 0, 0, 1)
+        translations[...] = 0
+        for order, joints, columns in self.rotation_groups:
+            rotations[..., joints, :] = euler_to_quaternion(
+                data[..., columns], order)
+        if len(self.position_joints):
+            translations[..., self.position_joints, self.position_axes] = data[...,
+                                                                               self.position_columns] * scale
+        return rotations, translations
+
+
 class Bvh(Motion):
-    def __init__(self, path: pathlib.Path, root: Node, frametime: float, frame_count: int, data: ctypes.Array) -> None:
+    def __init__(self, path: pathlib.Path, root: Node, frametime: float, frame_count: int, data: numpy.ndarray,
+                 rotations: Optional[numpy.ndarray] = None, translations: Optional[numpy.ndarray] = None) -> None:
+        '''
+        data: (frame_count, channel_count) float32
+        rotations, translations: 変換済みの get_rotations(), get_translations()
+        '''
         super().__init__(path.stem)
         self.path = path
         self.root = root
@@ -88,7 +145,7 @@ class Bvh(Motion):
 
         # decide human bone
         from . import humanoid_map
-        humanoid_map.resolve(self.root)
+        self.humanoid_map = humanoid_map.resolve(self.root)
 
         # modify scale
         from .skeleton_checker import SkeletonChecker
@@ -107,10 +164,25 @@ class Bvh(Motion):
 
         # frame
         self.channel_count = self.root.get_channel_count()
+        self.plan = EvaluationPlan(self.root)
+        self.joints = self.plan.joints
+        self._rotations = rotations
+        self._translations = translations
+        # pose buffer
+        self.rotations = numpy.zeros((len(self.joints), 4), dtype=numpy.float32)
+        self.translations = numpy.zeros(
+            (len(self.joints), 3), dtype=numpy.float32)
+        self._pose: Optional[Pose] = None
         self.current_frame = -1
         self.set_time(0)
 
     def set_time(self, time_sec: float):
+        pose = self.get_baked_pose(time_sec)
+        if pose is not None:
+            self._pose = pose
+            self.current_frame = -1
+            return
+
         frame = int(time_sec * self.fps)
         if frame == self.current_frame:
             return
@@ -119,29 +191,50 @@ class Bvh(Motion):
         elif frame >= self.frame_count:
             frame = self.frame_count-1
         self.current_frame = frame
-        begin = self.channel_count * frame
-        data = self.data[begin:begin+self.channel_count]
-
-        self.pose = Pose(f'{frame}')
-        it = iter(data)
-
-        def traverse(node: Node):
-            if not node.name:
-                # endsite
-                return
-            if node.channels:
-                t = node.channels.get_transform(it, self.scale)
-            else:
-                t = Transform.identity()
-            self.pose.bones.append(BonePose(node.name, node.humanoid_bone, t))
-
-            for child in node.children:
-                traverse(child)
-        traverse(self.root)
+        self._pose = None
+        if self.frame_count:
+            self.get_frame(frame, self.rotations, self.translations)
+
+    def get_frame(self, frame: int,
+                  rotations: Optional[numpy.ndarray] = None, translations: Optional[numpy.ndarray] = None) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        '''
+        frame の (joints, 4) と (joints, 3)。rotations, translations を渡すとそこに書き込む
+        '''
+        if rotations is None:
+            rotations = numpy.empty((len(self.joints), 4), dtype=numpy.float32)
+        if translations is None:
+            translations = numpy.empty(
+                (len(self.joints), 3), dtype=numpy.float32)
+        numpy.copyto(rotations, self.get_rotations()[frame])
+        numpy.copyto(translations, self.get_translations()[frame])
+        return rotations, translations
+
+    def _convert(self):
+        self._rotations, self._translations = self.plan.evaluate(
+            self.data, self.scale)
+
+    def get_rotations(self) -> numpy.ndarray:
+        '''
+        (frames, joints, 4) x, y, z, w
+        '''
+        if self._rotations is None:
+            self._convert()
+        return self._rotations
+
+    def get_translations(self) -> numpy.ndarray:
+        '''
+        (frames, joints, 3) scale 済み。position channel の無い joint は 0
+        '''
+        if self._translations is None:
+            self._convert()
+        return self._translations
 
     def get_end_time(self):
         return self.frametime * self.frame_count
 
+    def get_fps(self) -> float:
+        return self.fps
+
     def get_frame_count(self) -> int:
         return self.frame_count
 
@@ -152,43 +245,84 @@ class Bvh(Motion):
         yield f'{self.frame_count}frames, {self.get_end_time():0.2f}sec'
 
     def get_humanbones(self) -> Set[HumanoidBone]:
-        return set()
+        return set(bone for bone in self.plan.humanoid_bones if bone.is_enable())
 
     def get_current_pose(self) -> Pose:
-        return self.pose
-
-
-def parse(path: pathlib.Path, src: str) -> Bvh:
-    it = iter(src.splitlines())
-    if next(it) != 'HIERARCHY':
+        if not self._pose:
+            pose = Pose(f'{self.current_frame}')
+            for name, humanoid_bone, (x, y, z), (rx, ry, rz, rw) in zip(self.plan.names, self.plan.humanoid_bones, self.translations.tolist(), self.rotations.tolist()):
+                pose.bones.append(BonePose(name, humanoid_bone,
+                                           Transform(glm.vec3(x, y, z), glm.quat(rw, rx, ry, rz), glm.vec3(1))))
+            self._pose = pose
+        return self._pose
+
+
+def parse_hierarchy(lines: Iterable[str]) -> Node:
+    '''
+    HIERARCHY から MOTION の手前まで
+    '''
+    it = iter(lines)
+    if next(it).strip() != 'HIERARCHY':
         raise BvhException('HIERARCHY not found')
 
     head = next(it).strip()
     root = parse_recursive(it, head)
     if not root:
         raise BvhException('no ROOT')
+    for line in it:
+        if line.strip():
+            raise BvhException(f'unknown line: {line}')
+    return root
 
-    if next(it) != 'MOTION':
-        raise BvhException('MOTION not found')
 
-    frames = next(it).strip()
+def parse_frames(frames: str, frametime: str) -> Tuple[int, float]:
+    frames = frames.strip()
     if not frames.startswith('Frames:'):
         raise BvhException('Frames: not found')
-    frames = int(frames[7:])
 
-    frametime = next(it).strip()
+    frametime = frametime.strip()
     if not frametime.startswith('Frame Time:'):
         raise BvhException('Frame Time: not found')
-    frametime = float(frametime[11:])
 
-    channel_count = root.get_channel_count()
-    data = (ctypes.c_float * (frames * channel_count))()
-    i = 0
-    for _ in range(frames):
-        for x in next(it).strip().split():
-            data[i] = float(x)
-            i += 1
+    return int(frames[7:]), float(frametime[11:])
+
+
+def parse_rows(lines: Iterable[str], frames: int, channel_count: int) -> numpy.ndarray:
+    '''
+    frame 毎の行を numpy でまとめて (frames, channel_count) の float32 に読む
+    '''
+    if frames > 0:
+        # 列数が揃わなければ ValueError
+        try:
+            data = numpy.loadtxt(lines, dtype=numpy.float32,
+                                 ndmin=2, max_rows=frames)
+        except ValueError as e:
+            raise BvhException(str(e))
+    else:
+        data = numpy.zeros((0, channel_count), dtype=numpy.float32)
+    if data.shape != (frames, channel_count):
+        raise BvhException(
+            f'{frames}frames x {channel_count}channels expected, but {data.shape[0]}x{data.shape[1]}')
+    return data
+
+
+def parse(path: pathlib.Path, src: str) -> Bvh:
+    motion = src.find('\nMOTION')
+    if motion < 0:
+        raise BvhException('MOTION not found')
+
+    root = parse_hierarchy(src[:motion].splitlines())
+
+    match src[motion+1:].split('\n', 3):
+        case [_, frames, frametime, body]:
+            pass
+        case [_, frames, frametime]:
+            body = ''
+        case _:
+            raise BvhException('Frames: not found')
+    frames, frametime = parse_frames(frames, frametime)
 
+    data = parse_rows(body.splitlines(), frames, root.get_channel_count())
     return Bvh(path, root, frametime, frames, data)
 
 
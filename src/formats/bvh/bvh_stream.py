@@ -0,0 +1,152 @@
+'''
+巨大な bvh を一定のメモリで読む
+
+HIERARCHY は最初に読んで、MOTION は chunk 毎に file から読む。
+random access には各 frame の行の先頭の byte offset の index を使う。
+'''
+from typing import Iterator, Optional
+import copy
+import itertools
+import pathlib
+import numpy
+from .bvh_node import Node
+from .bvh_parser import Bvh, BvhException, parse_hierarchy, parse_frames, parse_rows
+
+CHUNK_FRAMES = 1024
+# index を作るときに一回に読む byte 数
+INDEX_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+class BvhStream:
+    def __init__(self, path: pathlib.Path, index: Optional[numpy.ndarray] = None) -> None:
+        '''
+        index: 作成済みの get_index() の結果
+        '''
+        self.path = path
+        self._f = path.open('rb')
+        try:
+            lines = []
+            while True:
+                line = self._f.readline()
+                if not line:
+                    raise BvhException('MOTION not found')
+                line = line.decode('utf-8')
+                if line.strip() == 'MOTION':
+                    break
+                lines.append(line)
+            self.root: Node = parse_hierarchy(lines)
+            self.frame_count, self.frametime = parse_frames(
+                self._f.readline().decode('utf-8'), self._f.readline().decode('utf-8'))
+        except Exception:
+            self._f.close()
+            raise
+        self.channel_count = self.root.get_channel_count()
+        # 最初の frame の行の先頭
+        self.data_offset = self._f.tell()
+        if index is not None and len(index) != self.frame_count + 1:
+            raise BvhException(
+                f'index for {len(index)-1}frames, but {self.frame_count}frames')
+        self._index = index
+
+    def __enter__(self) -> 'BvhStream':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._f.close()
+
+    def iter_chunks(self, chunk_frames: int = CHUNK_FRAMES) -> Iterator[numpy.ndarray]:
+        '''
+        先頭から順に (chunk_frames, channel_count) 以下の float32 を返す
+        '''
+        self._f.seek(self.data_offset)
+        # 空白だけの行は飛ばす
+        it = (line for line in self._f if line.strip())
+        rest = self.frame_count
+        while rest > 0:
+            count = min(rest, chunk_frames)
+            lines = [line.decode('utf-8')
+                     for line in itertools.islice(it, count)]
+            yield parse_rows(lines, count, self.channel_count)
+            rest -= count
+
+    def get_index(self) -> numpy.ndarray:
+        '''
+        (frame_count+1,) int64。frame i の行は index[i] から index[i+1] まで
+        '''
+        if self._index is None:
+            self._index = self._build_index()
+        return self._index
+
+    def _build_index(self) -> numpy.ndarray:
+        index = numpy.empty(self.frame_count + 1, dtype=numpy.int64)
+        index[0] = self.data_offset
+        count = 0
+        # data[0] の file 上の位置。data は常に行の先頭から始まる
+        pos = self.data_offset
+        rest = b''
+        self._f.seek(pos)
+        while count < self.frame_count:
+            block = self._f.read(INDEX_BLOCK_SIZE)
+            data = numpy.frombuffer(rest + block, dtype=numpy.uint8)
+            if not block:
+                # 最後の行に改行が無い
+                if count == self.frame_count - 1 and (data > 32).any():
+                    index[count] = pos
+                    index[self.frame_count] = pos + len(data)
+                    return index
+                raise BvhException(
+                    f'{self.frame_count}frames expected, but {count}')
+            newlines = numpy.flatnonzero(data == 10)
+            if len(newlines) == 0:
+                rest = data.tobytes()
+                continue
+            # 行 i は starts[i] から newlines[i] まで。空白だけの行は飛ばす
+            starts = numpy.concatenate(([0], newlines[:-1] + 1))
+            filled = numpy.add.reduceat(
+                data[:newlines[-1] + 1] > 32, starts, dtype=numpy.int32) > 0
+            lines = numpy.flatnonzero(filled)[0:self.frame_count - count]
+            index[count:count+len(lines)] = starts[lines] + pos
+            count += len(lines)
+            if count == self.frame_count:
+                # 最後の frame の改行の次
+                index[count] = newlines[lines[-1]] + 1 + pos
+                break
+            rest = data[newlines[-1] + 1:].tobytes()
+            pos += newlines[-1] + 1
+        return index
+
+    def read_frames(self, begin: int, end: int) -> numpy.ndarray:
+        '''
+        frame [begin, end) の (end-begin, channel_count) float32
+        '''
+        begin = max(begin, 0)
+        end = min(end, self.frame_count)
+        if begin >= end:
+            return numpy.zeros((0, self.channel_count), dtype=numpy.float32)
+        index = self.get_index()
+        self._f.seek(index[begin])
+        block = self._f.read(index[end] - index[begin])
+        lines = [line for line in block.decode(
+            'utf-8').splitlines() if line.strip()]
+        return parse_rows(lines, end - begin, self.channel_count)
+
+    def get_frame(self, frame: int) -> numpy.ndarray:
+        if frame < 0 or frame >= self.frame_count:
+            raise IndexError(frame)
+        return self.read_frames(frame, frame+1)[0]
+
+    def load(self, begin: int = 0, end: Optional[int] = None) -> Bvh:
+        '''
+        frame [begin, end) を切り出した Bvh
+        '''
+        data = self.read_frames(
+            begin, self.frame_count if end is None else end)
+        # Bvh は node.offset を scale するので複製する
+        return Bvh(self.path, copy.deepcopy(self.root), self.frametime, len(data), data)
+
+
+def open_stream(path: pathlib.Path, index: Optional[numpy.ndarray] = None) -> BvhStream:
+    return BvhStream(path, index)
@@ -1,6 +1,6 @@
-from typing import Dict, Set
+from typing import Dict, Set, Optional
 from ..bvh_node import Node
-from humanbonestructure.humanoid.humanoid_bones import HumanoidBone
+from humanoid.humanoid_bones import HumanoidBone
 
 
 def keys_match_dict(keys: Set[str], dict: Dict[str, HumanoidBone]) -> bool:
@@ -26,23 +26,26 @@ def try_assign(root, keys, dict) -> bool:
     return False
 
 
-def resolve(root: Node) -> bool:
+def resolve(root: Node) -> Optional[str]:
+    '''
+    一致した map の名前
+    '''
     keys = set(node.name for node in root.traverse() if node.name)
 
     from . import bandai_namco
     if try_assign(root, keys, bandai_namco.MAP):
-        return True
+        return 'bandai_namco'
 
     from . import cgspeed
     if try_assign(root, keys, cgspeed.MAP):
-        return True
+        return 'cgspeed'
 
     from . import univrm
     if try_assign(root, keys, univrm.MAP):
-        return True
+        return 'univrm'
 
     from . import liveanimation
     if try_assign(root, keys, liveanimation.MAP):
-        return True
+        return 'liveanimation'
 
-    return False
+    return None
@@ -2,7 +2,7 @@
 # https://sites.google.com/a/cgspeed.com/cgspeed/motion-capture
 #
 from typing import Dict
-from humanbonestructure.humanoid.humanoid_bones import HumanoidBone
+from humanoid.humanoid_bones import HumanoidBone
 
 MAP: Dict[str, HumanoidBone] = {
     'hip': HumanoidBone.hips,
@@ -16,8 +16,8 @@ MAP: Dict[str, HumanoidBone] = {
     'rShldr': HumanoidBone.rightUpperArm,
     'rForeArm': HumanoidBone.rightLowerArm,
     'rHand': HumanoidBone.rightHand,
-    'rThumb1': HumanoidBone.rightThumbProximal,
-    'rThumb2': HumanoidBone.rightThumbIntermediate,
+    'rThumb1': HumanoidBone.rightThumbMetacarpal,
+    'rThumb2': HumanoidBone.rightThumbProximal,
     'rIndex1': HumanoidBone.rightIndexProximal,
     'rIndex2': HumanoidBone.rightIndexIntermediate,
     'rMid1': HumanoidBone.rightMiddleProximal,
@@ -30,8 +30,8 @@ MAP: Dict[str, HumanoidBone] = {
     'lShldr': HumanoidBone.leftUpperArm,
     'lForeArm': HumanoidBone.leftLowerArm,
     'lHand': HumanoidBone.leftHand,
-    'lThumb1': HumanoidBone.leftThumbProximal,
-    'lThumb2': HumanoidBone.leftThumbIntermediate,
+    'lThumb1': HumanoidBone.leftThumbMetacarpal,
+    'lThumb2': HumanoidBone.leftThumbProximal,
     'lIndex1': HumanoidBone.leftIndexProximal,
     'lIndex2': HumanoidBone.leftIndexIntermediate,
     'lMid1': HumanoidBone.leftMiddleProximal,
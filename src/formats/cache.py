@@ -0,0 +1,257 @@
+'''
+parse 済みの motion, model の file cache
+
+<cache_dir>/<path の hash>/ に meta.json と配列毎の .npy を置く。
+path, size, mtime が一致すれば有効。mtime だけが変わった場合は内容の hash を比べる。
+.npy は mmap で開く。
+'''
+from typing import Optional, Dict, Tuple, Any, List
+import os
+import json
+import shutil
+import logging
+import hashlib
+import pathlib
+import ctypes
+import glm
+import numpy
+
+LOGGER = logging.getLogger(__name__)
+
+# 保存形式を変えたら上げる
+VERSION = 2
+DIGEST_BLOCK_SIZE = 1024 * 1024
+
+
+def get_default_dir() -> pathlib.Path:
+    path = os.environ.get('HUMANBONESTRUCTURE_CACHE')
+    if path:
+        return pathlib.Path(path)
+    return pathlib.Path.home() / '.cache' / 'humanbonestructure'
+
+
+def file_digest(path: pathlib.Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with path.open('rb') as f:
+        while True:
+            block = f.read(DIGEST_BLOCK_SIZE)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class FileCache:
+    def __init__(self, cache_dir: pathlib.Path) -> None:
+        self.cache_dir = cache_dir
+
+    def get_entry_dir(self, path: pathlib.Path) -> pathlib.Path:
+        key = hashlib.sha1(str(path.resolve()).encode('utf-8')).hexdigest()
+        return self.cache_dir / key
+
+    def get(self, path: pathlib.Path, kind: str) -> Optional[Tuple[Dict[str, Any], Dict[str, numpy.ndarray]]]:
+        '''
+        有効な cache があれば (info, arrays)
+        '''
+        entry = self.get_entry_dir(path)
+        try:
+            meta = json.loads((entry / 'meta.json').read_text(encoding='utf-8'))
+            stat = path.stat()
+            if meta['version'] != VERSION or meta['kind'] != kind or meta['path'] != str(path.resolve()):
+                return None
+            if meta['size'] != stat.st_size:
+                return None
+            if meta['mtime_ns'] != stat.st_mtime_ns:
+                # touch されただけなら使う
+                if meta['digest'] != file_digest(path):
+                    return None
+                meta['mtime_ns'] = stat.st_mtime_ns
+                (entry / 'meta.json').write_text(json.dumps(meta), encoding='utf-8')
+            arrays = {name: numpy.load(entry / f'{name}.npy', mmap_mode='r')
+                      for name in meta['arrays']}
+            return meta['info'], arrays
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                LOGGER.warning(f'{path}: {e}')
+            return None
+
+    def put(self, path: pathlib.Path, kind: str, info: Dict[str, Any], arrays: Dict[str, numpy.ndarray]):
+        entry = self.get_entry_dir(path)
+        stat = path.stat()
+        meta = {
+            'version': VERSION,
+            'kind': kind,
+            'path': str(path.resolve()),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'digest': file_digest(path),
+            'arrays': list(arrays.keys()),
+            'info': info,
+        }
+        try:
+            # 書きかけを読まないように別の場所に書いてから置き換える
+            tmp = entry.with_name(f'{entry.name}.{os.getpid()}.tmp')
+            if tmp.exists():
+                shutil.rmtree(tmp)
+            tmp.mkdir(parents=True)
+            for name, array in arrays.items():
+                numpy.save(tmp / f'{name}.npy', numpy.ascontiguousarray(array))
+            (tmp / 'meta.json').write_text(json.dumps(meta), encoding='utf-8')
+            if entry.exists():
+                shutil.rmtree(entry)
+            tmp.rename(entry)
+        except OSError as e:
+            LOGGER.warning(f'{path}: {e}')
+
+    def clear(self):
+        if self.cache_dir.exists():
+            shutil.rmtree(self.cache_dir)
+
+
+FILE_CACHE = FileCache(get_default_dir())
+
+
+#
+# bvh
+#
+def _bvh_to_cache(bvh) -> Tuple[Dict[str, Any], Dict[str, numpy.ndarray]]:
+    nodes: List[Dict[str, Any]] = []
+
+    def traverse(node, parent: int):
+        index = len(nodes)
+        # Bvh が scale する前の値
+        offset = node.offset / bvh.scale
+        nodes.append({
+            'name': node.name,
+            'parent': parent,
+            'offset': [offset.x, offset.y, offset.z],
+            'channels': list(node.channels.names) if node.channels else None,
+            'humanoid_bone': node.humanoid_bone.name,
+        })
+        for child in node.children:
+            traverse(child, index)
+    traverse(bvh.root, -1)
+
+    info = {
+        'nodes': nodes,
+        'frametime': bvh.frametime,
+        'frame_count': bvh.frame_count,
+    }
+    arrays = {
+        'data': bvh.data,
+        'rotations': bvh.get_rotations(),
+        'translations': bvh.get_translations(),
+    }
+    return info, arrays
+
+
+def _bvh_from_cache(path: pathlib.Path, info: Dict[str, Any], arrays: Dict[str, numpy.ndarray]):
+    from humanoid.humanoid_bones import HumanoidBone
+    from .bvh.bvh_node import Node, Channels
+    from .bvh.bvh_parser import Bvh
+    nodes: List[Node] = []
+    for value in info['nodes']:
+        node = Node(value['name'], HumanoidBone[value['humanoid_bone']], glm.vec3(*value['offset']),
+                    Channels(value['channels']) if value['channels'] else None, [])
+        if value['parent'] >= 0:
+            nodes[value['parent']].children.append(node)
+        nodes.append(node)
+    return Bvh(path, nodes[0], info['frametime'], info['frame_count'], arrays['data'],
+               arrays['rotations'], arrays['translations'])
+
+
+def load_bvh(path: pathlib.Path, cache: Optional[FileCache] = None):
+    cache = cache or FILE_CACHE
+    cached = cache.get(path, 'bvh')
+    if cached:
+        return _bvh_from_cache(path, *cached)
+    from .bvh import bvh_parser
+    bvh = bvh_parser.from_path(path)
+    cache.put(path, 'bvh', *_bvh_to_cache(bvh))
+    return bvh
+
+
+#
+# vmd
+#
+def _vmd_to_cache(vmd) -> Tuple[Dict[str, Any], Dict[str, numpy.ndarray]]:
+    curve_names, arrays = vmd.to_arrays()
+    info = {
+        'name': vmd.name,
+        'target_model': vmd.target_model,
+        'curves': curve_names,
+    }
+    return info, arrays
+
+
+def _vmd_from_cache(info: Dict[str, Any], arrays: Dict[str, numpy.ndarray]):
+    from .vmd_loader import Vmd
+    return Vmd.from_arrays(info['name'], info['target_model'], info['curves'], **arrays)
+
+
+def load_vmd(path: pathlib.Path, cache: Optional[FileCache] = None):
+    cache = cache or FILE_CACHE
+    cached = cache.get(path, 'vmd')
+    if cached:
+        return _vmd_from_cache(*cached)
+    from .vmd_loader import Vmd
+    vmd = Vmd.load(path.name, path.read_bytes())
+    cache.put(path, 'vmd', *_vmd_to_cache(vmd))
+    return vmd
+
+
+#
+# pmx
+#
+def _pmx_to_cache(pmx) -> Tuple[Dict[str, Any], Dict[str, numpy.ndarray]]:
+    info = {
+        'name_ja': pmx.name_ja,
+        'name_en': pmx.name_en,
+        'comment_ja': pmx.comment_ja,
+        'comment_en': pmx.comment_en,
+        'deform_bones': [[k, v] for k, v in pmx.deform_bones.items()],
+        'bones': [{
+            'name_ja': bone.name_ja,
+            'name_en': bone.name_en,
+            'position': list(bone.position),
+            'parent_index': bone.parent_index,
+            'tail_position': list(bone.tail_position) if bone.tail_position else None,
+        } for bone in pmx.bones],
+    }
+    arrays = {
+        'vertices': numpy.frombuffer(pmx.vertices, dtype=numpy.uint8),
+        'indices': numpy.ctypeslib.as_array(pmx.indices),
+    }
+    return info, arrays
+
+
+def _pmx_from_cache(info: Dict[str, Any], arrays: Dict[str, numpy.ndarray]):
+    from .pmx_loader import Pmx, Bone
+    from .buffer_types import Vertex4BoneWeights, Float3
+    # renderer に渡すので mmap ではなく ctypes の配列に複製する
+    vertices = arrays['vertices']
+    indices = arrays['indices']
+    bones = []
+    for value in info['bones']:
+        bone = Bone(value['name_ja'], value['name_en'],
+                    Float3(*value['position']), value['parent_index'])
+        if value['tail_position']:
+            bone.tail_position = Float3(*value['tail_position'])
+        bones.append(bone)
+    return Pmx.from_arrays(info['name_ja'], info['name_en'], info['comment_ja'], info['comment_en'],
+                           (Vertex4BoneWeights * (len(vertices) // ctypes.sizeof(Vertex4BoneWeights))
+                            ).from_buffer_copy(vertices),
+                           (numpy.ctypeslib.as_ctypes_type(indices.dtype)
+                            * len(indices)).from_buffer_copy(indices),
+                           {k: v for k, v in info['deform_bones']}, bones)
+
+
+def load_pmx(path: pathlib.Path, cache: Optional[FileCache] = None):
+    cache = cache or FILE_CACHE
+    cached = cache.get(path, 'pmx')
+    if cached:
+        return _pmx_from_cache(*cached)
+    from .pmx_loader import Pmx
+    pmx = Pmx(path.read_bytes())
+    cache.put(path, 'pmx', *_pmx_to_cache(pmx))
+    return pmx
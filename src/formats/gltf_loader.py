@@ -1,22 +1,70 @@
-from typing import Dict, Optional, Tuple, Iterable
-import ctypes
+from typing import Dict, Optional, Tuple, Iterable, Union
 import struct
 import pathlib
 import json
 import logging
+import mmap
+import base64
+import urllib.parse
 import glm
+import numpy
 from humanoid.humanoid_bones import HumanoidBone
 from . import typed_gltf
-from .buffer_types import Float2, Float3, Float4, UShort4, Mat4
 LOGGER = logging.getLogger(__name__)
 
+COMPONENT_DTYPE = {
+    typed_gltf.AccessorComponentType.BYTE.value: numpy.dtype('<i1'),
+    typed_gltf.AccessorComponentType.UNSIGNED_BYTE.value: numpy.dtype('<u1'),
+    typed_gltf.AccessorComponentType.SHORT.value: numpy.dtype('<i2'),
+    typed_gltf.AccessorComponentType.UNSIGNED_SHORT.value: numpy.dtype('<u2'),
+    typed_gltf.AccessorComponentType.UNSIGNED_INT.value: numpy.dtype('<u4'),
+    typed_gltf.AccessorComponentType.FLOAT.value: numpy.dtype('<f4'),
+}
+
+# type => (列数, 行数)。MAT は列優先
+TYPE_SHAPE = {
+    'SCALAR': (1, 1),
+    'VEC2': (1, 2),
+    'VEC3': (1, 3),
+    'VEC4': (1, 4),
+    'MAT2': (2, 2),
+    'MAT3': (3, 3),
+    'MAT4': (4, 4),
+}
+
+
+def get_element_layout(accessor_type: str, dtype: numpy.dtype) -> Tuple[Tuple[int, ...], Tuple[int, ...], int]:
+    '''
+    1 要素の (shape, strides, byte 数)
+
+    MAT の列は 4 byte 境界に揃える
+    '''
+    cols, rows = TYPE_SHAPE[accessor_type]
+    if cols == 1:
+        if rows == 1:
+            return (), (), dtype.itemsize
+        return (rows,), (dtype.itemsize,), rows * dtype.itemsize
+    col_size = (rows * dtype.itemsize + 3) // 4 * 4
+    return (cols, rows), (col_size, dtype.itemsize), cols * col_size
+
+
+def normalize(array: numpy.ndarray) -> numpy.ndarray:
+    '''
+    normalized な整数を float32 にする
+    '''
+    info = numpy.iinfo(array.dtype)
+    normalized = array.astype(numpy.float32) / info.max
+    if info.min < 0:
+        numpy.maximum(normalized, -1, out=normalized)
+    return normalized
+
 
 class BytesReader:
-    def __init__(self, data: bytes) -> None:
+    def __init__(self, data: Union[bytes, memoryview]) -> None:
         self.data = data
         self.pos = 0
 
-    def bytes(self, length: int) -> bytes:
+    def bytes(self, length: int) -> Union[bytes, memoryview]:
         data = self.data[self.pos:self.pos+length]
         self.pos += length
         return data
@@ -27,10 +75,14 @@ class BytesReader:
 
 
 class Gltf:
-    def __init__(self, gltf: typed_gltf.glTF, *, bin: Optional[bytes] = None, base_dir: Optional[pathlib.Path] = None) -> None:
+    def __init__(self, gltf: typed_gltf.glTF, *, bin: Optional[Union[bytes, memoryview]] = None, base_dir: Optional[pathlib.Path] = None) -> None:
         self.gltf = gltf
         self.bin = bin
         self.base_dir = base_dir
+        # buffer の index => 最初に使うときに開く
+        self._buffers: Dict[int, memoryview] = {}
+        # 閉じないように持っておく
+        self._mmaps = []
 
         self.vrm = None
         if self.get_vrm0_human_bone_map():
@@ -59,7 +111,13 @@ class Gltf:
                 # vrm-0.x
                 if humanoid := vrm0.get('humanoid'):
                     if human_bones := humanoid.get('humanBones'):
-                        return {b['node']: HumanoidBone(b['bone']) for b in human_bones}
+                        map = {}
+                        for b in human_bones:
+                            try:
+                                map[b['node']] = HumanoidBone[b['bone']]
+                            except KeyError:
+                                pass
+                        return map
         return {}
 
     def get_vrm1_human_bone_map(self) -> Dict[int, HumanoidBone]:
@@ -78,12 +136,15 @@ class Gltf:
         return {}
 
     @staticmethod
-    def load_glb(data: bytes) -> 'Gltf':
+    def load_glb(data: bytes, *, skeleton_only: bool = False) -> 'Gltf':
         '''
         https://www.khronos.org/registry/glTF/specs/2.0/glTF-2.0.html#glb-file-format-specification
+
+        skeleton_only: JSON chunk だけ読んで bin chunk は読み飛ばす
         '''
 
-        r = BytesReader(data)
+        # chunk は data の memoryview にして複製しない
+        r = BytesReader(memoryview(data))
 
         assert r.uint32() == 0x46546C67
         assert r.uint32() == 2
@@ -101,6 +162,9 @@ class Gltf:
             match chunk_type:
                 case 	0x4E4F534A:
                     json_chunk_data = chunk_data
+                    if skeleton_only:
+                        # node は JSON にある
+                        return Gltf(json.loads(bytes(json_chunk_data)))
                 case 	0x004E4942:
                     bin_chunk_data = chunk_data
                 case _:
@@ -110,70 +174,121 @@ class Gltf:
         assert json_chunk_data
         assert bin_chunk_data
 
-        return Gltf(json.loads(json_chunk_data), bin=bin_chunk_data)
+        return Gltf(json.loads(bytes(json_chunk_data)), bin=bin_chunk_data)
 
-    def get_bufferview(self, index: int) -> bytes:
-        assert self.bin
+    @staticmethod
+    def load_glb_path(path: pathlib.Path, *, skeleton_only: bool = False) -> 'Gltf':
+        '''
+        skeleton_only: header と JSON chunk だけ file から読む。
+        texture や mesh の入った bin chunk は読まない
+        '''
+        if not skeleton_only:
+            return Gltf.load_glb(path.read_bytes())
+
+        with path.open('rb') as f:
+            magic, version, _ = struct.unpack('<III', f.read(12))
+            assert magic == 0x46546C67
+            assert version == 2
+            # 最初の chunk は JSON
+            chunk_length, chunk_type = struct.unpack('<II', f.read(8))
+            assert chunk_type == 0x4E4F534A
+            return Gltf(json.loads(f.read(chunk_length)))
+
+    @staticmethod
+    def load_gltf(path: pathlib.Path, *, skeleton_only: bool = False) -> 'Gltf':
+        '''
+        .gltf の JSON だけ読む。buffer は使うときに開く
+
+        skeleton_only: glb と揃えるため。buffer は元々読まない
+        '''
+        return Gltf(json.loads(path.read_bytes()), base_dir=path.parent)
+
+    def _open_buffer(self, buffer: typed_gltf.Buffer) -> memoryview:
+        uri = buffer.get('uri')
+        if uri is None:
+            # glb の bin chunk
+            assert self.bin is not None
+            return memoryview(self.bin)
+
+        if uri.startswith('data:'):
+            # data:application/octet-stream;base64,...
+            header, _, data = uri.partition(',')
+            if header.endswith(';base64'):
+                return memoryview(base64.b64decode(data))
+            return memoryview(urllib.parse.unquote_to_bytes(data))
+
+        assert self.base_dir
+        path = self.base_dir / urllib.parse.unquote(uri)
+        with path.open('rb') as f:
+            if path.stat().st_size == 0:
+                return memoryview(b'')
+            # file 全体は読まずに mmap する
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mmaps.append(m)
+        return memoryview(m)
+
+    def get_buffer(self, index: int) -> memoryview:
+        buffer = self._buffers.get(index)
+        if buffer is None:
+            buffers = self.gltf.get('buffers', [])
+            buffer = self._open_buffer(buffers[index] if index < len(buffers) else {})
+            self._buffers[index] = buffer
+        return buffer
+
+    def get_bufferview(self, index: int) -> memoryview:
+        '''
+        buffer の memoryview。複製しない
+        '''
         bufferview: typed_gltf.BufferView = self.gltf.get('bufferViews', [])[
             index]
         offset = bufferview.get('byteOffset', 0)
         length = bufferview['byteLength']
-        return self.bin[offset:offset+length]
-
-    def load_accessor(self, index: int) -> ctypes.Array:
-        accessor: typed_gltf.Accessor = self.gltf.get('accessors', [])[index]
-        bufferview_index = accessor.get('bufferView')
-        assert isinstance(bufferview_index, int)
-        data = self.get_bufferview(bufferview_index)
-        byteoffset = accessor.get('byteOffset')
-        if byteoffset:
-            data = data[byteoffset:]
-
-        match accessor:
-            case {'componentType': typed_gltf.AccessorComponentType.UNSIGNED_SHORT.value, 'type': 'SCALAR', 'count': count}:
-                buffer_type = ctypes.c_uint16 * count
-                return buffer_type.from_buffer_copy(data)
-            case {'componentType': typed_gltf.AccessorComponentType.UNSIGNED_INT.value, 'type': 'SCALAR', 'count': count}:
-                buffer_type = ctypes.c_uint32 * count
-                return buffer_type.from_buffer_copy(data)
-            case {'componentType': typed_gltf.AccessorComponentType.FLOAT.value, 'type': 'VEC2', 'count': count}:
-                buffer_type = Float2 * count
-                return buffer_type.from_buffer_copy(data)
-            case {'componentType': typed_gltf.AccessorComponentType.FLOAT.value, 'type': 'VEC3', 'count': count}:
-                buffer_type = Float3 * count
-                return buffer_type.from_buffer_copy(data)
-            case {'componentType': typed_gltf.AccessorComponentType.FLOAT.value, 'type': 'VEC4', 'count': count}:
-                buffer_type = Float4 * count
-                return buffer_type.from_buffer_copy(data)
-            case {'componentType': typed_gltf.AccessorComponentType.FLOAT.value, 'type': 'MAT4', 'count': count}:
-                buffer_type = Mat4 * count
-                return buffer_type.from_buffer_copy(data)
-            case {'componentType': typed_gltf.AccessorComponentType.UNSIGNED_SHORT.value, 'type': 'VEC4', 'count': count}:
-                buffer_type = UShort4 * count
-                return buffer_type.from_buffer_copy(data)
-            case _:
-                raise NotImplementedError()
-
-
-def vertices_indices_len(gltf: typed_gltf.glTF, gltf_mesh: typed_gltf.Mesh) -> Tuple[int, int]:
-    vertex_count = 0
-    index_count = 0
+        return self.get_buffer(bufferview.get('buffer', 0))[offset:offset+length]
 
-    accessors = gltf.get('accessors')
-    assert accessors
-    for gltf_prim in gltf_mesh['primitives']:
-        match gltf_prim:
-            case {'attributes': {'POSITION': position}, 'indices': indices}:
-                position_accessor = accessors[position]
-                vertex_count += position_accessor['count']
-
-                indices_accessor = accessors[indices]
-                index_count += indices_accessor['count']
+    def _view(self, bufferview_index: int, byteoffset: int, count: int,
+              dtype: numpy.dtype, accessor_type: str) -> numpy.ndarray:
+        bufferview: typed_gltf.BufferView = self.gltf.get('bufferViews', [])[
+            bufferview_index]
+        shape, strides, element_size = get_element_layout(accessor_type, dtype)
+        stride = bufferview.get('byteStride') or element_size
+        return numpy.ndarray((count, *shape), dtype=dtype,
+                             buffer=self.get_bufferview(bufferview_index),
+                             offset=byteoffset, strides=(stride, *strides))
+
+    def load_accessor(self, index: int) -> numpy.ndarray:
+        '''
+        (count,), (count, n) か MAT の (count, 列, 行) の numpy 配列。
 
-            case _:
-                NotImplementedError()
+        普通は bin の読み取り専用の view を返す。
+        normalized と sparse の場合は値を変えるので複製になる。
+        '''
+        accessor: typed_gltf.Accessor = self.gltf.get('accessors', [])[index]
+        dtype = COMPONENT_DTYPE[accessor['componentType']]
+        accessor_type = accessor['type']
+        count = accessor['count']
 
-    return vertex_count, index_count
+        bufferview_index = accessor.get('bufferView')
+        if isinstance(bufferview_index, int):
+            array = self._view(bufferview_index, accessor.get('byteOffset', 0),
+                               count, dtype, accessor_type)
+        else:
+            # bufferView が無ければ 0 で初期化する
+            shape, _, _ = get_element_layout(accessor_type, dtype)
+            array = numpy.zeros((count, *shape), dtype=dtype)
+
+        if sparse := accessor.get('sparse'):
+            array = array.copy()
+            sparse_indices = sparse['indices']
+            sparse_values = sparse['values']
+            indices = self._view(sparse_indices['bufferView'], sparse_indices.get('byteOffset', 0),
+                                 sparse['count'], COMPONENT_DTYPE[sparse_indices['componentType']], 'SCALAR')
+            array[indices] = self._view(sparse_values['bufferView'], sparse_values.get('byteOffset', 0),
+                                        sparse['count'], dtype, accessor_type)
+
+        if accessor.get('normalized') and dtype.kind in 'iu':
+            array = normalize(array)
+
+        return array
 
 
 def get_trs(gltf_node: typed_gltf.Node) -> Tuple[glm.vec3, glm.quat, glm.vec3]:
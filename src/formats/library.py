@@ -0,0 +1,317 @@
+'''
+motion, model の library の索引
+
+directory 以下の file を process pool で読んで、
+format, frame 数, fps, 単位, humanoid map, humanoid bone の bitmask などを
+sqlite の catalog に保存する。
+body parts は asset_parts に 1 part 1 行で入れて index で絞り込む。
+再 scan では mtime と size が変わった file だけを読みなおす。
+'''
+from typing import Optional, Iterable, List, Dict, Any, NamedTuple, Tuple
+import os
+import logging
+import pathlib
+import sqlite3
+import concurrent.futures
+from humanoid.humanoid_bones import HumanoidBone, HumanoidBodyParts, get_bone_mask, get_body_parts
+
+LOGGER = logging.getLogger(__name__)
+
+MOTION_SUFFIXES = ('.bvh', '.vmd', '.vpd')
+MODEL_SUFFIXES = ('.pmx', '.pmd', '.gltf', '.glb', '.vrm')
+SUFFIXES = MOTION_SUFFIXES + MODEL_SUFFIXES
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS assets(
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    frames INTEGER NOT NULL DEFAULT 0,
+    fps REAL NOT NULL DEFAULT 0,
+    unit TEXT,
+    humanoid_map TEXT,
+    parts INTEGER NOT NULL DEFAULT 0,
+    bones INTEGER NOT NULL DEFAULT 0,
+    bone_count INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS assets_format ON assets(format);
+CREATE TABLE IF NOT EXISTS asset_parts(
+    part INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY(part, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS asset_parts_path ON asset_parts(path);
+'''
+
+
+class Asset(NamedTuple):
+    path: str
+    mtime_ns: int
+    size: int
+    format: str
+    frames: int = 0
+    fps: float = 0
+    unit: Optional[str] = None
+    humanoid_map: Optional[str] = None
+    # HumanoidBodyParts の value
+    parts: int = 0
+    # get_bone_mask
+    bones: int = 0
+    bone_count: int = 0
+    error: Optional[str] = None
+
+    def get_parts(self) -> HumanoidBodyParts:
+        return HumanoidBodyParts(self.parts)
+
+
+def _split_parts(parts: HumanoidBodyParts) -> List[int]:
+    return [part.value for part in HumanoidBodyParts if part in parts]
+
+
+def _humanoid(humanoid_bones: Iterable[HumanoidBone]) -> Dict[str, Any]:
+    humanoid_bones = list(humanoid_bones)
+    return {
+        'parts': get_body_parts(humanoid_bones).value,
+        'bones': get_bone_mask(humanoid_bones),
+    }
+
+
+def _read_bvh(path: pathlib.Path) -> Dict[str, Any]:
+    # MOTION は読まない
+    from .bvh.bvh_stream import BvhStream
+    from .bvh import humanoid_map
+    from .bvh.skeleton_checker import SkeletonChecker
+    with BvhStream(path) as stream:
+        root = stream.root
+        name = humanoid_map.resolve(root)
+        joints = [node for node in root.traverse() if node.name]
+        return {
+            'frames': stream.frame_count,
+            'fps': 1 / stream.frametime if stream.frametime else 0,
+            'unit': SkeletonChecker(root).get_unit().name,
+            'humanoid_map': name,
+            'bone_count': len(joints),
+            **_humanoid(node.humanoid_bone for node in joints),
+        }
+
+
+def _read_vmd(path: pathlib.Path) -> Dict[str, Any]:
+    from .vmd_loader import Vmd, FPS
+    vmd = Vmd.load(path.name, path.read_bytes())
+    return {
+        'frames': vmd.max_frame + 1,
+        'fps': FPS,
+        'unit': 'mmd',
+        'humanoid_map': 'mmd',
+        'bone_count': len(vmd.curves),
+        **_humanoid(vmd.get_humanbones()),
+    }
+
+
+def _read_vpd(path: pathlib.Path) -> Dict[str, Any]:
+    from .vpd_loader import Vpd
+    vpd = Vpd.load(path.name, path.read_bytes())
+    return {
+        'frames': 1,
+        'unit': 'mmd',
+        'humanoid_map': 'mmd',
+        'bone_count': len(vpd.pose.bones),
+        **_humanoid(vpd.get_humanbones()),
+    }
+
+
+def _read_pmx(path: pathlib.Path) -> Dict[str, Any]:
+    from .pmx_loader import Pmx
+    from .pmd_loader import BONE_HUMANOID_MAP
+    pmx = Pmx(path.read_bytes(), skeleton_only=True)
+    return {
+        'unit': 'mmd',
+        'humanoid_map': 'mmd',
+        'bone_count': len(pmx.bones),
+        **_humanoid(BONE_HUMANOID_MAP.get(bone.name_ja, HumanoidBone.unknown) for bone in pmx.bones),
+    }
+
+
+def _read_pmd(path: pathlib.Path) -> Dict[str, Any]:
+    from .pmd_loader import Pmd, BONE_HUMANOID_MAP
+    from .bytesreader import bytes_to_str
+    pmd = Pmd(path.read_bytes(), skeleton_only=True)
+    return {
+        'unit': 'mmd',
+        'humanoid_map': 'mmd',
+        'bone_count': len(pmd.bones),
+        **_humanoid(BONE_HUMANOID_MAP.get(bytes_to_str(bytes(bone.name)), HumanoidBone.unknown) for bone in pmd.bones),
+    }
+
+
+def _read_glb(path: pathlib.Path) -> Dict[str, Any]:
+    from .gltf_loader import Gltf
+    if path.suffix.lower() == '.gltf':
+        gltf = Gltf.load_gltf(path, skeleton_only=True)
+    else:
+        gltf = Gltf.load_glb_path(path, skeleton_only=True)
+    match gltf.vrm:
+        case 0:
+            human_bone_map = gltf.get_vrm0_human_bone_map()
+        case 1:
+            human_bone_map = gltf.get_vrm1_human_bone_map()
+        case _:
+            human_bone_map = {}
+    return {
+        'unit': 'meter',
+        'humanoid_map': f'vrm{gltf.vrm}' if gltf.vrm is not None else None,
+        'bone_count': len(gltf.gltf.get('nodes', [])),
+        **_humanoid(human_bone_map.values()),
+    }
+
+
+READERS = {
+    '.bvh': _read_bvh,
+    '.vmd': _read_vmd,
+    '.vpd': _read_vpd,
+    '.pmx': _read_pmx,
+    '.pmd': _read_pmd,
+    '.gltf': _read_glb,
+    '.glb': _read_glb,
+    '.vrm': _read_glb,
+}
+
+
+def index_file(path: str) -> Optional[Asset]:
+    '''
+    process pool の worker で実行する。scan 中に消えた file は None
+    '''
+    p = pathlib.Path(path)
+    format = p.suffix.lower()[1:]
+    try:
+        stat = p.stat()
+    except OSError:
+        return None
+    try:
+        values = READERS[p.suffix.lower()](p)
+        return Asset(path, stat.st_mtime_ns, stat.st_size, format, **values)
+    except Exception as e:
+        # 壊れた file も記録して、変更されるまで読みなおさない
+        return Asset(path, stat.st_mtime_ns, stat.st_size, format, error=f'{type(e).__name__}: {e}')
+
+
+def find_files(root: pathlib.Path) -> Iterable[pathlib.Path]:
+    for dir, _, files in os.walk(root):
+        for file in files:
+            if os.path.splitext(file)[1].lower() in SUFFIXES:
+                yield pathlib.Path(dir) / file
+
+
+class Catalog:
+    def __init__(self, db_path: pathlib.Path) -> None:
+        self.db_path = db_path
+        self.connection = sqlite3.connect(str(db_path))
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self) -> 'Catalog':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute('SELECT COUNT(*) FROM assets').fetchone()[0]
+
+    def scan(self, *roots: pathlib.Path, max_workers: Optional[int] = None) -> Tuple[int, int]:
+        '''
+        roots 以下を索引する。(読んだ数, 消した数)
+        '''
+        known: Dict[str, Tuple[int, int]] = {}
+        # /x/motions が /x/motions2 に match しないように区切りまで含める
+        prefixes = [str(root.resolve()).rstrip(os.sep) + os.sep
+                    for root in roots]
+        for path, mtime_ns, size in self.connection.execute('SELECT path, mtime_ns, size FROM assets'):
+            if any(path.startswith(prefix) for prefix in prefixes):
+                known[path] = (mtime_ns, size)
+
+        updates: List[str] = []
+        for root in roots:
+            for path in find_files(root.resolve()):
+                key = str(path)
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if known.pop(key, None) != (stat.st_mtime_ns, stat.st_size):
+                    updates.append(key)
+
+        results: List[Optional[Asset]] = []
+        if len(updates) > 1 and max_workers != 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+                results = list(executor.map(index_file, updates,
+                                            chunksize=max(1, len(updates) // 64)))
+        else:
+            results = [index_file(path) for path in updates]
+        assets = [asset for asset in results if asset is not None]
+        for path, asset in zip(updates, results):
+            if asset is None:
+                # 読む前に消えた
+                known[path] = (0, 0)
+
+        with self.connection:
+            # 残りは消えた file
+            self.connection.executemany(
+                'DELETE FROM assets WHERE path = ?', [(path,) for path in known])
+            self.connection.executemany(
+                'DELETE FROM asset_parts WHERE path = ?', [(path,) for path in known] + [(asset.path,) for asset in assets])
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO assets VALUES ({", ".join("?" * len(Asset._fields))})', assets)
+            self.connection.executemany(
+                'INSERT INTO asset_parts VALUES (?, ?)',
+                [(part, asset.path) for asset in assets if not asset.error
+                 for part in _split_parts(asset.get_parts())])
+        for asset in assets:
+            if asset.error:
+                LOGGER.warning(f'{asset.path}: {asset.error}')
+        return len(assets), len(known)
+
+    def query(self, *,
+              formats: Iterable[str] = (),
+              has_parts: HumanoidBodyParts = HumanoidBodyParts(0),
+              no_parts: HumanoidBodyParts = HumanoidBodyParts(0),
+              has_bones: Iterable[HumanoidBone] = (),
+              no_bones: Iterable[HumanoidBone] = ()) -> List[Asset]:
+        '''
+        has_*: すべてを含む
+        no_*: どれも含まない
+        '''
+        where = ['error IS NULL']
+        params: List[Any] = []
+        formats = list(formats)
+        if formats:
+            where.append(f'format IN ({", ".join("?" * len(formats))})')
+            params += formats
+        for part in _split_parts(has_parts):
+            where.append(
+                'path IN (SELECT path FROM asset_parts WHERE part = ?)')
+            params.append(part)
+        parts = _split_parts(no_parts)
+        if parts:
+            where.append(
+                f'path NOT IN (SELECT path FROM asset_parts WHERE part IN ({", ".join("?" * len(parts))}))')
+            params += parts
+        has_mask = get_bone_mask(has_bones)
+        if has_mask:
+            where.append('(bones & ?) = ?')
+            params += [has_mask, has_mask]
+        no_mask = get_bone_mask(no_bones)
+        if no_mask:
+            where.append('(bones & ?) = 0')
+            params.append(no_mask)
+        return [Asset(*row) for row in self.connection.execute(
+            f'SELECT * FROM assets WHERE {" AND ".join(where)} ORDER BY path', params)]
+
+    def get(self, path: pathlib.Path) -> Optional[Asset]:
+        row = self.connection.execute(
+            'SELECT * FROM assets WHERE path = ?', (str(path.resolve()),)).fetchone()
+        return Asset(*row) if row else None
@@ -1,7 +1,11 @@
-from typing import Optional, Iterable, List, Tuple, Callable, Dict
+from typing import Optional, Iterable, List, Tuple, Callable, Dict, TYPE_CHECKING
 import logging
 import glm
 from .transform import Transform, trs_matrix
+if TYPE_CHECKING:
+    # OpenGL が要るので型だけ
+    from scene.mesh_renderer import MeshRenderer
+    from .node_array import NodeArray
 
 LOGGER = logging.getLogger(__name__)
 NODE_ID = 1
@@ -25,24 +29,87 @@ class Node:
         self.name = name
         self.children = children[:] if children else []
         self.parent: Optional[Node] = None
+        # NodeArray に入っているときは行列などを配列に置く
+        self._array: Optional['NodeArray'] = None
+        self._array_index = -1
         assert isinstance(local_trs, Transform)
-        self.init_trs = local_trs
+        self._init_trs = local_trs
+        self._pose: Optional[Transform] = None
 
-        self.world_matrix = glm.mat4()
-        self.bind_matrix = glm.mat4()
+        self._world_matrix = glm.mat4()
+        self._bind_matrix = glm.mat4()
+        # bind_matrix の逆行列。必要になったときに計算する
+        self._inverse_bind_matrix: Optional[glm.mat4] = glm.mat4()
 
         # renderer
-        from scene.mesh_renderer import MeshRenderer
-        self.renderer: Optional[MeshRenderer] = None
+        self.renderer: Optional['MeshRenderer'] = None
         # UI
         self.has_weighted_vertices = False
-        # skinning
-        self.pose: Optional[Transform] = None
 
         for node, parent in self.traverse_node_and_parent():
             if parent:
                 node.parent = parent
 
+    @property
+    def init_trs(self) -> Transform:
+        return self._init_trs
+
+    @init_trs.setter
+    def init_trs(self, value: Transform):
+        self._init_trs = value
+        if self._array:
+            self._array.set_init(self._array_index, value)
+
+    @property
+    def pose(self) -> Optional[Transform]:
+        '''
+        skinning
+        '''
+        return self._pose
+
+    @pose.setter
+    def pose(self, value: Optional[Transform]):
+        if value == self._pose:
+            return
+        self._pose = value
+        if self._array:
+            self._array.set_pose(self._array_index, value)
+
+    @property
+    def world_matrix(self) -> glm.mat4:
+        if self._array:
+            return self._array.get_world_matrix(self._array_index)
+        return self._world_matrix
+
+    @world_matrix.setter
+    def world_matrix(self, value: glm.mat4):
+        if self._array:
+            self._array.set_world(self._array_index, value)
+        else:
+            self._world_matrix = value
+
+    @property
+    def bind_matrix(self) -> glm.mat4:
+        if self._array:
+            return self._array.get_bind_matrix(self._array_index)
+        return self._bind_matrix
+
+    @bind_matrix.setter
+    def bind_matrix(self, value: glm.mat4):
+        if self._array:
+            self._array.set_bind(self._array_index, value)
+        else:
+            self._bind_matrix = value
+            self._inverse_bind_matrix = None
+
+    @property
+    def inverse_bind_matrix(self) -> glm.mat4:
+        if self._array:
+            return self._array.get_inverse_bind_matrix(self._array_index)
+        if self._inverse_bind_matrix is None:
+            self._inverse_bind_matrix = glm.inverse(self._bind_matrix)
+        return self._inverse_bind_matrix
+
     def traverse_node_and_parent(self, parent: Optional['Node'] = None) -> Iterable[Tuple['Node', Optional['Node']]]:
         yield self, parent
         for child in self.children:
@@ -70,7 +137,7 @@ class Node:
 
     @property
     def skinning_matrix(self) -> glm.mat4:
-        return self.world_matrix * glm.inverse(self.bind_matrix)
+        return self.world_matrix * self.inverse_bind_matrix
 
     def add_child(self, child: 'Node', *, insert=False):
         if child.parent:
@@ -0,0 +1,190 @@
+'''
+Node の木を配列にしたもの
+
+node は親が先に来る順(traverse_node_and_parent の順)に並べて、親の index を持つ。
+local の TRS を配列に集めて、world 行列を深さ毎にまとめて計算する。
+
+行列は glm.mat4 と同じ列優先で (n, 4, 4) の float32 に入れる。
+m[i][col][row] なので、そのまま uniform に渡せる。
+列優先の転置で見ると W = P * L は W' = L' @ P' になる。
+
+作った後は Node の init_trs, pose, world_matrix, bind_matrix はこの配列を読み書きする。
+bind 行列の逆行列も calc_bind_matrices でまとめて計算しておく。
+'''
+from typing import List, Dict, Optional
+import glm
+import numpy
+from humanoid import batch_math
+from .node import Node
+from .transform import Transform
+
+
+def trs_matrices(t: numpy.ndarray, r: numpy.ndarray, s: numpy.ndarray, out: Optional[numpy.ndarray] = None) -> numpy.ndarray:
+    '''
+    (n, 3), (n, 4), (n, 3) から列優先の (n, 4, 4)。trs_matrix と同じ
+    '''
+    if out is None:
+        out = numpy.empty((len(t), 4, 4), dtype=numpy.float32)
+    # 回転行列の列 j が out[:, j, 0:3]
+    out[:, 0:3, 0:3] = numpy.swapaxes(
+        batch_math.to_matrix(r), -1, -2) * s[:, :, None]
+    out[:, 0:3, 3] = 0
+    out[:, 3, 0:3] = t
+    out[:, 3, 3] = 1
+    return out
+
+
+class NodeArray:
+    def __init__(self, root: Node) -> None:
+        self.nodes: List[Node] = []
+        parents: List[int] = []
+        self.index: Dict[Node, int] = {}
+        for node, parent in root.traverse_node_and_parent():
+            self.index[node] = len(self.nodes)
+            self.nodes.append(node)
+            parents.append(self.index[parent] if parent else -1)
+        n = len(self.nodes)
+        self.parents = numpy.array(parents, dtype=numpy.int32)
+
+        # 深さ毎の node の index
+        depth = numpy.zeros(n, dtype=numpy.int32)
+        for i, parent in enumerate(parents):
+            if parent >= 0:
+                depth[i] = depth[parent] + 1
+        self.levels = [numpy.flatnonzero(depth == d)
+                       for d in range(int(depth.max()) + 1 if n else 0)]
+        # 子孫は [i, subtree_end[i]) に並んでいる
+        self.subtree_end = numpy.arange(1, n + 1, dtype=numpy.int32)
+        for i in range(n - 1, 0, -1):
+            parent = parents[i]
+            if parent >= 0 and self.subtree_end[i] > self.subtree_end[parent]:
+                self.subtree_end[parent] = self.subtree_end[i]
+
+        # init_trs か pose が変わった node。子孫も計算しなおす
+        self.dirty = numpy.ones(n, dtype=bool)
+        # world_matrices を更新すると増える
+        self.version = 0
+        # bind_matrices を更新すると増える
+        self.bind_version = 0
+
+        self.init_translations = numpy.zeros((n, 3), dtype=numpy.float32)
+        self.init_rotations = numpy.zeros((n, 4), dtype=numpy.float32)
+        self.init_scales = numpy.zeros((n, 3), dtype=numpy.float32)
+        self.pose_translations = numpy.zeros((n, 3), dtype=numpy.float32)
+        self.pose_rotations = numpy.zeros((n, 4), dtype=numpy.float32)
+        self.pose_scales = numpy.zeros((n, 3), dtype=numpy.float32)
+
+        self.local_matrices = numpy.zeros((n, 4, 4), dtype=numpy.float32)
+        self.world_matrices = numpy.zeros((n, 4, 4), dtype=numpy.float32)
+        self.bind_matrices = numpy.zeros((n, 4, 4), dtype=numpy.float32)
+        self.inverse_bind_matrices = numpy.zeros((n, 4, 4), dtype=numpy.float32)
+
+        # 以降 node の init_trs, pose, 行列はこの配列に読み書きする
+        for i, node in enumerate(self.nodes):
+            self.set_init(i, node.init_trs)
+            self.set_pose(i, node.pose)
+            self.world_matrices[i] = node.world_matrix.to_list()
+            self.bind_matrices[i] = node.bind_matrix.to_list()
+            node._array = self
+            node._array_index = i
+        if n:
+            self.inverse_bind_matrices[:] = numpy.linalg.inv(self.bind_matrices)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def set_init(self, i: int, value: Transform):
+        self.dirty[i] = True
+        t, r, s = value
+        self.init_translations[i] = (t.x, t.y, t.z)
+        self.init_rotations[i] = (r.x, r.y, r.z, r.w)
+        self.init_scales[i] = (s.x, s.y, s.z)
+
+    def set_pose(self, i: int, value: Optional[Transform]):
+        self.dirty[i] = True
+        if value:
+            t, r, s = value
+            self.pose_translations[i] = (t.x, t.y, t.z)
+            self.pose_rotations[i] = (r.x, r.y, r.z, r.w)
+            self.pose_scales[i] = (s.x, s.y, s.z)
+        else:
+            self.pose_translations[i] = 0
+            self.pose_rotations[i] = (0, 0, 0, 1)
+            self.pose_scales[i] = 1
+
+    def get_world_matrix(self, i: int) -> glm.mat4:
+        return glm.mat4(*self.world_matrices[i].ravel().tolist())
+
+    def get_bind_matrix(self, i: int) -> glm.mat4:
+        return glm.mat4(*self.bind_matrices[i].ravel().tolist())
+
+    def set_world(self, i: int, value: glm.mat4):
+        self.world_matrices[i] = value.to_list()
+        self.version += 1
+
+    def get_inverse_bind_matrix(self, i: int) -> glm.mat4:
+        return glm.mat4(*self.inverse_bind_matrices[i].ravel().tolist())
+
+    def set_bind(self, i: int, value: glm.mat4):
+        self.bind_matrices[i] = value.to_list()
+        self.inverse_bind_matrices[i] = glm.inverse(value).to_list()
+        self.bind_version += 1
+
+    def _calc(self, out: numpy.ndarray, mask: Optional[numpy.ndarray] = None):
+        '''
+        local_matrices から out を計算する。mask があれば mask の node だけ
+        '''
+        for d, level in enumerate(self.levels):
+            if mask is not None:
+                level = level[mask[level]]
+                if len(level) == 0:
+                    continue
+            if d == 0:
+                # root
+                out[level] = self.local_matrices[level]
+            else:
+                out[level] = numpy.matmul(
+                    self.local_matrices[level], out[self.parents[level]])
+        return out
+
+    def get_dirty_mask(self) -> numpy.ndarray:
+        '''
+        dirty な node とその子孫
+        '''
+        begin = numpy.flatnonzero(self.dirty)
+        count = numpy.zeros(len(self.nodes) + 1, dtype=numpy.int32)
+        numpy.add.at(count, begin, 1)
+        numpy.add.at(count, self.subtree_end[begin], -1)
+        return numpy.cumsum(count[:-1]) > 0
+
+    def calc_bind_matrices(self):
+        '''
+        Node.calc_bind_matrix と同じ
+        '''
+        trs_matrices(self.init_translations, self.init_rotations,
+                     self.init_scales, self.local_matrices)
+        self._calc(self.bind_matrices)
+        self.inverse_bind_matrices[:] = numpy.linalg.inv(self.bind_matrices)
+        self.bind_version += 1
+        # local_matrices を上書きしたので
+        self.dirty[:] = True
+
+    def calc_world_matrices(self) -> bool:
+        '''
+        Node.calc_world_matrix と同じ。Local = Init x Pose
+
+        変わった node の subtree だけ計算する。何も変わっていなければ False
+        '''
+        if not self.dirty.any():
+            return False
+        mask = self.get_dirty_mask()
+        index = numpy.flatnonzero(mask)
+        self.local_matrices[index] = trs_matrices(
+            self.init_translations[index] + self.pose_translations[index],
+            batch_math.multiply(
+                self.init_rotations[index], self.pose_rotations[index]),
+            self.init_scales[index] * self.pose_scales[index])
+        self._calc(self.world_matrices, mask)
+        self.dirty[:] = False
+        self.version += 1
+        return True
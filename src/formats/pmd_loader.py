@@ -1,9 +1,10 @@
 '''
 https://blog.goo.ne.jp/torisu_tetosuki/e/209ad341d3ece2b1b4df24abf619d6e4
 '''
-from typing import List, Dict, Iterable
+from typing import List, Dict, Iterable, Optional
 import ctypes
-from ..humanoid.humanoid_bones import HumanoidBone
+import numpy
+from humanoid.humanoid_bones import HumanoidBone
 from .bytesreader import BytesReader
 from .buffer_types import Float3, Float4, RenderVertex
 
@@ -37,8 +38,8 @@ BONE_HUMANOID_MAP = {
     '右足首': HumanoidBone.rightFoot,
     '右つま先': HumanoidBone.rightToes,
 
-    '左親指０': HumanoidBone.leftThumbProximal,
-    '左親指１': HumanoidBone.leftThumbIntermediate,
+    '左親指０': HumanoidBone.leftThumbMetacarpal,
+    '左親指１': HumanoidBone.leftThumbProximal,
     '左親指２': HumanoidBone.leftThumbDistal,
     '左人指１': HumanoidBone.leftIndexProximal,
     '左人指２': HumanoidBone.leftIndexIntermediate,
@@ -53,8 +54,8 @@ BONE_HUMANOID_MAP = {
     '左小指２': HumanoidBone.leftLittleIntermediate,
     '左小指３': HumanoidBone.leftLittleDistal,
 
-    '右親指０': HumanoidBone.rightThumbProximal,
-    '右親指１': HumanoidBone.rightThumbIntermediate,
+    '右親指０': HumanoidBone.rightThumbMetacarpal,
+    '右親指１': HumanoidBone.rightThumbProximal,
     '右親指２': HumanoidBone.rightThumbDistal,
     '右人指１': HumanoidBone.rightIndexProximal,
     '右人指２': HumanoidBone.rightIndexIntermediate,
@@ -130,6 +131,33 @@ assert ctypes.sizeof(Submesh) == 70
 assert ctypes.sizeof(Bone) == 39
 assert ctypes.sizeof(MorphVertex) == 16
 
+# 上の Structure と同じ並びの numpy の dtype
+VERTEX_DTYPE = numpy.dtype([
+    ('position', numpy.float32, 3),
+    ('normal', numpy.float32, 3),
+    ('uv', numpy.float32, 2),
+    ('bone0', numpy.uint16),
+    ('bone1', numpy.uint16),
+    ('weight', numpy.int8),
+    ('flag', numpy.int8),
+])
+BONE_DTYPE = numpy.dtype([
+    ('name', numpy.uint8, 20),
+    ('parent_index', numpy.uint16),
+    ('tail_index', numpy.uint16),
+    ('type', numpy.int8),
+    ('ik_index', numpy.uint16),
+    ('position', numpy.float32, 3),
+])
+MORPH_VERTEX_DTYPE = numpy.dtype([
+    ('index', numpy.uint32),
+    ('position', numpy.float32, 3),
+])
+
+assert VERTEX_DTYPE.itemsize == ctypes.sizeof(Vertex)
+assert BONE_DTYPE.itemsize == ctypes.sizeof(Bone)
+assert MORPH_VERTEX_DTYPE.itemsize == ctypes.sizeof(MorphVertex)
+
 
 class Ik:
     def __init__(self, bone_index: int,
@@ -145,17 +173,38 @@ class Ik:
 
 
 class Morph:
-    def __init__(self, name: str, morph_type: int, vertices: ctypes.Array) -> None:
+    def __init__(self, name: str, morph_type: int, data: bytes) -> None:
+        '''
+        data: この morph の頂点の block だけを複製したもの。
+        頂点は最初に vertices を使うときに読む
+        '''
         self.name = name
         self.morph_type = morph_type
-        self.vertices = vertices
+        self._data = data
+        self.vertex_count = len(data) // ctypes.sizeof(MorphVertex)
+        self._vertices: Optional[ctypes.Array] = None
+
+    @property
+    def vertices(self) -> ctypes.Array:
+        if self._vertices is None:
+            self._vertices = (MorphVertex * self.vertex_count).from_buffer_copy(
+                self._data)
+            self._data = b''
+        return self._vertices
+
+    @property
+    def vertex_array(self) -> numpy.ndarray:
+        return numpy.frombuffer(self.vertices, dtype=MORPH_VERTEX_DTYPE)
 
     def __str__(self) -> str:
         return f'[{self.morph_type}:{self.name}]'
 
 
 class Pmd:
-    def __init__(self, data):
+    def __init__(self, data, *, skeleton_only: bool = False):
+        '''
+        skeleton_only: 頂点, index, material, morph を読み飛ばして bone と IK だけ読む
+        '''
         assert isinstance(data, bytes)
         r = BytesReader(data)
         assert r.bytes(3) == b'Pmd'
@@ -164,29 +213,37 @@ class Pmd:
         self.comment = r.str(256, encoding='cp932')
 
         vertex_count = r.uint32()
-        self.deform_bones: Dict[int, int] = {}
-        self.vertices = r.array(Vertex * vertex_count)
-        for v in self.vertices:
-            v.render.position.x *= SCALING_FACTOR
-            v.render.position.y *= SCALING_FACTOR
-            v.render.position.z *= SCALING_FACTOR
-            self.deform_bones[v.option.bone0] = self.deform_bones.get(
-                v.option.bone0, 0)+1
-            self.deform_bones[v.option.bone1] = self.deform_bones.get(
-                v.option.bone1, 0)+1
+        if skeleton_only:
+            r.pos += ctypes.sizeof(Vertex) * vertex_count
+            self.vertices = (Vertex * 0)()
+        else:
+            self.vertices = r.array(Vertex * vertex_count)
+        # self.vertices と同じ memory
+        self.vertex_array = numpy.frombuffer(self.vertices, dtype=VERTEX_DTYPE)
+        self.vertex_array['position'] *= SCALING_FACTOR
+        counts = numpy.bincount(numpy.concatenate(
+            [self.vertex_array['bone0'], self.vertex_array['bone1']]))
+        self.deform_bones: Dict[int, int] = {
+            int(i): int(counts[i]) for i in numpy.flatnonzero(counts)}
 
         face_vertex_count = r.uint32()
-        self.indices = r.array(ctypes.c_uint16 * face_vertex_count)
+        if skeleton_only:
+            r.pos += ctypes.sizeof(ctypes.c_uint16) * face_vertex_count
+            self.indices = (ctypes.c_uint16 * 0)()
+        else:
+            self.indices = r.array(ctypes.c_uint16 * face_vertex_count)
 
         submesh_count = r.uint32()
-        self.submeshes = r.array(Submesh * submesh_count)
+        if skeleton_only:
+            r.pos += ctypes.sizeof(Submesh) * submesh_count
+            self.submeshes = (Submesh * 0)()
+        else:
+            self.submeshes = r.array(Submesh * submesh_count)
 
         bone_count = r.uint16()
         self.bones = r.array(Bone * bone_count)
-        for b in self.bones:
-            b.position.x *= SCALING_FACTOR
-            b.position.y *= SCALING_FACTOR
-            b.position.z *= SCALING_FACTOR
+        self.bone_array = numpy.frombuffer(self.bones, dtype=BONE_DTYPE)
+        self.bone_array['position'] *= SCALING_FACTOR
 
         self.ik = []
         ik_count = r.uint16()
@@ -201,13 +258,16 @@ class Pmd:
                            iterations, rotation_limit, chain))
 
         self.morphs = []
+        if skeleton_only:
+            return
         morph_count = r.uint16()
         for i in range(morph_count):
             name = r.str(20, encoding='cp932')
             vertex_count = r.uint32()
             morph_type = r.uint8()
-            morph_vertices = r.array(MorphVertex * vertex_count)
-            self.morphs.append(Morph(name, morph_type, morph_vertices))
+            # ファイル全体を持ち続けないように block だけ切り出す
+            self.morphs.append(Morph(name, morph_type, r.bytes(
+                ctypes.sizeof(MorphVertex) * vertex_count)))
 
     def __str__(self) -> str:
         return f'<pmd {self.name}: {len(self.vertices)}vert, {len(self.indices)//3}tri, {len(self.submeshes)}materials, {len(self.bones)}bones, {len(self.ik)}IK, {len(self.morphs)}morphs>'
@@ -1,5 +1,6 @@
-from typing import List, Optional, Dict, Iterable
+from typing import List, Optional, Dict, Iterable, Tuple
 import ctypes
+import numpy
 from .bytesreader import BytesReader
 from .buffer_types import Vertex4BoneWeights, RenderVertex, Float3, Float4
 
@@ -28,6 +29,110 @@ BONE_LOCAL_AXIS = 0x0800
 BONE_EXTERNAL_PARENT = 0x2000
 
 
+# deform type => (bone 数, weight 数, その他の byte 数)
+# BDEF1, BDEF2, BDEF4, SDEF(BDEF2 として読む), QDEF(BDEF4 として読む)
+DEFORM_LAYOUT = {
+    0: (1, 0, 0),
+    1: (2, 1, 0),
+    2: (4, 4, 0),
+    3: (2, 1, 36),
+    4: (4, 4, 0),
+}
+
+INDEX_DTYPE = {
+    1: numpy.uint8,
+    2: numpy.uint16,
+    4: numpy.int32,
+}
+
+
+def scan_vertices(data: bytes, pos: int, vertex_count: int, bone_index_size: int) -> Tuple[List[int], List[int], int]:
+    '''
+    deform type から各頂点の先頭 offset を求める。中身は読まない
+
+    (offsets, deform types, 頂点の後ろの pos)
+    '''
+    render_size = ctypes.sizeof(RenderVertex)
+    # RenderVertex + deform type + ... + edge_scale
+    record_sizes = {
+        flag: render_size + 1 + bones * bone_index_size + weights * 4 + extra + 4
+        for flag, (bones, weights, extra) in DEFORM_LAYOUT.items()}
+
+    starts = [0] * vertex_count
+    flags = [0] * vertex_count
+    for i in range(vertex_count):
+        flag = data[pos + render_size]
+        size = record_sizes.get(flag)
+        if not size:
+            raise NotImplementedError(f'deform type: {flag}')
+        starts[i] = pos
+        flags[i] = flag
+        pos += size
+    return starts, flags, pos
+
+
+def read_vertices(data: bytes, pos: int, vertex_count: int, bone_index_size: int) -> Tuple[ctypes.Array, Dict[int, int], int]:
+    '''
+    可変長の頂点を二回に分けて読む。
+
+    1. scan_vertices で各頂点の先頭 offset を求める
+    2. offset から position, normal, uv, bone, weight をまとめて取り出す
+
+    (vertices, deform_bones, 頂点の後ろの pos)
+    '''
+    render_size = ctypes.sizeof(RenderVertex)
+    starts, flags, pos = scan_vertices(data, pos, vertex_count, bone_index_size)
+
+    buffer = numpy.frombuffer(data, dtype=numpy.uint8)
+    offsets = numpy.array(starts, dtype=numpy.int64)
+    deform = numpy.array(flags, dtype=numpy.uint8)
+
+    def gather(offsets: numpy.ndarray, size: int) -> numpy.ndarray:
+        return buffer[offsets[:, None] + numpy.arange(size)]
+
+    vertices = (Vertex4BoneWeights * vertex_count)()
+    dst = numpy.frombuffer(vertices, dtype=numpy.float32).reshape(
+        vertex_count, -1)
+    # position, normal, uv
+    dst[:, 0:8] = gather(offsets, render_size).view(numpy.float32)
+    dst[:, 0:3] *= SCALING_FACTOR
+
+    # bone
+    base = offsets + render_size + 1
+    bone_counts = numpy.array([DEFORM_LAYOUT.get(flag, (0, 0, 0))[0]
+                              for flag in range(256)])[deform]
+    bones = numpy.full((vertex_count, 4), -1, dtype=numpy.int64)
+    index_dtype = INDEX_DTYPE[bone_index_size]
+    for i in range(4):
+        mask = bone_counts > i
+        if not mask.any():
+            continue
+        index = gather(base[mask] + i * bone_index_size,
+                       bone_index_size).view(index_dtype)[:, 0].astype(numpy.int64)
+        if bone_index_size < 4:
+            # 255, 65535 は無効
+            index[index == numpy.iinfo(index_dtype).max] = -1
+        bones[mask, i] = index
+    dst[:, 8:12] = bones
+
+    # weight
+    weight_base = base + bone_counts * bone_index_size
+    dst[:, 12:16] = 0
+    dst[deform == 0, 12] = 1
+    mask = (deform == 1) | (deform == 3)
+    if mask.any():
+        w0 = gather(weight_base[mask], 4).view(numpy.float32)[:, 0]
+        dst[mask, 12] = w0
+        dst[mask, 13] = 1 - w0
+    mask = (deform == 2) | (deform == 4)
+    if mask.any():
+        dst[mask, 12:16] = gather(weight_base[mask], 16).view(numpy.float32)
+
+    counts = numpy.bincount(bones[bones >= 0])
+    deform_bones = {int(i): int(counts[i]) for i in numpy.flatnonzero(counts)}
+    return vertices, deform_bones, pos
+
+
 class Bone:
     def __init__(self, name_ja: str, name_en: str, position: Float3, parent_index: int) -> None:
         self.name_ja = name_ja
@@ -38,7 +143,10 @@ class Bone:
 
 
 class Pmx:
-    def __init__(self, data: bytes) -> None:
+    def __init__(self, data: bytes, *, skeleton_only: bool = False) -> None:
+        '''
+        skeleton_only: 頂点, index, texture, material を読み飛ばして bone だけ読む
+        '''
         r = BytesReader(data)
 
         assert r.bytes(4) == b'PMX '
@@ -97,101 +205,45 @@ class Pmx:
         bone_index = create_index_reader(header[5])
 
         # info
-        self.name_ja = text_buf()
-        self.name_en = text_buf()
-        self.comment_ja = text_buf()
-        self.comment_en = text_buf()
+        name_ja = text_buf()
+        name_en = text_buf()
+        comment_ja = text_buf()
+        comment_en = text_buf()
 
         # vertices
         vertex_count = r.uint32()
-        self.deform_bones: Dict[int, int] = {}
-        self.vertices = (Vertex4BoneWeights * vertex_count)()
-        for i, v in enumerate(self.vertices):
-            rv = r.struct(RenderVertex)
-            v.position = rv.position * SCALING_FACTOR
-            v.normal = rv.normal
-            v.uv = rv.uv
-
-            flag = r.uint8()
-            match flag:
-                case 0:
-                    # BDEF1
-                    v.bone.x = bone_index()
-                    v.bone.y = -1
-                    v.bone.z = -1
-                    v.bone.w = -1
-                    v.weight.x = 1
-                    v.weight.y = 0
-                    v.weight.z = 0
-                    v.weight.w = 0
-
-                case 1:
-                    # BDEF2
-                    v.bone.x = bone_index()
-                    v.bone.y = bone_index()
-                    v.bone.z = -1
-                    v.bone.w = -1
-                    v.weight.x = r.float32()
-                    v.weight.y = 1-v.weight.x
-                    v.weight.z = 0
-                    v.weight.w = 0
-
-                case 2:
-                    # BDEF4
-                    v.bone.x = bone_index()
-                    v.bone.y = bone_index()
-                    v.bone.z = bone_index()
-                    v.bone.w = bone_index()
-                    v.weight.x = r.float32()
-                    v.weight.y = r.float32()
-                    v.weight.z = r.float32()
-                    v.weight.w = r.float32()
-
-                case 3:
-                    # SDEF
-                    b0 = bone_index()
-                    b1 = bone_index()
-                    w0 = r.float32()
-                    c = r.struct(Float3)
-                    r0 = r.struct(Float3)
-                    r1 = r.struct(Float3)
-
-                    # fall back to BDEF2
-                    v.bone.x = b0
-                    v.bone.y = b1
-                    v.bone.z = -1
-                    v.bone.w = -1
-                    v.weight.x = w0
-                    v.weight.y = 1-w0
-                    v.weight.z = 0
-                    v.weight.w = 0
-
-            self.deform_bones[v.bone.x] = self.deform_bones.get(
-                v.bone.x, 0) + 1
-            self.deform_bones[v.bone.y] = self.deform_bones.get(
-                v.bone.y, 0) + 1
-            self.deform_bones[v.bone.z] = self.deform_bones.get(
-                v.bone.z, 0) + 1
-            self.deform_bones[v.bone.w] = self.deform_bones.get(
-                v.bone.w, 0) + 1
-
-            edge_scale = r.float32()
+        if skeleton_only:
+            _, _, r.pos = scan_vertices(
+                data, r.pos, vertex_count, header[5])
+            vertices = (Vertex4BoneWeights * 0)()
+            deform_bones: Dict[int, int] = {}
+        else:
+            vertices, deform_bones, r.pos = read_vertices(
+                data, r.pos, vertex_count, header[5])
 
         # indices
         index_count = r.uint32()
-        self.indices = r.array(index_type * index_count)
+        if skeleton_only:
+            r.pos += ctypes.sizeof(index_type) * index_count
+            indices = (index_type * 0)()
+        else:
+            indices = r.array(index_type * index_count)
+
+        def skip_text():
+            n = r.uint32()
+            r.pos += n
 
         # textures
         texture_count = r.uint32()
         for i in range(texture_count):
-            text_buf()
+            skip_text()
 
         # materials
         material_count = r.uint32()
         for i in range(material_count):
-            material_name_ja = text_buf()
-            material_name_en = text_buf()
-            material = r.struct(Material)
+            skip_text()
+            skip_text()
+            r.pos += ctypes.sizeof(Material)
             texture = texture_index()
             sphere_texture = texture_index()
             sphere_mode = r.uint8()
@@ -200,11 +252,11 @@ class Pmx:
                 toon_index = texture_index()
             elif toon_flag == 1:
                 toon_index = r.uint8()
-            comment = text_buf()
+            skip_text()
             draw_count = r.uint32()
 
         # bones
-        self.bones: List[Bone] = []
+        bones: List[Bone] = []
         bone_count = r.uint32()
         for i in range(bone_count):
             bone_name_ja = text_buf()
@@ -215,7 +267,7 @@ class Pmx:
 
             bone = Bone(bone_name_ja, bone_name_en,
                         position * SCALING_FACTOR, parent_bone_index)
-            self.bones.append(bone)
+            bones.append(bone)
 
             transform_layer = r.uint32()
             flags = r.uint16()
@@ -252,6 +304,32 @@ class Pmx:
                         min_limit = r.struct(Float3)
                         max_limit = r.struct(Float3)
 
+        self._init(name_ja, name_en, comment_ja, comment_en,
+                   vertices, indices, deform_bones, bones)
+
+    def _init(self, name_ja: str, name_en: str, comment_ja: str, comment_en: str,
+              vertices: ctypes.Array, indices: ctypes.Array, deform_bones: Dict[int, int], bones: List[Bone]):
+        self.name_ja = name_ja
+        self.name_en = name_en
+        self.comment_ja = comment_ja
+        self.comment_en = comment_en
+        self.vertices = vertices
+        self.indices = indices
+        # bone index => weight のある頂点数
+        self.deform_bones = deform_bones
+        self.bones = bones
+
+    @staticmethod
+    def from_arrays(name_ja: str, name_en: str, comment_ja: str, comment_en: str,
+                    vertices: ctypes.Array, indices: ctypes.Array, deform_bones: Dict[int, int], bones: List[Bone]) -> 'Pmx':
+        '''
+        parse 済みの値から作る。cache から戻すときに使う
+        '''
+        pmx = Pmx.__new__(Pmx)
+        pmx._init(name_ja, name_en, comment_ja, comment_en,
+                  vertices, indices, deform_bones, bones)
+        return pmx
+
     def __str__(self) -> str:
         return f'<pmx {self.name_ja}: {len(self.vertices)}vert, {len(self.indices)//3}tri, {len(self.bones)}bones>'
 
@@ -34,12 +34,16 @@ class Transform(NamedTuple):
             return f't[{self.translation}], r[{self.rotation}]'
 
     def reverse_z(self) -> 'Transform':
-        axis = glm.axis(self.rotation)
-        angle = glm.angle(self.rotation)
+        '''
+        z の反転。batch_math.reverse_z と同じ
+
+        angleAxis(-angle, (ax, ay, -az)) は成分の符号を変えるだけ
+        '''
+        t = self.translation
+        r = self.rotation
         return Transform(
-            glm.vec3(self.translation.x,
-                     self.translation.y, -self.translation.z),
-            glm.angleAxis(-angle, glm.vec3(axis.x, axis.y, -axis.z)),
+            glm.vec3(t.x, t.y, -t.z),
+            glm.quat(r.w, -r.x, -r.y, r.z),
             self.scale
         )
 
@@ -1,38 +1,73 @@
-from typing import Set, List, Iterable
-import ctypes
+from typing import Set, List, Dict, Iterable, Tuple
 import glm
+import numpy
 from .bytesreader import BytesReader, bytes_to_str
-from ..humanoid.pose import Motion, Pose, Transform, BonePose
-from ..humanoid.humanoid_bones import HumanoidBone
+from humanoid.pose import Motion, Pose, Transform, BonePose
+from humanoid.humanoid_bones import HumanoidBone
+from humanoid import batch_math
 from .pmd_loader import BONE_HUMANOID_MAP
+from .bezier import BezierTable, decode_vmd_interpolation
 
+# fixed 30FPS
+FPS = 30
+# 順方向の再生で cursor を進める回数。超えたら探索しなおす
+CURSOR_STEPS = 4
 
-class KeyFrame(ctypes.Structure):
-    _pack_ = 1
-    _fields_ = [
-        ('bone_name', ctypes.c_byte * 15),
-        ('frame', ctypes.c_uint32),
-        ('x', ctypes.c_float),
-        ('y', ctypes.c_float),
-        ('z', ctypes.c_float),
-        ('rx', ctypes.c_float),
-        ('ry', ctypes.c_float),
-        ('rz', ctypes.c_float),
-        ('rw', ctypes.c_float),
-        ('interpolation', ctypes.c_byte * 64),
-    ]
+
+KEY_FRAME_DTYPE = numpy.dtype([
+    ('bone_name', 'S15'),
+    ('frame', '<u4'),
+    ('position', '<f4', (3,)),
+    # x, y, z, w
+    ('rotation', '<f4', (4,)),
+    ('interpolation', 'u1', (64,)),
+])
+assert KEY_FRAME_DTYPE.itemsize == 111
 
 
 class BoneCurve:
-    def __init__(self, name: str) -> None:
+    def __init__(self, name: str, frames: numpy.ndarray, positions: numpy.ndarray, rotations: numpy.ndarray,
+                 curves: numpy.ndarray, bezier: BezierTable) -> None:
+        '''
+        frame 順に sort 済みの key frame の配列
+
+        curves: (N, 4) 曲線番号。key[i] の補間曲線は key[i-1] から key[i] の区間に使う
+        '''
         self.name = name
         self.humanoid_bone = BONE_HUMANOID_MAP.get(name, HumanoidBone.unknown)
-        self.key_frames: List[KeyFrame] = []
+        self.frames = frames
+        self.positions = positions
+        self.rotations = rotations
+        self.curves = curves
+        self.bezier = bezier
+
+    def get_end_frame(self) -> int:
+        return int(self.frames[-1])
 
-    def get_transform(self, frame: int) -> Transform:
-        # TODO: set time
-        k = self.key_frames[0]
-        return Transform(glm.vec3(k.x, k.y, k.z), glm.quat(k.rw, k.rx, k.ry, k.rz), glm.vec3(1))
+    def _get_key(self, i: int) -> Transform:
+        x, y, z, w = self.rotations[i]
+        return Transform(glm.vec3(*self.positions[i]), glm.quat(w, x, y, z), glm.vec3(1))
+
+    def get_transform(self, frame: float) -> Transform:
+        i = int(numpy.searchsorted(self.frames, frame, side='right'))
+        if i == 0:
+            return self._get_key(0)
+        if i >= len(self.frames):
+            return self._get_key(len(self.frames) - 1)
+
+        begin = self.frames[i-1]
+        end = self.frames[i]
+        x = (frame - begin) / (end - begin)
+        # x, y, z, rotation
+        w = self.bezier.evaluate(self.curves[i], x)
+        p0 = self.positions[i-1]
+        p1 = self.positions[i]
+        t = p0 + (p1 - p0) * w[0:3]
+        x0, y0, z0, w0 = self.rotations[i-1]
+        x1, y1, z1, w1 = self.rotations[i]
+        r = glm.slerp(glm.quat(w0, x0, y0, z0),
+                      glm.quat(w1, x1, y1, z1), float(w[3]))
+        return Transform(glm.vec3(*t), r, glm.vec3(1))
 
 
 class Vmd(Motion):
@@ -42,22 +77,66 @@ class Vmd(Motion):
         self.curves = curves
         self._humanbones = set(
             curve.humanoid_bone for curve in self.curves if curve.humanoid_bone.is_enable())
-        self.set_time(0)
         self.max_frame = 0
         for curve in self.curves:
-            # sort key frames by frame number
-            curve.key_frames.sort(key=lambda x: x.frame)
-
-            end_frame = curve.key_frames[-1].frame
+            end_frame = curve.get_end_frame()
             if end_frame > self.max_frame:
                 self.max_frame = end_frame
 
-        # fixed 30FPS
-        self.seconds = self.max_frame / 30
+        self.seconds = self.max_frame / FPS
+
+        # 全 curve の key を連結した配列。reverse_z 済み
+        lengths = numpy.array([len(curve.frames)
+                              for curve in self.curves], dtype=numpy.int64)
+        self._begin = numpy.cumsum(
+            numpy.concatenate(([0], lengths)), dtype=numpy.int64)[:-1]
+        self._end = self._begin + lengths
+        if self.curves:
+            self._bezier = self.curves[0].bezier
+            assert all(curve.bezier is self._bezier for curve in self.curves)
+            self._frames = numpy.concatenate(
+                [curve.frames for curve in self.curves])
+            self._positions = numpy.concatenate(
+                [curve.positions for curve in self.curves])
+            self._rotations = numpy.concatenate(
+                [curve.rotations for curve in self.curves])
+            self._curves = numpy.concatenate(
+                [curve.curves for curve in self.curves])
+        else:
+            self._frames = numpy.zeros(0, dtype=numpy.float32)
+            self._positions = numpy.zeros((0, 3), dtype=numpy.float32)
+            self._rotations = numpy.zeros((0, 4), dtype=numpy.float32)
+            self._curves = numpy.zeros((0, 4), dtype=numpy.int32)
+        self._positions, self._rotations = batch_math.reverse_z(
+            self._positions, self._rotations)
+
+        # curve 毎に frame をずらして単調増加にした key。一回の searchsorted で全 curve を探す
+        self._span = self.max_frame + 2
+        self._curve_base = numpy.arange(
+            len(self.curves), dtype=numpy.float64) * self._span
+        self._search_keys = self._frames + numpy.repeat(
+            self._curve_base, self._end - self._begin)
+
+        # 各 curve の次の key の位置
+        self._cursor = self._begin.copy()
+        self._frame = -1.0
+
+        # pose buffer
+        self.translations = numpy.zeros(
+            (len(self.curves), 3), dtype=numpy.float32)
+        self.rotations = numpy.zeros(
+            (len(self.curves), 4), dtype=numpy.float32)
+        self.set_time(0)
 
     def get_end_time(self) -> float:
         return self.seconds
 
+    def get_fps(self) -> float:
+        return FPS
+
+    def get_frame_count(self) -> int:
+        return self.max_frame + 1
+
     @staticmethod
     def load(name: str, data: bytes) -> 'Vmd':
         r = BytesReader(data)
@@ -65,18 +144,89 @@ class Vmd(Motion):
         signature = r.str(30, encoding='ascii')
         model = r.str(20, encoding='cp932')
         count = r.uint32()
-        keyframes = r.array(KeyFrame*count)
+        keys = numpy.frombuffer(data, KEY_FRAME_DTYPE, count, r.pos)
+        r.pos += keys.nbytes
+
+        # 同じボーンのキーは連続して格納されていることが多いので、
+        # 名前の変わり目だけを unique する
+        names = keys['bone_name']
+        starts = numpy.flatnonzero(names[1:] != names[:-1]) + 1
+        starts = numpy.concatenate(([0], starts)) if count else starts
+        raw_names, inverse = numpy.unique(
+            names[starts], return_inverse=True)
+        run_lengths = numpy.diff(numpy.append(starts, count))
+
+        # '\0' 以降にゴミの入っている名前があるので、名前の文字列でまとめなおす
+        curve_names: List[str] = []
+        curve_map: Dict[str, int] = {}
+        raw_to_curve = numpy.empty(len(raw_names), dtype=numpy.int64)
+        for i, raw_name in enumerate(raw_names):
+            bone_name = bytes_to_str(bytes(raw_name))
+            curve_index = curve_map.get(bone_name)
+            if curve_index is None:
+                curve_index = len(curve_names)
+                curve_map[bone_name] = curve_index
+                curve_names.append(bone_name)
+            raw_to_curve[i] = curve_index
+        key_curve = numpy.repeat(
+            raw_to_curve[inverse.reshape(-1)], run_lengths)
+
+        # curve, frame の順に sort
+        sort_key = (key_curve << 32) | keys['frame']
+        order = numpy.argsort(sort_key, kind='stable')
+        frames = keys['frame'][order].astype(numpy.float32)
+        positions = keys['position'][order]
+        rotations = keys['rotation'][order]
+        bezier = BezierTable(decode_vmd_interpolation(
+            keys['interpolation'][order]))
+        bounds = numpy.searchsorted(
+            sort_key[order] >> 32, numpy.arange(len(curve_names)+1))
+
+        curves = []
+        for i, bone_name in enumerate(curve_names):
+            begin = bounds[i]
+            end = bounds[i+1]
+            curves.append(BoneCurve(bone_name,
+                                    frames[begin:end], positions[begin:end], rotations[begin:end],
+                                    bezier.indices[begin:end], bezier))
 
-        bone_curves = {}
-        for keyframe in keyframes:
-            bone_name = bytes_to_str(memoryview(keyframe.bone_name).tobytes())
-            curve = bone_curves.get(bone_name)
-            if not curve:
-                curve = BoneCurve(bone_name)
-                bone_curves[bone_name] = curve
-            curve.key_frames.append(keyframe)
+        return Vmd(name, model, curves)
 
-        return Vmd(name, model, list(bone_curves.values()))
+    def to_arrays(self) -> Tuple[List[str], Dict[str, numpy.ndarray]]:
+        '''
+        from_arrays に渡す curve 名と、全 curve の key を連結した配列。reverse_z する前の値
+        '''
+        names = [curve.name for curve in self.curves]
+        bezier = self.curves[0].bezier if self.curves else None
+        arrays = {
+            'lengths': self._end - self._begin,
+            'frames': self._frames,
+            'positions': numpy.concatenate([curve.positions for curve in self.curves]) if self.curves else self._positions,
+            'rotations': numpy.concatenate([curve.rotations for curve in self.curves]) if self.curves else self._rotations,
+            'curves': self._curves,
+            # 重複を除いた制御点
+            'control_points': numpy.round(bezier.control_points * 127).astype(numpy.uint8) if bezier else numpy.zeros((0, 4), dtype=numpy.uint8),
+        }
+        return names, arrays
+
+    @staticmethod
+    def from_arrays(name: str, target_model: str, curve_names: List[str],
+                    lengths: numpy.ndarray, frames: numpy.ndarray, positions: numpy.ndarray, rotations: numpy.ndarray,
+                    curves: numpy.ndarray, control_points: numpy.ndarray) -> 'Vmd':
+        '''
+        to_arrays の逆。配列は複製せずに curve 毎の slice にする
+        '''
+        # unique 済みなので並びは変わらない
+        bezier = BezierTable(control_points)
+        bone_curves = []
+        begin = 0
+        for bone_name, length in zip(curve_names, lengths.tolist()):
+            end = begin + length
+            bone_curves.append(BoneCurve(bone_name,
+                                         frames[begin:end], positions[begin:end], rotations[begin:end],
+                                         curves[begin:end], bezier))
+            begin = end
+        return Vmd(name, target_model, bone_curves)
 
     def get_info(self) -> Iterable[str]:
         yield 'left-handed, A-stance'
@@ -89,12 +239,56 @@ class Vmd(Motion):
         return self._humanbones
 
     def get_current_pose(self) -> Pose:
+        if not self._pose:
+            pose = Pose(f'{self.name}:{self._frame / FPS}sec')
+            for curve, (x, y, z), (rx, ry, rz, rw) in zip(self.curves, self.translations.tolist(), self.rotations.tolist()):
+                pose.bones.append(BonePose(curve.name, curve.humanoid_bone,
+                                           Transform(glm.vec3(x, y, z), glm.quat(rw, rx, ry, rz), glm.vec3(1))))
+            self._pose = pose
         return self._pose
 
+    def _update_cursor(self, frame: float):
+        if frame >= self._frame:
+            # 順方向。数 key 以内なら進めるだけ
+            for _ in range(CURSOR_STEPS):
+                next = numpy.minimum(self._cursor, self._end - 1)
+                advance = (self._cursor < self._end) & (
+                    self._frames[next] <= frame)
+                if not advance.any():
+                    return
+                self._cursor += advance
+        self._cursor = numpy.searchsorted(
+            self._search_keys, self._curve_base + min(max(frame, -1), self._span - 1), side='right')
+
     def set_time(self, time_sec: float):
-        self._pose = Pose(f'{self.name}:{time_sec}sec')
-        frame = int(time_sec * 30)  # 30 FPS
-        for curve in self.curves:
-            t = curve.get_transform(frame)
-            self._pose.bones.append(
-                BonePose(curve.name, curve.humanoid_bone, t).reverse_z())
+        pose = self.get_baked_pose(time_sec)
+        if pose is not None:
+            self._pose = pose
+            # cursor をあてにせずに探しなおす
+            self._frame = float('nan')
+            return
+
+        frame = time_sec * FPS
+        if frame == self._frame:
+            return
+        self._update_cursor(frame)
+        self._frame = frame
+        self._pose = None
+        if not self.curves:
+            # camera, morph だけの vmd
+            return
+
+        # cursor の前後の key を補間する
+        k0 = numpy.maximum(self._cursor - 1, self._begin)
+        k1 = numpy.minimum(self._cursor, self._end - 1)
+        f0 = self._frames[k0]
+        f1 = self._frames[k1]
+        span = f1 - f0
+        x = numpy.where(span > 0, (frame - f0) /
+                        numpy.where(span > 0, span, 1), 0)
+        # x, y, z, rotation
+        w = self._bezier.evaluate(self._curves[k1], x[:, None])
+        p0 = self._positions[k0]
+        self.translations[:] = p0 + (self._positions[k1] - p0) * w[:, 0:3]
+        self.rotations[:] = batch_math.slerp(
+            self._rotations[k0], self._rotations[k1], w[:, 3])
@@ -1,10 +1,12 @@
 from typing import List, Iterable
 import re
 import glm
+import numpy
 from .transform import Transform
 from .pmd_loader import SCALING_FACTOR, BONE_HUMANOID_MAP
-from ..humanoid.pose import BonePose, Pose, Motion
-from ..humanoid.humanoid_bones import HumanoidBone
+from humanoid.pose import BonePose, Pose, Motion
+from humanoid.humanoid_bones import HumanoidBone
+from humanoid import batch_math
 
 COMMENT_PATTERN = re.compile(r'(.*?)//.*$')
 BONE_NAME_PATTERN = re.compile(r'Bone(\d+)\{(\w+)')
@@ -17,16 +19,6 @@ def get_name(open: str) -> str:
     return m.group(2)
 
 
-def get_t(t: str) -> glm.vec3:
-    x, y, z = t[:-1].split(',')
-    return glm.vec3(float(x) * SCALING_FACTOR, float(y) * SCALING_FACTOR, float(z) * SCALING_FACTOR)
-
-
-def get_r(r: str) -> glm.quat:
-    x, y, z, w = r[:-1].split(',')
-    return glm.quat(float(w), float(x), float(y), float(z))
-
-
 class Vpd(Motion):
     def __init__(self, pose: Pose):
         super().__init__(pose.name)
@@ -84,6 +76,8 @@ class Vpd(Motion):
         count = int(m.group(1))
 
         # parse
+        names: List[str] = []
+        values: List[List[float]] = []
         for i in range(count):
             open = lines.pop(0)
             t = lines.pop(0)
@@ -93,14 +87,19 @@ class Vpd(Motion):
             close = lines.pop(0)
             assert close == '}'
 
-            bone_name = get_name(open)
+            names.append(get_name(open))
+            values.append([float(x) for x in t[:-1].split(',')] +
+                          [float(x) for x in r[:-1].split(',')])
+
+        # まとめて reverse_z する
+        array = numpy.array(values, dtype=numpy.float64).reshape(-1, 7)
+        translations, rotations = batch_math.reverse_z(
+            array[:, 0:3] * SCALING_FACTOR, array[:, 3:7])
+        for bone_name, (x, y, z), (rx, ry, rz, rw) in zip(names, translations.tolist(), rotations.tolist()):
             humanoid_bone = BONE_HUMANOID_MAP.get(
                 bone_name, HumanoidBone.unknown)
             pose.bones.append(
-                BonePose(bone_name, humanoid_bone, Transform(get_t(t), get_r(r), glm.vec3(1))))
+                BonePose(bone_name, humanoid_bone, Transform(glm.vec3(x, y, z), glm.quat(rw, rx, ry, rz), glm.vec3(1))))
 
         assert len(pose.bones) == count
-
-        for i, bone in enumerate(pose.bones):
-            pose.bones[i] = bone.reverse_z()
         return Vpd(pose)
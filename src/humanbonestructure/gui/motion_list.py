@@ -2,8 +2,21 @@ from typing import Iterable, List
 import ctypes
 from pydear import imgui as ImGui
 from ..gui.selector import ItemList, Filter, Header
-from ..humanoid.pose import Motion, Empty
-from ..formats.humanoid_bones import HumanoidBone, HumanoidBodyParts
+from humanoid.pose import Motion, Empty
+from humanoid.humanoid_bones import HumanoidBone, HumanoidBodyParts, get_bone_mask
+
+# (checkbox の label, part)
+PARTS = [
+    ("幹", HumanoidBodyParts.Trunk),
+    ("脚", HumanoidBodyParts.Legs),
+    ("左腕", HumanoidBodyParts.LeftArm),
+    ("左指", HumanoidBodyParts.LeftFingers),
+    ("右腕", HumanoidBodyParts.RightArm),
+    ("右指", HumanoidBodyParts.RightFingers),
+]
+# 親指０
+THUMB0_MASK = get_bone_mask(
+    [HumanoidBone.leftThumbMetacarpal, HumanoidBone.rightThumbMetacarpal])
 
 
 class PoseFilter(Filter[Motion]):
@@ -17,32 +30,28 @@ class PoseFilter(Filter[Motion]):
         self.filter_has_thumbnail0 = (ctypes.c_bool * 1)(True)
         super().__init__(self.filter)
 
-    def filter(self, item: Motion):
-        def pose_has_parts(*parts: HumanoidBodyParts) -> bool:
-            for bone in item.get_humanbones():
-                if bone.is_enable() and bone.get_part() in parts:
-                    return True
-            return False
+        self.exclude_parts = HumanoidBodyParts(0)
+        self.exclude_bones = 0
+        self.update_mask()
 
-        def pose_has_bones(*bones: HumanoidBone) -> bool:
-            for bone in item.get_humanbones():
-                if bone in bones:
-                    return True
-            return False
+    def update_mask(self):
+        '''
+        checkbox から除外する part と bone の mask を作る
+        '''
+        parts = HumanoidBodyParts(0)
+        checkboxes = (self.filter_has_trunk, self.filter_has_legs,
+                      self.filter_has_leftArm, self.filter_has_leftFingers,
+                      self.filter_has_rightArm, self.filter_has_rightFingers)
+        for checked, (_, part) in zip(checkboxes, PARTS):
+            if checked[0]:
+                parts |= part
+        self.exclude_parts = parts
+        self.exclude_bones = THUMB0_MASK if self.filter_has_thumbnail0[0] else 0
 
-        if self.filter_has_trunk[0] and pose_has_parts(HumanoidBodyParts.Trunk):
-            return False
-        if self.filter_has_legs[0] and pose_has_parts(HumanoidBodyParts.Legs):
-            return False
-        if self.filter_has_leftArm[0] and pose_has_parts(HumanoidBodyParts.LeftArm):
-            return False
-        if self.filter_has_leftFingers[0] and pose_has_parts(HumanoidBodyParts.LeftFingers):
-            return False
-        if self.filter_has_rightArm[0] and pose_has_parts(HumanoidBodyParts.RightArm):
-            return False
-        if self.filter_has_rightFingers[0] and pose_has_parts(HumanoidBodyParts.RightFingers):
+    def filter(self, item: Motion):
+        if item.get_humanboneparts() & self.exclude_parts:
             return False
-        if self.filter_has_thumbnail0[0] and pose_has_bones(HumanoidBone.leftThumbProximal, HumanoidBone.rightThumbProximal):
+        if item.get_bone_mask() & self.exclude_bones:
             return False
         return True
 
@@ -70,6 +79,7 @@ class PoseFilter(Filter[Motion]):
             checked = True
 
         if checked:
+            self.update_mask()
             self.fire()
 
 
@@ -83,18 +93,11 @@ class MotionList(ItemList[Motion]):
             self.apply()
         self._filter += on_filter_changed
 
-        self.headers: List[Header] = [
-            Header("name"),
-            Header("幹", 15),
-            Header("脚", 15),
-            Header("左腕", 15),
-            Header("左指", 15),
-            Header("右腕", 15),
-            Header("右指", 15),
-        ]
+        self.headers: List[Header] = [Header("name")] + [
+            Header(label, 15) for label, _ in PARTS]
 
     def filter(self, item: Motion) -> bool:
-        if not item.get_humanbones():
+        if not item.get_bone_mask():
             # empty
             return True
         if not self._filter.value:
@@ -103,12 +106,9 @@ class MotionList(ItemList[Motion]):
 
     def columns(self, item: Motion) -> Iterable[str]:
         yield item.name
-        yield 'O' if (HumanoidBodyParts.Trunk in item.get_humanboneparts()) else ''
-        yield 'O' if (HumanoidBodyParts.Legs in item.get_humanboneparts()) else ''
-        yield 'O' if (HumanoidBodyParts.LeftArm in item.get_humanboneparts()) else ''
-        yield 'O' if (HumanoidBodyParts.LeftFingers in item.get_humanboneparts()) else ''
-        yield 'O' if (HumanoidBodyParts.RightArm in item.get_humanboneparts()) else ''
-        yield 'O' if (HumanoidBodyParts.RightFingers in item.get_humanboneparts()) else ''
+        parts = item.get_humanboneparts()
+        for _, part in PARTS:
+            yield 'O' if part & parts else ''
 
     def start(self):
         # start OpenCV
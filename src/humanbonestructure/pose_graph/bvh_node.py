@@ -1,11 +1,12 @@
 from typing import Optional
+import ctypes
 import logging
 import pathlib
 from pydear import imgui as ImGui
 from pydear import imnodes as ImNodes
 from pydear.utils.node_editor.node import Node, InputPin, OutputPin, Serialized
-from ..formats.bvh.bvh_parser import Bvh, Pose
-from ..humanoid.bone import Skeleton
+from formats.bvh.bvh_parser import Bvh, Pose
+from humanoid.bone import Skeleton
 from .file_node import FileNode
 
 LOGGER = logging.getLogger(__name__)
@@ -50,6 +51,7 @@ class BvhNode(FileNode):
         self.bvh: Optional[Bvh] = None
         self.hierarchy = None
         self.skeleton = None
+        self.use_bake = (ctypes.c_bool * 1)()
 
     @classmethod
     def imgui_menu(cls, graph, click_pos):
@@ -76,10 +78,11 @@ class BvhNode(FileNode):
 
     def load(self, path: pathlib.Path):
         self.path = path
-        from ..formats.bvh import bvh_parser
-        self.bvh = bvh_parser.from_path(path)
+        from formats import cache
+        self.bvh = cache.load_bvh(path)
+        self.bvh.use_bake = self.use_bake[0]
         # scene
-        from ..builder import bvh_builder
+        from builder import bvh_builder
         self.hierarchy = bvh_builder.build(self.bvh)
         # skeleton
         self.skeleton = self.hierarchy.to_skeleton()
@@ -90,6 +93,8 @@ class BvhNode(FileNode):
         if self.bvh:
             for info in self.bvh.get_info():
                 ImGui.TextUnformatted(info)
+            if ImGui.Checkbox('bake', self.use_bake):
+                self.bvh.use_bake = self.use_bake[0]
 
     def process_self(self):
         if not self.bvh and self.path:
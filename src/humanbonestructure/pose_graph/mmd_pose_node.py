@@ -4,9 +4,10 @@ import pathlib
 from pydear import imgui as ImGui
 from pydear import imnodes as ImNodes
 from pydear.utils.node_editor.node import Node, InputPin, OutputPin, Serialized
-from ..humanoid.pose import Pose
-from ..formats.vmd_loader import Vmd
-from ..formats.vpd_loader import Vpd
+from humanoid.pose import Pose
+from formats.vmd_loader import Vmd
+from formats.vpd_loader import Vpd
+from formats import cache
 from .file_node import FileNode
 
 ASSET_DIR: Optional[pathlib.Path] = None
@@ -36,6 +37,7 @@ class MmdPoseNode(FileNode):
                          '.vmd', '.vpd')
         self.vpd_vmd: Union[Vmd, Vpd, None] = None
         self.frame = (ctypes.c_int * 1)()
+        self.use_bake = (ctypes.c_bool * 1)()
 
     @classmethod
     def imgui_menu(cls, graph, click_pos):
@@ -65,7 +67,8 @@ class MmdPoseNode(FileNode):
             case '.vpd':
                 self.vpd_vmd = Vpd.load(path.name, path.read_bytes())
             case '.vmd':
-                self.vpd_vmd = Vmd.load(path.name, path.read_bytes())
+                self.vpd_vmd = cache.load_vmd(path)
+                self.vpd_vmd.use_bake = self.use_bake[0]
 
     def show_content(self, graph):
         super().show_content(graph)
@@ -73,6 +76,9 @@ class MmdPoseNode(FileNode):
         if self.vpd_vmd:
             for info in self.vpd_vmd.get_info():
                 ImGui.TextUnformatted(info)
+            if isinstance(self.vpd_vmd, Vmd):
+                if ImGui.Checkbox('bake', self.use_bake):
+                    self.vpd_vmd.use_bake = self.use_bake[0]
 
     def process_self(self):
         if not self.vpd_vmd and self.path:
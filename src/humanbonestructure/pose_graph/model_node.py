@@ -5,12 +5,12 @@ import glm
 from pydear import imgui as ImGui
 from pydear import imnodes as ImNodes
 from pydear.utils.node_editor.node import InputPin, OutputPin, Serialized
-from ..formats.gltf_loader import Gltf
-from ..formats.pmd_loader import Pmd
-from ..formats.pmx_loader import Pmx
-from ..humanoid.bone import Skeleton
-from ..humanoid.pose import Pose
-from ..builder.hierarchy import Hierarchy
+from formats.gltf_loader import Gltf
+from formats.pmd_loader import Pmd
+from formats import cache
+from humanoid.bone import Skeleton
+from humanoid.pose import Pose
+from builder.hierarchy import Hierarchy
 from .file_node import FileNode
 
 
@@ -50,7 +50,7 @@ class ModelNode(FileNode):
         # imgui
         from pydear.utils.fbo_view import FboView
         self.fbo = FboView()
-        from ..scene.scene import Scene
+        from scene.scene import Scene
         self.scene = Scene(self.fbo.mouse_event)
 
         # render mesh
@@ -94,26 +94,40 @@ class ModelNode(FileNode):
             ImGui.Checkbox('cancel axis', self.cancel_axis)
             ImGui.Checkbox('strict delta', self.strict_delta)
 
-    def load(self, path: pathlib.Path):
+    def load(self, path: pathlib.Path, *, skeleton_only: bool = False):
+        '''
+        skeleton_only: mesh を読まずに skeleton だけ作る
+        '''
         self.path = path
 
         match path.suffix.lower():
-            case '.gltf':
-                raise NotImplementedError()
-            case '.glb' | '.vrm':
-                self.model = Gltf.load_glb(path.read_bytes())
-                from ..builder import gltf_builder
-                self.hierarchy = gltf_builder.build(self.model)
+            case '.gltf' | '.glb' | '.vrm':
+                if path.suffix.lower() == '.gltf':
+                    self.model = Gltf.load_gltf(
+                        path, skeleton_only=skeleton_only)
+                else:
+                    self.model = Gltf.load_glb_path(
+                        path, skeleton_only=skeleton_only)
+                from builder import gltf_builder
+                self.hierarchy = gltf_builder.build(
+                    self.model, skeleton_only=skeleton_only)
                 self.skeleton = self.hierarchy.to_skeleton()
             case '.pmd':
-                self.model = Pmd(path.read_bytes())
-                from ..builder import pmd_builder
-                self.hierarchy = pmd_builder.build(self.model)
+                self.model = Pmd(path.read_bytes(), skeleton_only=skeleton_only)
+                from builder import pmd_builder
+                self.hierarchy = pmd_builder.build(
+                    self.model, skeleton_only=skeleton_only)
                 self.skeleton = self.hierarchy.to_skeleton()
             case '.pmx':
-                self.model = Pmx(path.read_bytes())
-                from ..builder import pmx_builder
-                self.hierarchy = pmx_builder.build(self.model)
+                if skeleton_only:
+                    # cache には mesh も入っているので直接読む
+                    from formats.pmx_loader import Pmx
+                    self.model = Pmx(path.read_bytes(), skeleton_only=True)
+                else:
+                    self.model = cache.load_pmx(path)
+                from builder import pmx_builder
+                self.hierarchy = pmx_builder.build(
+                    self.model, skeleton_only=skeleton_only)
                 self.skeleton = self.hierarchy.to_skeleton()
 
     def process_self(self):
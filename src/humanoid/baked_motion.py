@@ -0,0 +1,169 @@
+'''
+Motion を native fps の frame 毎に評価した密な配列
+
+frame x bone の float32 の rotation(x, y, z, w) と translation を保持して、
+set_time を配列の参照だけにする。
+baked した配列は BAKE_CACHE が byte 数の上限を超えたら古いものから捨てる。
+'''
+from typing import List, Tuple, Optional
+from collections import OrderedDict
+import numpy
+from .humanoid_bones import HumanoidBone, HUMANOID_BONE_ORDINAL
+from .pose import Motion, Pose, HUMANOID_BONE_COUNT
+
+DEFAULT_BUDGET = 256 * 1024 * 1024
+
+
+class BakedMotion:
+    def __init__(self, name: str, fps: float, bones: List[Tuple[str, HumanoidBone]],
+                 rotations: numpy.ndarray, translations: numpy.ndarray, end_time: Optional[float] = None) -> None:
+        '''
+        rotations: (frames, bones, 4) x, y, z, w
+        translations: (frames, bones, 3)
+        end_time: 元の motion の get_end_time。無ければ最後の frame の時刻
+        '''
+        assert rotations.shape[0:2] == translations.shape[0:2]
+        assert rotations.shape[1] == len(bones)
+        self.name = name
+        self.fps = fps
+        self.end_time = (len(rotations) - 1) / \
+            fps if end_time is None else end_time
+        self.bones = bones
+        self.rotations = rotations
+        self.translations = translations
+        # humanoid bone ごとに最初の bone の列を Pose の配列の位置に並べる
+        rows: List[int] = []
+        ordinals: List[int] = []
+        for row, (_, humanoid_bone) in enumerate(bones):
+            i = HUMANOID_BONE_ORDINAL.get(humanoid_bone)
+            if i is not None and i not in ordinals:
+                rows.append(row)
+                ordinals.append(i)
+        self._rows = numpy.array(rows, dtype=numpy.int32)
+        self._ordinals = numpy.array(ordinals, dtype=numpy.int32)
+        self._mask = numpy.zeros(HUMANOID_BONE_COUNT, dtype=bool)
+        self._mask[self._ordinals] = True
+        self._frame = -1
+        self._pose: Optional[Pose] = None
+
+    def __len__(self) -> int:
+        return len(self.rotations)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rotations.nbytes + self.translations.nbytes
+
+    def get_frame(self, time_sec: float) -> int:
+        frame = int(time_sec * self.fps)
+        if frame < 0:
+            return 0
+        if frame >= len(self):
+            return len(self) - 1
+        return frame
+
+    def get_pose(self, time_sec: float) -> Pose:
+        '''
+        humanoid bone だけの配列の Pose。bones は参照したときに作る
+        '''
+        frame = self.get_frame(time_sec)
+        if frame != self._frame or self._pose is None:
+            rotations = numpy.zeros(
+                (HUMANOID_BONE_COUNT, 4), dtype=numpy.float32)
+            rotations[:, 3] = 1
+            rotations[self._ordinals] = self.rotations[frame, self._rows]
+            translations = numpy.zeros(
+                (HUMANOID_BONE_COUNT, 3), dtype=numpy.float32)
+            translations[self._ordinals] = self.translations[frame, self._rows]
+            self._frame = frame
+            self._pose = Pose(f'{self.name}:{frame}',
+                              rotations, translations, self._mask.copy())
+        return self._pose
+
+
+def bake(motion: Motion) -> BakedMotion:
+    '''
+    frame 毎に set_time して pose を配列に詰める
+    '''
+    fps = motion.get_fps()
+    frame_count = max(motion.get_frame_count(), 1)
+    use_bake = motion.use_bake
+    motion.use_bake = False
+    try:
+        bones: List[Tuple[str, HumanoidBone]] = []
+        rotations = numpy.zeros((frame_count, 0, 4), dtype=numpy.float32)
+        translations = numpy.zeros((frame_count, 0, 3), dtype=numpy.float32)
+        for frame in range(frame_count):
+            motion.set_time(frame / fps)
+            pose = motion.get_current_pose()
+            keys = [(bone.name, bone.humanoid_bone) for bone in pose.bones]
+            if frame == 0:
+                bones = keys
+                rotations = numpy.zeros(
+                    (frame_count, len(bones), 4), dtype=numpy.float32)
+                translations = numpy.zeros(
+                    (frame_count, len(bones), 3), dtype=numpy.float32)
+            elif keys != bones:
+                # 列がずれるので途中で bone が変わる motion は bake できない
+                raise ValueError(
+                    f'{motion.name}: bones changed at frame {frame}')
+            if not bones:
+                # Empty や空の vpd
+                continue
+            rotations[frame] = [(bone.transform.rotation.x, bone.transform.rotation.y,
+                                 bone.transform.rotation.z, bone.transform.rotation.w) for bone in pose.bones]
+            translations[frame] = [tuple(bone.transform.translation)
+                                   for bone in pose.bones]
+    finally:
+        motion.use_bake = use_bake
+    return BakedMotion(motion.name, fps, bones, rotations, translations, motion.get_end_time())
+
+
+class BakeCache:
+    '''
+    baked motion の LRU cache。合計の byte 数が budget を超えたら古いものを捨てる。
+    最後に使ったものは budget を超えていても残す。
+    '''
+
+    def __init__(self, budget: int = DEFAULT_BUDGET) -> None:
+        self.budget = budget
+        self.nbytes = 0
+        self._baked: OrderedDict[Motion, BakedMotion] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._baked)
+
+    def __contains__(self, motion: Motion) -> bool:
+        return motion in self._baked
+
+    def get(self, motion: Motion) -> BakedMotion:
+        baked = self._baked.get(motion)
+        if baked is not None:
+            self._baked.move_to_end(motion)
+            return baked
+
+        baked = bake(motion)
+        self._baked[motion] = baked
+        self.nbytes += baked.nbytes
+        self._evict()
+        return baked
+
+    def set_budget(self, budget: int):
+        self.budget = budget
+        self._evict()
+
+    def remove(self, motion: Motion):
+        baked = self._baked.pop(motion, None)
+        if baked is not None:
+            self.nbytes -= baked.nbytes
+
+    def clear(self):
+        self._baked.clear()
+        self.nbytes = 0
+
+    def _evict(self):
+        while self.nbytes > self.budget and len(self._baked) > 1:
+            _, baked = self._baked.popitem(last=False)
+            self.nbytes -= baked.nbytes
+
+
+BAKE_CACHE = BakeCache()
@@ -0,0 +1,177 @@
+'''
+numpy の配列に対する quaternion 演算
+
+quaternion は x, y, z, w の順に格納する(glm.quat の引数の順とは異なる)。
+'''
+from typing import Optional, Tuple
+import numpy
+
+EPSILON = 1e-6
+
+
+def normalize(q: numpy.ndarray) -> numpy.ndarray:
+    return q / numpy.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def slerp(q0: numpy.ndarray, q1: numpy.ndarray, t: numpy.ndarray) -> numpy.ndarray:
+    '''
+    (..., 4) と (..., 4) を (...) で補間する。最短経路をとる
+    '''
+    t = numpy.asarray(t)[..., None]
+    d = numpy.sum(q0 * q1, axis=-1, keepdims=True)
+    # 最短経路
+    q1 = numpy.where(d < 0, -q1, q1)
+    d = numpy.abs(d)
+
+    theta = numpy.arccos(numpy.clip(d, -1, 1))
+    sin_theta = numpy.sin(theta)
+    is_near = sin_theta < EPSILON
+    safe = numpy.where(is_near, 1, sin_theta)
+    s0 = numpy.where(is_near, 1 - t, numpy.sin((1 - t) * theta) / safe)
+    s1 = numpy.where(is_near, t, numpy.sin(t * theta) / safe)
+    return s0 * q0 + s1 * q1
+
+
+def multiply(a: numpy.ndarray, b: numpy.ndarray) -> numpy.ndarray:
+    '''
+    (..., 4) * (..., 4)。glm.quat の a * b と同じ
+    '''
+    ax, ay, az, aw = numpy.moveaxis(a, -1, 0)
+    bx, by, bz, bw = numpy.moveaxis(b, -1, 0)
+    return numpy.stack([
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+        aw * bw - ax * bx - ay * by - az * bz,
+    ], axis=-1)
+
+
+def conjugate(q: numpy.ndarray) -> numpy.ndarray:
+    return q * numpy.array([-1, -1, -1, 1], dtype=q.dtype)
+
+
+def inverse(q: numpy.ndarray) -> numpy.ndarray:
+    '''
+    glm.inverse(q)
+    '''
+    return conjugate(q) / numpy.sum(q * q, axis=-1, keepdims=True)
+
+
+def nlerp(q0: numpy.ndarray, q1: numpy.ndarray, t: numpy.ndarray) -> numpy.ndarray:
+    '''
+    slerp より軽い線形補間。最短経路をとる
+    '''
+    t = numpy.asarray(t)[..., None]
+    d = numpy.sum(q0 * q1, axis=-1, keepdims=True)
+    q1 = numpy.where(d < 0, -q1, q1)
+    return normalize(q0 + (q1 - q0) * t)
+
+
+def rotate(q: numpy.ndarray, v: numpy.ndarray) -> numpy.ndarray:
+    '''
+    (..., 4) で (..., 3) を回す。glm.quat * glm.vec3 と同じ
+    '''
+    u = q[..., :3]
+    w = q[..., 3:]
+    uv = numpy.cross(u, v)
+    return v + 2 * (w * uv + numpy.cross(u, uv))
+
+
+def from_axis_angle(axis: numpy.ndarray, angle: numpy.ndarray) -> numpy.ndarray:
+    '''
+    glm.angleAxis(angle, axis)。axis は正規化済み
+    '''
+    half = numpy.asarray(angle)[..., None] * 0.5
+    return numpy.concatenate([axis * numpy.sin(half), numpy.cos(half)], axis=-1)
+
+
+def to_axis_angle(q: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    (..., 3) の axis と (...) の angle。回転が無いときの axis は (0, 0, 1)
+    '''
+    # w >= 0 にそろえて angle を [0, pi] にする
+    q = numpy.where(q[..., 3:] < 0, -q, q)
+    s = numpy.linalg.norm(q[..., :3], axis=-1)
+    angle = 2 * numpy.arctan2(s, q[..., 3])
+    is_zero = s < EPSILON
+    safe = numpy.where(is_zero, 1, s)[..., None]
+    axis = numpy.where(is_zero[..., None],
+                       numpy.array([0, 0, 1], dtype=q.dtype), q[..., :3] / safe)
+    return axis, angle
+
+
+AXIS_INDEX = {'X': 0, 'Y': 1, 'Z': 2}
+
+
+def from_euler(radians: numpy.ndarray, order: str) -> numpy.ndarray:
+    '''
+    (..., 3) の角度から quaternion。
+
+    order の順に掛ける。ZXY なら qz * qx * qy
+    '''
+    half = numpy.asarray(radians) * 0.5
+    s = numpy.sin(half)
+    c = numpy.cos(half)
+    q = numpy.zeros(half.shape[:-1] + (4,), dtype=half.dtype)
+    q[..., 3] = 1
+    for i, axis in enumerate(order):
+        r = numpy.zeros_like(q)
+        r[..., AXIS_INDEX[axis]] = s[..., i]
+        r[..., 3] = c[..., i]
+        q = multiply(q, r)
+    return q
+
+
+def to_matrix(q: numpy.ndarray) -> numpy.ndarray:
+    '''
+    (..., 3, 3)。列ベクトルに掛ける行列(glm の m[col][row] の転置)
+    '''
+    x, y, z, w = numpy.moveaxis(q, -1, 0)
+    return numpy.stack([
+        numpy.stack([1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w)], axis=-1),
+        numpy.stack([2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w)], axis=-1),
+        numpy.stack([2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)], axis=-1),
+    ], axis=-2)
+
+
+def to_euler(q: numpy.ndarray, order: str) -> numpy.ndarray:
+    '''
+    from_euler の逆。(..., 3) の radian。
+
+    2番目の軸が ±90度のときは 3番目を 0 にしない近似になる
+    '''
+    i, j, k = (AXIS_INDEX[axis] for axis in order)
+    # 偶置換なら 1
+    e = 1 if (j - i) % 3 == 1 else -1
+    m = to_matrix(normalize(q))
+    b = numpy.arcsin(numpy.clip(e * m[..., i, k], -1, 1))
+    a = numpy.arctan2(-e * m[..., j, k], m[..., k, k])
+    c = numpy.arctan2(-e * m[..., i, j], m[..., i, i])
+    return numpy.stack([a, b, c], axis=-1)
+
+
+def compose(t0: numpy.ndarray, r0: numpy.ndarray, t1: numpy.ndarray, r1: numpy.ndarray) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    '''
+    TR(t0, r0) * TR(t1, r1)
+    '''
+    return rotate(r0, t1) + t0, multiply(r0, r1)
+
+
+def reverse_z(t: Optional[numpy.ndarray] = None, r: Optional[numpy.ndarray] = None) -> Tuple[Optional[numpy.ndarray], Optional[numpy.ndarray]]:
+    '''
+    z の反転(右手系と左手系の変換)。Transform.reverse_z と同じ
+
+    translation は (x, y, -z)、rotation は (-x, -y, z, w)
+    '''
+    return (t * numpy.array([1, 1, -1], dtype=t.dtype) if t is not None else None,
+            r * numpy.array([-1, -1, 1, 1], dtype=r.dtype) if r is not None else None)
+
+
+def rotate_y180(t: Optional[numpy.ndarray] = None, r: Optional[numpy.ndarray] = None) -> Tuple[Optional[numpy.ndarray], Optional[numpy.ndarray]]:
+    '''
+    y 軸で 180度回す。Float3.rotate_y180 と同じ
+
+    translation は (-x, y, -z)、rotation は (-x, y, -z, w)
+    '''
+    return (t * numpy.array([-1, 1, -1], dtype=t.dtype) if t is not None else None,
+            r * numpy.array([-1, 1, -1, 1], dtype=r.dtype) if r is not None else None)
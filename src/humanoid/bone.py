@@ -37,16 +37,65 @@ class TR(NamedTuple):
 class Joint:
     def __init__(self, name: str, local: TR, humanoid_bone: HumanoidBone, *, world: Optional[TR] = None, parent: Optional['Joint'] = None) -> None:
         self.name = name
-        self.local = local
-        self.world = world if world else local
+        # local と pose が変わると増える。world を計算しなおす
+        self.version = 0
+        # world と local_axis が変わると増える
+        self.world_version = 0
+        # gizmo などに反映済みの world_version
+        self.synced_version = -1
+        # 前回 world を計算したときの (parent, version)
+        self._world_key = None
+        self._matrix_key = None
+        self._world_matrix = glm.mat4()
+        self._local = local
+        self._world = world if world else local
         self.humanoid_bone = humanoid_bone
-        self.pose = glm.quat()
+        self._pose = glm.quat()
         self.children: List[Joint] = []
         self.parent: Optional[Joint] = parent
-        self.local_axis = glm.quat()
+        self._local_axis = glm.quat()
         if self.parent:
             self.parent.add_child(self)
 
+    @property
+    def local(self) -> TR:
+        return self._local
+
+    @local.setter
+    def local(self, value: TR):
+        self._local = value
+        self.version += 1
+
+    @property
+    def pose(self) -> glm.quat:
+        return self._pose
+
+    @pose.setter
+    def pose(self, value: glm.quat):
+        if value != self._pose:
+            self._pose = value
+            self.version += 1
+
+    @property
+    def world(self) -> TR:
+        return self._world
+
+    @world.setter
+    def world(self, value: TR):
+        self._world = value
+        self._world_key = None
+        self._matrix_key = None
+        self.world_version += 1
+
+    @property
+    def local_axis(self) -> glm.quat:
+        return self._local_axis
+
+    @local_axis.setter
+    def local_axis(self, value: glm.quat):
+        self._local_axis = value
+        self.world_version += 1
+
     def get_parent_world_matrix(self) -> glm.mat4:
         return self.parent.world.get_matrix() if self.parent else glm.mat4()
 
@@ -62,10 +111,25 @@ class Joint:
         child.calc_world(self.world)
 
     def calc_world(self, parent: TR):
-        self.world = parent * self.local * TR(glm.vec3(0, 0, 0), self.pose)
+        # parent も自分も変わっていなければ子だけ
+        key = (parent, self.version)
+        if self._world_key != key:
+            self.world = parent * self.local * TR(glm.vec3(0, 0, 0), self.pose)
+            # parent の vec3, quat が書き換えられても古い key に一致しないように複製する
+            self._world_key = (TR(glm.vec3(parent.translation),
+                               glm.quat(parent.rotation)), self.version)
         for child in self.children:
             child.calc_world(self.world)
 
+    def sync(self) -> bool:
+        '''
+        world_version が前回の sync から変わっていれば True
+        '''
+        if self.synced_version == self.world_version:
+            return False
+        self.synced_version = self.world_version
+        return True
+
 
 EPSILON = 2e-2
 
@@ -216,9 +280,14 @@ class Bone:
                 raise NotImplementedError()
 
     def calc_world_matrix(self, parent: glm.mat4) -> glm.mat4:
-        m = parent * self.head.local.get_matrix() * glm.mat4(self.head.pose)
-        self.head.world = TR.from_matrix(m)
-        return m
+        head = self.head
+        key = (parent, head.version)
+        if head._matrix_key != key:
+            m = parent * head.local.get_matrix() * glm.mat4(head.pose)
+            head.world = TR.from_matrix(m)
+            head._world_matrix = m
+            head._matrix_key = (glm.mat4(parent), head.version)
+        return head._world_matrix
 
     def strict_tpose(self, parent: glm.mat4):
         world = parent * self.head.local.get_matrix()
@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Tuple, Iterable
 from enum import Enum, Flag, auto
 import glm
 
@@ -23,6 +23,15 @@ class BoneFlags(Flag):
     FingerLittle = auto()
 
 
+class HumanoidBodyParts(Flag):
+    Trunk = auto()
+    Legs = auto()
+    LeftArm = auto()
+    LeftFingers = auto()
+    RightArm = auto()
+    RightFingers = auto()
+
+
 class BoneBase(Enum):
     unknown = auto()
     hips = auto()
@@ -159,6 +168,17 @@ class HumanoidBone(Enum):
     def is_finger(self):
         return self.base in (BoneBase.finger_1, BoneBase.finger_2, BoneBase.finger_3)
 
+    def get_part(self) -> HumanoidBodyParts:
+        if self.is_finger():
+            return HumanoidBodyParts.LeftFingers if BoneFlags.Left in self.flags else HumanoidBodyParts.RightFingers
+        match self.base:
+            case BoneBase.shoulder | BoneBase.upperArm | BoneBase.lowerArm | BoneBase.hand:
+                return HumanoidBodyParts.LeftArm if BoneFlags.Left in self.flags else HumanoidBodyParts.RightArm
+            case BoneBase.upperLeg | BoneBase.lowerLeg | BoneBase.foot | BoneBase.toes:
+                return HumanoidBodyParts.Legs
+            case _:
+                return HumanoidBodyParts.Trunk
+
     @staticmethod
     def baseflag(base: BoneBase, flags: BoneFlags) -> 'HumanoidBone':
         for bone in HumanoidBone:
@@ -228,3 +248,24 @@ TAIL_MAP = {
     HumanoidBone.rightLittleIntermediate: HumanoidBone.rightLittleDistal,
     HumanoidBone.rightLittleDistal: HumanoidBone.endSite,
 }
+
+
+# bitmask の bit 位置
+HUMANOID_BONES = [bone for bone in HumanoidBone if bone.is_enable()]
+HUMANOID_BONE_ORDINAL = {bone: i for i, bone in enumerate(HUMANOID_BONES)}
+
+
+def get_bone_mask(bones: Iterable[HumanoidBone]) -> int:
+    mask = 0
+    for bone in bones:
+        if bone.is_enable():
+            mask |= 1 << HUMANOID_BONE_ORDINAL[bone]
+    return mask
+
+
+def get_body_parts(bones: Iterable[HumanoidBone]) -> HumanoidBodyParts:
+    parts = HumanoidBodyParts(0)
+    for bone in bones:
+        if bone.is_enable():
+            parts |= bone.get_part()
+    return parts
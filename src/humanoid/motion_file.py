@@ -0,0 +1,168 @@
+'''
+baked motion の保存形式
+
+little endian
+
+* header: HEADER_DTYPE
+* bone table: utf-8 の json。[{"name": str, "humanoid_bone": str}, ...]
+* rotations: float32 (frame_count, bone_count, 4) x, y, z, w
+* translations: float32 (frame_count, bone_count, 3)
+
+配列は ALIGNMENT 境界に置いて mmap で開く。
+'''
+from typing import Iterable, Optional, Set
+import json
+import pathlib
+import numpy
+from .humanoid_bones import HumanoidBone
+from .pose import Motion, Pose
+from .baked_motion import BakedMotion, bake
+
+SUFFIX = '.hbm'
+MAGIC = b'HBMOTION'
+VERSION = 2
+ALIGNMENT = 16
+
+HEADER_DTYPE = numpy.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('fps', '<f4'),
+    # bvh と vmd で frame 数と長さの関係が違うので元の motion の長さを保存する
+    ('end_time', '<f4'),
+    ('frame_count', '<u4'),
+    ('bone_count', '<u4'),
+    ('name_size', '<u4'),
+    ('table_size', '<u4'),
+    ('rotations_offset', '<u8'),
+    ('translations_offset', '<u8'),
+])
+assert HEADER_DTYPE.itemsize == 52
+
+
+class MotionFileException(RuntimeError):
+    pass
+
+
+def _align(pos: int) -> int:
+    return (pos + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_baked(path: pathlib.Path, baked: BakedMotion):
+    name = baked.name.encode('utf-8')
+    table = json.dumps([{'name': bone_name, 'humanoid_bone': humanoid_bone.name}
+                        for bone_name, humanoid_bone in baked.bones], ensure_ascii=False).encode('utf-8')
+    frame_count = len(baked)
+    bone_count = len(baked.bones)
+
+    header = numpy.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['fps'] = baked.fps
+    header['end_time'] = baked.end_time
+    header['frame_count'] = frame_count
+    header['bone_count'] = bone_count
+    header['name_size'] = len(name)
+    header['table_size'] = len(table)
+    rotations_offset = _align(HEADER_DTYPE.itemsize + len(name) + len(table))
+    translations_offset = _align(
+        rotations_offset + frame_count * bone_count * 4 * 4)
+    header['rotations_offset'] = rotations_offset
+    header['translations_offset'] = translations_offset
+
+    with path.open('wb') as f:
+        f.write(header.tobytes())
+        f.write(name)
+        f.write(table)
+        f.write(b'\0' * (rotations_offset - f.tell()))
+        # tobytes で配列全体を複製しないで buffer をそのまま書く
+        f.write(memoryview(numpy.ascontiguousarray(
+            baked.rotations, dtype='<f4')))
+        f.write(b'\0' * (translations_offset - f.tell()))
+        f.write(memoryview(numpy.ascontiguousarray(
+            baked.translations, dtype='<f4')))
+
+
+def write(path: pathlib.Path, motion: Motion):
+    '''
+    motion を native fps で bake して保存する
+    '''
+    write_baked(path, bake(motion))
+
+
+class MappedMotion(Motion):
+    '''
+    header と bone table だけを読んでおいて、配列は使うときに mmap する
+    '''
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        with path.open('rb') as f:
+            data = f.read(HEADER_DTYPE.itemsize)
+            if len(data) < HEADER_DTYPE.itemsize:
+                raise MotionFileException(f'{path}: too short')
+            header = numpy.frombuffer(data, dtype=HEADER_DTYPE)[0]
+            if header['magic'] != MAGIC:
+                raise MotionFileException(f'{path}: unknown magic')
+            if header['version'] != VERSION:
+                raise MotionFileException(
+                    f'{path}: unknown version {header["version"]}')
+            name = f.read(int(header['name_size'])).decode('utf-8')
+            table = json.loads(
+                f.read(int(header['table_size'])).decode('utf-8'))
+        super().__init__(name)
+        self.fps = float(header['fps'])
+        self.end_time = float(header['end_time'])
+        self.frame_count = int(header['frame_count'])
+        self.bones = [(bone['name'], HumanoidBone[bone['humanoid_bone']])
+                      for bone in table]
+        if len(self.bones) != header['bone_count']:
+            raise MotionFileException(f'{path}: bone count')
+        self._rotations_offset = int(header['rotations_offset'])
+        self._translations_offset = int(header['translations_offset'])
+        self._humanbones = set(
+            humanoid_bone for _, humanoid_bone in self.bones if humanoid_bone.is_enable())
+        self._baked: Optional[BakedMotion] = None
+        self._time_sec = 0.0
+
+    def open(self) -> BakedMotion:
+        if self._baked is None:
+            shape = (self.frame_count, len(self.bones))
+            rotations = numpy.memmap(self.path, dtype='<f4', mode='r',
+                                     offset=self._rotations_offset, shape=shape + (4,))
+            translations = numpy.memmap(self.path, dtype='<f4', mode='r',
+                                        offset=self._translations_offset, shape=shape + (3,))
+            self._baked = BakedMotion(
+                self.name, self.fps, self.bones, rotations, translations, self.end_time)
+        return self._baked
+
+    def close(self):
+        self._baked = None
+
+    def is_open(self) -> bool:
+        return self._baked is not None
+
+    def get_info(self) -> Iterable[str]:
+        yield f'{self.path.name}'
+        yield f'{self.frame_count}frames, {self.get_end_time():0.2f}sec'
+
+    def get_humanbones(self) -> Set[HumanoidBone]:
+        return self._humanbones
+
+    def get_end_time(self) -> float:
+        return self.end_time
+
+    def get_fps(self) -> float:
+        return self.fps
+
+    def get_frame_count(self) -> int:
+        return self.frame_count
+
+    def set_time(self, time_sec: float):
+        self._time_sec = time_sec
+
+    def get_current_pose(self) -> Pose:
+        return self.open().get_pose(self._time_sec)
+
+
+def load(path: pathlib.Path) -> MappedMotion:
+    return MappedMotion(path)
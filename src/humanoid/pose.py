@@ -1,8 +1,11 @@
-from typing import NamedTuple, Optional, List, Dict, Set, Tuple
+from typing import NamedTuple, Optional, List, Dict, Set, Tuple, Iterable
 import abc
 import glm
+import numpy
 from formats.transform import Transform
-from .humanoid_bones import HumanoidBone
+from .humanoid_bones import HumanoidBone, HumanoidBodyParts, HUMANOID_BONES, HUMANOID_BONE_ORDINAL, get_body_parts, get_bone_mask
+
+HUMANOID_BONE_COUNT = len(HUMANOID_BONES)
 
 
 class BonePose(NamedTuple):
@@ -15,68 +18,215 @@ class BonePose(NamedTuple):
         return self._replace(transform=t)
 
 
+class BoneList(list):
+    '''
+    Pose.bones。humanoid bone の変更を Pose の配列に書き込む
+    '''
+
+    def __init__(self, pose: 'Pose', bones: Iterable[BonePose] = ()) -> None:
+        super().__init__()
+        self.pose = pose
+        self.extend(bones)
+
+    def append(self, bone: BonePose):
+        super().append(bone)
+        self.pose._write(bone)
+
+    def extend(self, bones: Iterable[BonePose]):
+        for bone in bones:
+            self.append(bone)
+
+    def __iadd__(self, bones: Iterable[BonePose]) -> 'BoneList':
+        self.extend(bones)
+        return self
+
+    # 以下は同じ humanoid bone の最初の bone が変わりうるので配列を作りなおす
+
+    def __setitem__(self, i, bone):
+        super().__setitem__(i, bone)
+        self.pose._rewrite()
+
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self.pose._rewrite()
+
+    def __imul__(self, n: int) -> 'BoneList':
+        super().__imul__(n)
+        self.pose._rewrite()
+        return self
+
+    def insert(self, i: int, bone: BonePose):
+        super().insert(i, bone)
+        self.pose._rewrite()
+
+    def pop(self, i: int = -1) -> BonePose:
+        bone = super().pop(i)
+        self.pose._rewrite()
+        return bone
+
+    def remove(self, bone: BonePose):
+        super().remove(bone)
+        self.pose._rewrite()
+
+    def clear(self):
+        super().clear()
+        self.pose._rewrite()
+
+    def sort(self, *, key=None, reverse=False):
+        super().sort(key=key, reverse=reverse)
+        self.pose._rewrite()
+
+    def reverse(self):
+        super().reverse()
+        self.pose._rewrite()
+
+
 class Pose:
-    def __init__(self, name: str):
+    '''
+    humanoid bone の回転と移動を HUMANOID_BONE_ORDINAL 順の配列で保持する。
+
+    * rotations: float32 (HUMANOID_BONE_COUNT, 4) x, y, z, w
+    * translations: float32 (HUMANOID_BONE_COUNT, 3)
+    * mask: bool (HUMANOID_BONE_COUNT,)
+
+    bones は BonePose の list で、humanoid でない bone も含む。
+    配列から作った Pose では最初に参照したときに作る。
+    '''
+
+    def __init__(self, name: str,
+                 rotations: Optional[numpy.ndarray] = None,
+                 translations: Optional[numpy.ndarray] = None,
+                 mask: Optional[numpy.ndarray] = None):
         self.name = name
-        self.bones: List[BonePose] = []
+        if rotations is None:
+            rotations = numpy.zeros(
+                (HUMANOID_BONE_COUNT, 4), dtype=numpy.float32)
+            rotations[:, 3] = 1
+        if translations is None:
+            translations = numpy.zeros(
+                (HUMANOID_BONE_COUNT, 3), dtype=numpy.float32)
+        if mask is None:
+            mask = numpy.zeros(HUMANOID_BONE_COUNT, dtype=bool)
+        assert rotations.shape == (HUMANOID_BONE_COUNT, 4)
+        assert translations.shape == (HUMANOID_BONE_COUNT, 3)
+        assert mask.shape == (HUMANOID_BONE_COUNT,)
+        self.rotations = rotations
+        self.translations = translations
+        self.mask = mask
+        self._bones: Optional[BoneList] = None if mask.any() else BoneList(
+            self)
+
+    @staticmethod
+    def from_arrays(name: str, humanoid_bones: Iterable[HumanoidBone],
+                    rotations: numpy.ndarray, translations: Optional[numpy.ndarray] = None) -> 'Pose':
+        '''
+        humanoid_bones の順の (n, 4), (n, 3) を並べ替えて Pose にする
+        '''
+        pose = Pose(name)
+        index = numpy.array([HUMANOID_BONE_ORDINAL[bone]
+                            for bone in humanoid_bones], dtype=numpy.int32)
+        pose.rotations[index] = rotations
+        if translations is not None:
+            pose.translations[index] = translations
+        pose.mask[index] = True
+        pose._bones = None
+        return pose
 
     def __str__(self) -> str:
         return f'{self.name}: {len(self.bones)}bones'
 
-    def get_rotation(self, humanoid_bone: HumanoidBone) -> glm.quat:
-        for bone in self.bones:
-            if bone.humanoid_bone == humanoid_bone:
-                return bone.transform.rotation
-        return glm.quat()
-
-    # def get_parts(self, part: HumanoidBodyParts) -> bool:
-    #     value = self._parts.get(part)
-    #     if not isinstance(value, bool):
-    #         value = any(bone.humanoid_bone.get_classification().part
-    #                     == part for bone in self.bones)
-    #         self._parts[part] = value
-    #     return value
+    @property
+    def bones(self) -> BoneList:
+        if self._bones is None:
+            bones = BoneList(self)
+            for i in numpy.flatnonzero(self.mask).tolist():
+                humanoid_bone = HUMANOID_BONES[i]
+                x, y, z, w = self.rotations[i].tolist()
+                list.append(bones, BonePose(humanoid_bone.name, humanoid_bone, Transform(
+                    glm.vec3(*self.translations[i].tolist()), glm.quat(w, x, y, z), glm.vec3(1))))
+            self._bones = bones
+        return self._bones
 
-    def to_json(self) -> Dict[str, Tuple[float, float, float, float]]:
+    @bones.setter
+    def bones(self, bones: Iterable[BonePose]):
+        self.rotations[:] = (0, 0, 0, 1)
+        self.translations[:] = 0
+        self.mask[:] = False
+        self._bones = BoneList(self, bones)
 
-        # node_map = {node.humanoid_bone: node for node,
-        #             _ in root.traverse_node_and_parent() if node.humanoid_bone and node.humanoid_bone != HumanoidBone.endSite}
+    def _write(self, bone: BonePose):
+        i = HUMANOID_BONE_ORDINAL.get(bone.humanoid_bone)
+        if i is None:
+            return
+        if self.mask[i]:
+            # get_rotation は最初の bone
+            return
+        r = bone.transform.rotation
+        t = bone.transform.translation
+        self.rotations[i] = (r.x, r.y, r.z, r.w)
+        self.translations[i] = (t.x, t.y, t.z)
+        self.mask[i] = True
 
-        def float4(q) -> Tuple[float, float, float, float]:
-            return (q.x, q.y, q.z, q.w)
-        bone_map: Dict[str, Tuple[float, float, float, float]] = {}
-        for bone in self.bones:
-            assert bone.humanoid_bone.is_enable()
-            # node = node_map[bone.humanoid_bone]
-            # if node and node.pose:
-            #     q = glm.inverse(node.pose.rotation) * bone.transform.rotation
-            #     bone_map[bone.humanoid_bone.name] = float4(q)
-            bone_map[bone.humanoid_bone.name] = float4(bone.transform.rotation)
+    def _rewrite(self):
+        '''
+        bones から配列を作りなおす
+        '''
+        assert self._bones is not None
+        self.rotations[:] = (0, 0, 0, 1)
+        self.translations[:] = 0
+        self.mask[:] = False
+        for bone in self._bones:
+            self._write(bone)
 
-        if not bone_map:
-            pass
-        return bone_map
+    def has(self, humanoid_bone: HumanoidBone) -> bool:
+        i = HUMANOID_BONE_ORDINAL.get(humanoid_bone)
+        return i is not None and bool(self.mask[i])
+
+    def get_rotation(self, humanoid_bone: HumanoidBone) -> glm.quat:
+        i = HUMANOID_BONE_ORDINAL.get(humanoid_bone)
+        if i is None or not self.mask[i]:
+            return glm.quat()
+        x, y, z, w = self.rotations[i].tolist()
+        return glm.quat(w, x, y, z)
+
+    def get_translation(self, humanoid_bone: HumanoidBone) -> glm.vec3:
+        i = HUMANOID_BONE_ORDINAL.get(humanoid_bone)
+        if i is None or not self.mask[i]:
+            return glm.vec3(0)
+        return glm.vec3(*self.translations[i].tolist())
+
+    def to_json(self) -> Dict[str, Tuple[float, float, float, float]]:
+        index = numpy.flatnonzero(self.mask).tolist()
+        return {HUMANOID_BONES[i].name: tuple(r) for i, r in zip(index, self.rotations[index].tolist())}
 
     @staticmethod
     def from_json(name: str, bone_map: Dict[str, Tuple[float, float, float, float]]) -> 'Pose':
-        pose = Pose(name)
-        for k, v in bone_map.items():
-            x, y, z, w = v
-            pose.bones.append(
-                BonePose(k, HumanoidBone[k], Transform.from_rotation(glm.quat(w, x, y, z))))
-        return pose
+        if not bone_map:
+            return Pose(name)
+        return Pose.from_arrays(name, (HumanoidBone[k] for k in bone_map.keys()),
+                                numpy.array(list(bone_map.values()), dtype=numpy.float32))
 
 
 class Motion(abc.ABC):
     def __init__(self, name: str) -> None:
         self.name = name
-        self._parts_cache = None
+        self._parts_cache: Optional[HumanoidBodyParts] = None
+        self._bones_cache: Optional[int] = None
+        # set_time を baked_motion.BAKE_CACHE の配列の参照で済ませる
+        self.use_bake = False
+
+    def get_humanboneparts(self) -> HumanoidBodyParts:
+        if self._parts_cache is None:
+            self._parts_cache = get_body_parts(self.get_humanbones())
+        return self._parts_cache
 
-    # def get_humanboneparts(self) -> Set[HumanoidBodyParts]:
-    #     if self._parts_cache is None:
-    #         self._parts_cache = set(bone.get_classification().part
-    #                                 for bone in self.get_humanbones() if bone.is_enable())
-    #     return self._parts_cache
+    def get_bone_mask(self) -> int:
+        '''
+        HUMANOID_BONE_ORDINAL の bit の OR
+        '''
+        if self._bones_cache is None:
+            self._bones_cache = get_bone_mask(self.get_humanbones())
+        return self._bones_cache
 
     @ abc.abstractmethod
     def get_info(self) -> str:
@@ -98,20 +248,38 @@ class Motion(abc.ABC):
     def get_current_pose(self) -> Pose:
         raise NotImplementedError()
 
+    def get_fps(self) -> float:
+        '''
+        native frame rate
+        '''
+        return 30
+
+    def get_frame_count(self) -> int:
+        return int(self.get_end_time() * self.get_fps()) + 1
 
-# class Empty(Motion):
-#     def __init__(self) -> None:
-#         super().__init__('__empty__')
-#         self.pose = Pose(self.name)
+    def get_baked_pose(self, time_sec: float) -> Optional[Pose]:
+        if not self.use_bake:
+            return None
+        from .baked_motion import BAKE_CACHE
+        return BAKE_CACHE.get(self).get_pose(time_sec)
 
-#     def get_info(self) -> str:
-#         return 'empty'
 
-#     def get_humanbones(self) -> Set[HumanoidBone]:
-#         return set()
+class Empty(Motion):
+    def __init__(self) -> None:
+        super().__init__('__empty__')
+        self.pose = Pose(self.name)
 
-#     def set_time(self, time_sec: float):
-#         pass
+    def get_info(self) -> str:
+        return 'empty'
+
+    def get_humanbones(self) -> Set[HumanoidBone]:
+        return set()
 
-#     def get_current_pose(self) -> Pose:
-#         return self.pose
+    def get_end_time(self) -> float:
+        return 0
+
+    def set_time(self, time_sec: float):
+        pass
+
+    def get_current_pose(self) -> Pose:
+        return self.pose
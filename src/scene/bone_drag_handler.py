@@ -29,7 +29,7 @@ def sync_gizmo_with_joint(root: Joint, parent: glm.mat4, joint_shape_map: Dict[J
     root.calc_world(TR.from_matrix(parent))
     for joint in root.traverse():
         shape = joint_shape_map.get(joint)
-        if shape:
+        if shape and joint.sync():
             shape.matrix.set(joint.world.get_matrix() *
                              glm.mat4(joint.local_axis))
 
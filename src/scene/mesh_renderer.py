@@ -2,11 +2,12 @@ from typing import Optional
 import logging
 import ctypes
 from OpenGL import GL
-import glm
+import numpy
 from glglue import glo
 from glglue.camera import Camera
 from glglue.drawable import Drawable
 from formats.node import Node
+from formats.node_array import NodeArray
 from formats.buffer_types import Float4, UShort4, Float3
 
 LOGGER = logging.getLogger(__name__)
@@ -30,8 +31,13 @@ class MeshRenderer:
         vertices: ctypes.Array,
         indices: ctypes.Array,
         *,
-        joints: Optional[list] = None
+        joints: Optional[list] = None,
+        inverse_bind_matrices: Optional[numpy.ndarray] = None
     ) -> None:
+        '''
+        inverse_bind_matrices: joints の列優先の (J, 4, 4)。
+        無ければ node の bind 行列の逆行列を使う
+        '''
         self.shader = ("humanbonestructure", shader)
         self.vertices = vertices
         self.indices = indices
@@ -39,10 +45,55 @@ class MeshRenderer:
             joints = []
         self.joints = joints
         self.drawable: Optional[Drawable] = None
-        if self.joints:
-            self.bone_matrices = glm.array.zeros(len(self.joints), glm.mat4)
-        else:
-            self.bone_matrices = glm.array.zeros(1, glm.mat4)
+        # 列優先の mat4 を並べた uniform の buffer
+        self.bone_matrices = numpy.zeros(
+            (max(len(self.joints), 1), 4, 4), dtype=numpy.float32)
+        self.bone_matrices[:] = numpy.identity(4, dtype=numpy.float32)
+        self.node_array: Optional[NodeArray] = None
+        self.joint_indices = numpy.zeros(0, dtype=numpy.int32)
+        self.has_inverse_bind_matrices = inverse_bind_matrices is not None
+        self.inverse_bind_matrices = inverse_bind_matrices
+        # bone_matrices を計算したときの node_array の version
+        self.bind_version = -1
+        self.world_version = -1
+        # bone_matrices を upload する必要がある
+        self.bone_matrices_dirty = True
+
+    def set_node_array(self, node_array: NodeArray):
+        '''
+        joints の行列を node_array の配列から読む
+        '''
+        self.node_array = node_array
+        self.joint_indices = numpy.array(
+            [node_array.index[joint] for joint in self.joints], dtype=numpy.int32)
+        self.bind_version = -1
+        self.world_version = -1
+
+    def update_bone_matrices(self):
+        '''
+        joint が動いたときだけ skinning 行列を計算しなおす
+        '''
+        node_array = self.node_array
+        if not node_array:
+            for i, joint in enumerate(self.joints):
+                self.bone_matrices[i] = joint.skinning_matrix.to_list()
+            self.bone_matrices_dirty = True
+            return
+
+        if self.bind_version != node_array.bind_version:
+            if not self.has_inverse_bind_matrices:
+                self.inverse_bind_matrices = node_array.inverse_bind_matrices[self.joint_indices]
+            self.bind_version = node_array.bind_version
+            self.world_version = -1
+        if self.world_version != node_array.version:
+            # world * inverse(bind) を列優先で計算する
+            numpy.matmul(
+                self.inverse_bind_matrices,
+                node_array.world_matrices[self.joint_indices],
+                out=self.bone_matrices,
+            )
+            self.world_version = node_array.version
+            self.bone_matrices_dirty = True
 
     def render(self, camera: Camera, node: Optional[Node] = None):
         if not self.vertices or not self.indices:
@@ -59,9 +110,13 @@ class MeshRenderer:
             bone_matrices = glo.UniformLocation.create(shader.program, "uBoneMatrices")
 
             def update_bone_matrices():
+                # 変わっていなければ前回の uniform のまま
+                if not self.bone_matrices_dirty:
+                    return
                 bone_matrices.set_mat4(
-                    self.bone_matrices.ptr, count=len(self.bone_matrices)
+                    self.bone_matrices.ctypes.data, count=len(self.bone_matrices)
                 )
+                self.bone_matrices_dirty = False
 
             props.append(update_bone_matrices)
 
@@ -79,10 +134,7 @@ class MeshRenderer:
 
         # gpu skinning
         if self.joints:
-            for i, joint in enumerate(self.joints):
-                self.bone_matrices[i] = joint.skinning_matrix
-        else:
-            self.bone_matrices[0] = glm.mat4()
+            self.update_bone_matrices()
 
         GL.glEnable(GL.GL_CULL_FACE)
         GL.glEnable(GL.GL_DEPTH_TEST)
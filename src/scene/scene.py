@@ -7,7 +7,7 @@ from pydear.gizmo.gizmo_select_handler import GizmoSelectHandler
 from pydear.gizmo.shapes.shape import Shape
 from humanoid.pose import Pose
 from humanoid.bone import Bone, Skeleton, Joint
-from humanoid.humanoid_bones import HumanoidBone
+from humanoid.humanoid_bones import HumanoidBone, HUMANOID_BONES
 from .eventproperty import EventProperty
 from builder.hierarchy import Hierarchy
 from formats.transform import Transform
@@ -50,14 +50,11 @@ class Scene:
         # if pose and pose.bones:
         if pose:
             if self.skeleton:
-                self.skeleton.clear_pose()
-                for humanoid_bone in HumanoidBone:
-                    if not humanoid_bone.is_enable():
-                        continue
+                # 全 joint に代入する。変わらなかった joint は計算しなおさない
+                for humanoid_bone in HUMANOID_BONES:
                     joint = self.humanoid_joint_map.get(humanoid_bone)
                     if joint:
-                        pose_rotation = pose.get_rotation(
-                            humanoid_bone) if pose else glm.quat()
+                        pose_rotation = pose.get_rotation(humanoid_bone)
                         if cancel_axis and strict_delta:
                             a = self._get_cancel_axis(humanoid_bone)
                             d = self._get_strict_delta(humanoid_bone)
@@ -89,7 +86,7 @@ class Scene:
                         if node := self.hierarchy.get(humanoid_bone):
                             node.pose = Transform.from_rotation(joint.pose)
 
-                self.hierarchy.root.calc_world_matrix(glm.mat4())
+                self.hierarchy.calc_world_matrix()
 
     def _get_cancel_axis(self, humanoid_bone: HumanoidBone) -> glm.quat:
         return self.bone_axis_map.get(humanoid_bone, glm.quat())
@@ -158,10 +155,12 @@ class Scene:
         if not self.skeleton:
             return
 
+        # 変わった joint の world と shape だけ更新する
         self.skeleton.calc_world_matrix()
         for bone, shape in self.bone_shape_map.items():
-            shape.matrix.set(bone.head.world.get_matrix()
-                             * glm.mat4(bone.local_axis))
+            if bone.head.sync():
+                shape.matrix.set(bone.head.world.get_matrix()
+                                 * glm.mat4(bone.local_axis))
 
     def clear_pose(self):
         if not self.skeleton:
@@ -0,0 +1,110 @@
+import unittest
+import itertools
+import glm
+import numpy
+from formats.transform import Transform
+from formats.buffer_types import Float3
+from humanoid import batch_math
+from humanoid.bone import TR
+
+
+def random_quaternions(n: int) -> numpy.ndarray:
+    return batch_math.normalize(numpy.random.normal(size=(n, 4)))
+
+
+def to_quat(q) -> glm.quat:
+    x, y, z, w = q
+    return glm.quat(w, x, y, z)
+
+
+class Test_BatchMath(unittest.TestCase):
+    def setUp(self):
+        numpy.random.seed(0)
+        self.a = random_quaternions(32)
+        self.b = random_quaternions(32)
+        self.v = numpy.random.uniform(-10, 10, (32, 3))
+
+    def assertQuat(self, expected: glm.quat, actual):
+        self.assertAlmostEqual(abs(glm.dot(expected, to_quat(actual))), 1, places=5)
+
+    def test_multiply_inverse(self):
+        ab = batch_math.multiply(self.a, self.b)
+        inv = batch_math.inverse(self.a * 2)
+        for a, b, q, i in zip(self.a, self.b, ab, inv):
+            self.assertQuat(to_quat(a) * to_quat(b), q)
+            expected = glm.inverse(to_quat(a) * 2)
+            numpy.testing.assert_allclose(
+                (expected.x, expected.y, expected.z, expected.w), i, atol=1e-6)
+
+    def test_interpolate(self):
+        t = numpy.random.uniform(0, 1, 32)
+        s = batch_math.slerp(self.a, self.b, t)
+        n = batch_math.nlerp(self.a, self.b, t)
+        for a, b, x, q, r in zip(self.a, self.b, t, s, n):
+            qa = to_quat(a)
+            qb = to_quat(b)
+            if glm.dot(qa, qb) < 0:
+                qb = -qb
+            self.assertQuat(glm.slerp(qa, qb, x), q)
+            self.assertQuat(glm.normalize(glm.lerp(qa, qb, x)), r)
+
+    def test_rotate(self):
+        rotated = batch_math.rotate(self.a, self.v)
+        matrix = batch_math.to_matrix(self.a)
+        for q, v, r, m in zip(self.a, self.v, rotated, matrix):
+            expected = to_quat(q) * glm.vec3(*v)
+            numpy.testing.assert_allclose(expected, r, atol=1e-4)
+            numpy.testing.assert_allclose(expected, m @ v, atol=1e-4)
+
+    def test_axis_angle(self):
+        axis, angle = batch_math.to_axis_angle(self.a)
+        q = batch_math.from_axis_angle(axis, angle)
+        for src, x, a, dst in zip(self.a, axis, angle, q):
+            self.assertQuat(to_quat(src), dst)
+            self.assertQuat(glm.angleAxis(a, glm.vec3(*x)), src)
+        axis, angle = batch_math.to_axis_angle(numpy.array([0, 0, 0, 1.0]))
+        self.assertEqual(angle, 0)
+
+    def test_euler(self):
+        radians = numpy.random.uniform(-1.5, 1.5, (32, 3))
+        for order in itertools.permutations('XYZ'):
+            order = ''.join(order)
+            q = batch_math.from_euler(radians, order)
+            for r, x in zip(radians, q):
+                expected = glm.quat()
+                for axis, angle in zip(order, r):
+                    expected = expected * glm.angleAxis(
+                        angle, glm.vec3(*(axis == c for c in 'XYZ')))
+                self.assertQuat(expected, x)
+            numpy.testing.assert_allclose(
+                batch_math.to_euler(q, order), radians, atol=1e-6)
+
+    def test_compose(self):
+        t, r = batch_math.compose(self.v, self.a, self.v[::-1], self.b)
+        for t0, r0, t1, r1, t, r in zip(self.v, self.a, self.v[::-1], self.b, t, r):
+            expected = TR(glm.vec3(*t0), to_quat(r0)) * \
+                TR(glm.vec3(*t1), to_quat(r1))
+            numpy.testing.assert_allclose(expected.translation, t, atol=1e-4)
+            self.assertQuat(expected.rotation, r)
+
+    def test_flip(self):
+        t, r = batch_math.reverse_z(self.v, self.a)
+        for v, q, t, r in zip(self.v, self.a, t, r):
+            expected = Transform(glm.vec3(*v), to_quat(q), glm.vec3(1)).reverse_z()
+            numpy.testing.assert_allclose(expected.translation, t, atol=1e-5)
+            self.assertQuat(expected.rotation, r)
+            # axis angle での反転と同じ
+            axis = glm.axis(to_quat(q))
+            self.assertQuat(glm.angleAxis(-glm.angle(to_quat(q)),
+                            glm.vec3(axis.x, axis.y, -axis.z)), r)
+
+        t, r = batch_math.rotate_y180(self.v, self.a)
+        y180 = glm.angleAxis(glm.pi(), glm.vec3(0, 1, 0))
+        for v, q, t, r in zip(self.v, self.a, t, r):
+            x, y, z = Float3(*v).rotate_y180()
+            numpy.testing.assert_allclose((x, y, z), t, atol=1e-5)
+            self.assertQuat(y180 * to_quat(q) * glm.inverse(y180), r)
+
+
+if __name__ == '__main__':
+    unittest.main()
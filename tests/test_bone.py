@@ -0,0 +1,66 @@
+import unittest
+import math
+import glm
+from humanoid.bone import Skeleton, Joint, TR
+from humanoid.humanoid_bones import HumanoidBone
+
+
+def world_versions(skeleton: Skeleton):
+    return [bone.head.world_version for bone in skeleton.enumerate()]
+
+
+class Test_Skeleton(unittest.TestCase):
+    def test_incremental(self):
+        skeleton = Skeleton.create_default()
+        skeleton.calc_world_matrix()
+        before = world_versions(skeleton)
+
+        # 変更なし
+        skeleton.calc_world_matrix()
+        self.assertEqual(world_versions(skeleton), before)
+
+        # 左手だけ
+        hand = skeleton.left_arm.hand
+        hand.head.pose = glm.angleAxis(math.pi / 4, glm.vec3(0, 0, 1))
+        skeleton.calc_world_matrix()
+        subtree = set(joint for joint in hand.head.traverse())
+        for bone, version in zip(skeleton.enumerate(), before):
+            if bone.head in subtree:
+                self.assertGreater(bone.head.world_version, version)
+            else:
+                self.assertEqual(bone.head.world_version, version)
+
+        # 全部計算しなおしたものと同じ
+        expected = Skeleton.create_default()
+        expected.left_arm.hand.head.pose = hand.head.pose
+        expected.calc_world_matrix()
+        for bone, other in zip(skeleton.enumerate(), expected.enumerate()):
+            self.assertEqual(bone.head.world, other.head.world)
+
+    def test_sync(self):
+        skeleton = Skeleton.create_default()
+        skeleton.calc_world_matrix()
+        joint = skeleton.body.head.head
+        self.assertTrue(joint.sync())
+        self.assertFalse(joint.sync())
+        # 同じ pose の代入では変わらない
+        joint.pose = glm.quat()
+        skeleton.calc_world_matrix()
+        self.assertFalse(joint.sync())
+        joint.pose = glm.angleAxis(0.1, glm.vec3(0, 1, 0))
+        skeleton.calc_world_matrix()
+        self.assertTrue(joint.sync())
+
+    def test_parent_mutated(self):
+        joint = Joint('joint', TR(glm.vec3(0, 1, 0)), HumanoidBone.head)
+        parent = TR(glm.vec3(0, 0, 0), glm.quat())
+        joint.calc_world(parent)
+        self.assertEqual(joint.world.translation, glm.vec3(0, 1, 0))
+        # 同じ TR の中身を書き換える
+        parent.translation.x = 1
+        joint.calc_world(parent)
+        self.assertEqual(joint.world.translation, glm.vec3(1, 1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,292 @@
+import unittest
+import unittest.mock
+import pathlib
+import tempfile
+import itertools
+import random
+import math
+import glm
+import numpy
+from formats.bvh import bvh_parser, bvh_stream, bvh_node
+from humanoid.humanoid_bones import HumanoidBone
+
+HIERARCHY = '''HIERARCHY
+ROOT Hips
+{
+  OFFSET 0.00 0.00 0.00
+  CHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation
+  JOINT Spine
+  {
+    OFFSET 0.00 10.00 0.00
+    CHANNELS 3 Zrotation Yrotation Xrotation
+    End Site
+    {
+      OFFSET 0.00 10.00 0.00
+    }
+  }
+}
+'''
+
+
+def reference_transform(names, values, scale: float):
+    '''
+    channel を 1 個ずつ glm で評価する。(translation, rotation)
+    '''
+    t = [0.0, 0.0, 0.0]
+    r = glm.quat()
+    for name, value in zip(names, values):
+        axis = 'XYZ'.index(name[0])
+        if name.endswith('position'):
+            t[axis] = value * scale
+        else:
+            r = r * glm.angleAxis(math.radians(value), glm.vec3(*numpy.eye(3)[axis]))
+    return glm.vec3(*t), r
+
+
+def bvh_text(*frames, frame_count=None) -> str:
+    return (HIERARCHY
+            + 'MOTION\n'
+            + f'Frames: {len(frames) if frame_count is None else frame_count}\n'
+            + 'Frame Time: 0.033333\n'
+            + ''.join(' '.join(str(x) for x in frame) + '\n' for frame in frames))
+
+
+class Test_BvhParser(unittest.TestCase):
+    def test_parse(self):
+        bvh = bvh_parser.parse(pathlib.Path('test.bvh'), bvh_text(
+            (1, 2, 3, 0, 0, 0, 0, 0, 0),
+            (4, 5, 6, 90, 0, 0, 0, 90, 0),
+        ))
+        self.assertEqual(bvh.frame_count, 2)
+        self.assertEqual(bvh.data.shape, (2, 9))
+        self.assertEqual(list(bvh.data[1]), [4, 5, 6, 90, 0, 0, 0, 90, 0])
+
+        bvh.set_time(1 / 30)
+        pose = bvh.get_current_pose()
+        self.assertEqual(['Hips', 'Spine'], [bone.name for bone in pose.bones])
+        hips = pose.bones[0].transform
+        self.assertAlmostEqual(
+            glm.distance(hips.translation, glm.vec3(4, 5, 6) * bvh.scale), 0, places=5)
+        expected = glm.angleAxis(math.pi / 2, glm.vec3(0, 0, 1))
+        self.assertAlmostEqual(
+            abs(glm.dot(hips.rotation, expected)), 1, places=5)
+        expected = glm.angleAxis(math.pi / 2, glm.vec3(0, 1, 0))
+        self.assertAlmostEqual(
+            abs(glm.dot(pose.bones[1].transform.rotation, expected)), 1, places=5)
+
+    def test_crlf(self):
+        bvh = bvh_parser.parse(pathlib.Path('test.bvh'), bvh_text(
+            (1, 2, 3, 0, 0, 0, 0, 0, 0)).replace('\n', '\r\n'))
+        self.assertEqual(bvh.data.shape, (1, 9))
+
+    def test_invalid(self):
+        # frame count
+        with self.assertRaises(bvh_parser.BvhException):
+            bvh_parser.parse(pathlib.Path('test.bvh'), bvh_text(
+                (1, 2, 3, 0, 0, 0, 0, 0, 0), frame_count=2))
+        # channel count
+        with self.assertRaises(bvh_parser.BvhException):
+            bvh_parser.parse(pathlib.Path('test.bvh'), bvh_text(
+                (1, 2, 3, 0, 0, 0, 0, 0, 0),
+                (1, 2, 3, 0, 0, 0, 0, 0)))
+        with self.assertRaises(bvh_parser.BvhException):
+            bvh_parser.parse(pathlib.Path('test.bvh'), bvh_text(
+                (1, 2, 3, 0, 0, 0, 0, 0)))
+
+
+class Test_Euler(unittest.TestCase):
+    def test_orders(self):
+        random.seed(0)
+        for order in itertools.permutations('XYZ'):
+            names = [f'{axis}rotation' for axis in order]
+            # position channels in any place
+            names.insert(random.randrange(4), 'Zposition')
+            names.insert(random.randrange(5), 'Xposition')
+            names.insert(random.randrange(6), 'Yposition')
+            channels = bvh_node.Channels(names)
+            self.assertEqual(channels.order, ''.join(order))
+
+            data = numpy.random.uniform(-180, 180, (8, 6)).astype(numpy.float32)
+            q = bvh_node.euler_to_quaternion(
+                data[:, list(channels.rotation_index)], channels.order)
+            for row, (x, y, z, w) in zip(data, q):
+                t, r = reference_transform(names, row.tolist(), 1)
+                self.assertAlmostEqual(
+                    abs(glm.dot(r, glm.quat(w, x, y, z))), 1, places=5)
+                self.assertEqual(tuple(t),
+                                 tuple(row[list(channels.position_index)]))
+
+    def test_bvh(self):
+        text = bvh_text(
+            (1, 2, 3, 10, 20, 30, 40, 50, 60),
+            (4, 5, 6, 90, 0, 0, 0, 90, 0),
+        ).replace('Zrotation Xrotation Yrotation', 'Yrotation Xrotation Zrotation')
+        bvh = bvh_parser.parse(pathlib.Path('test.bvh'), text)
+        self.assertEqual([node.channels.order for node in bvh.joints], ['YXZ', 'ZYX'])
+        rotations = bvh.get_rotations()
+        translations = bvh.get_translations()
+        self.assertEqual(rotations.shape, (2, 2, 4))
+        self.assertIs(rotations, bvh.get_rotations())
+        for frame in range(2):
+            bvh.set_time(frame / 30)
+            for i, bone in enumerate(bvh.get_current_pose().bones):
+                x, y, z, w = rotations[frame, i]
+                self.assertAlmostEqual(
+                    abs(glm.dot(bone.transform.rotation, glm.quat(w, x, y, z))), 1, places=5)
+                self.assertAlmostEqual(glm.distance(
+                    bone.transform.translation, glm.vec3(*translations[frame, i])), 0, places=5)
+
+    def test_plan(self):
+        random.seed(1)
+        frames = [[random.uniform(-180, 180) for _ in range(9)]
+                  for _ in range(4)]
+        bvh = bvh_parser.parse(pathlib.Path('test.bvh'), bvh_text(*frames))
+        self.assertEqual(bvh.plan.names, ['Hips', 'Spine'])
+        self.assertEqual(list(bvh.plan.channel_offsets), [0, 6])
+
+        rotations = numpy.zeros((2, 4), dtype=numpy.float32)
+        translations = numpy.zeros((2, 3), dtype=numpy.float32)
+        for frame, row in enumerate(frames):
+            r, t = bvh.get_frame(frame, rotations, translations)
+            self.assertIs(r, rotations)
+            self.assertIs(t, translations)
+            it = iter(row)
+            for i, node in enumerate(bvh.joints):
+                t, r = reference_transform(node.channels.names, [
+                    next(it) for _ in node.channels.names], bvh.scale)
+                x, y, z, w = rotations[i]
+                self.assertAlmostEqual(
+                    abs(glm.dot(r, glm.quat(w, x, y, z))), 1, places=5)
+                self.assertAlmostEqual(glm.distance(
+                    t, glm.vec3(*translations[i])), 0, places=3)
+
+    def test_partial(self):
+        # position だけ, 一部の軸, 重複した軸
+        for names in (['Xrotation', 'Xrotation', 'Yrotation'],
+                      ['Xposition', 'Xrotation', 'Yrotation', 'Zrotation'],
+                      ['Xrotation', 'Yrotation'],
+                      ['Zposition', 'Xposition'],
+                      ['Yposition'],
+                      []):
+            channels = bvh_node.Channels(names)
+            root = bvh_node.Node('root', HumanoidBone.unknown, glm.vec3(0), channels, [])
+            plan = bvh_parser.EvaluationPlan(root)
+            data = numpy.random.uniform(-180, 180, (4, len(names))).astype(numpy.float32)
+            rotations, translations = plan.evaluate(data, 0.5)
+            for row, (x, y, z, w), actual in zip(data, rotations[:, 0], translations[:, 0]):
+                t, r = reference_transform(names, row.tolist(), 0.5)
+                self.assertAlmostEqual(
+                    abs(glm.dot(r, glm.quat(w, x, y, z))), 1, places=5)
+                self.assertAlmostEqual(glm.distance(t, glm.vec3(*actual)), 0, places=3)
+
+    def test_partial_bvh(self):
+        text = bvh_text(
+            (1, 2, 90, 90),
+            (4, 5, 0, 45),
+        ).replace('CHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation',
+                  'CHANNELS 3 Xposition Yposition Zrotation'
+                  ).replace('CHANNELS 3 Zrotation Yrotation Xrotation', 'CHANNELS 1 Yrotation')
+        bvh = bvh_parser.parse(pathlib.Path('test.bvh'), text)
+        self.assertEqual(bvh.data.shape, (2, 4))
+        bvh.set_time(0)
+        hips, spine = bvh.get_current_pose().bones
+        self.assertAlmostEqual(glm.distance(
+            hips.transform.translation, glm.vec3(1, 2, 0) * bvh.scale), 0, places=5)
+        self.assertAlmostEqual(abs(glm.dot(hips.transform.rotation, glm.angleAxis(
+            math.pi / 2, glm.vec3(0, 0, 1)))), 1, places=5)
+        self.assertAlmostEqual(abs(glm.dot(spine.transform.rotation, glm.angleAxis(
+            math.pi / 2, glm.vec3(0, 1, 0)))), 1, places=5)
+
+    def test_invalid(self):
+        names = ['Xrotation', 'Yrotation', 'Wrotation']
+        with self.assertRaises(bvh_parser.BvhException) as cm:
+            bvh_node.Channels(names)
+        # どの CHANNELS か分かるように
+        self.assertIn(' '.join(names), str(cm.exception))
+
+
+class Test_BvhStream(unittest.TestCase):
+    def setUp(self):
+        self.frames = [(i, i+1, i+2, 0, 0, 0, i % 90, 0, 0)
+                       for i in range(25)]
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.dir.name) / 'test.bvh'
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_chunks(self):
+        self.path.write_text(bvh_text(*self.frames))
+        with bvh_stream.open_stream(self.path) as stream:
+            self.assertEqual(stream.frame_count, 25)
+            chunks = list(stream.iter_chunks(10))
+            self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+            numpy.testing.assert_array_equal(
+                numpy.concatenate(chunks), numpy.array(self.frames, dtype=numpy.float32))
+
+    def test_seek(self):
+        for newline in ('\n', '\r\n'):
+            text = bvh_text(*self.frames).replace('\n', newline)
+            for src in (text, text.rstrip()):
+                self.path.write_bytes(src.encode('utf-8'))
+                with bvh_stream.open_stream(self.path) as stream:
+                    index = stream.get_index()
+                    self.assertEqual(len(index), 26)
+                    numpy.testing.assert_array_equal(
+                        stream.get_frame(24), self.frames[24])
+                    numpy.testing.assert_array_equal(
+                        stream.read_frames(3, 7), self.frames[3:7])
+                    numpy.testing.assert_array_equal(
+                        stream.get_frame(0), self.frames[0])
+                    # chunk after seek
+                    self.assertEqual(sum(len(chunk)
+                                         for chunk in stream.iter_chunks(7)), 25)
+
+                # reuse index
+                with bvh_stream.open_stream(self.path, index) as stream:
+                    numpy.testing.assert_array_equal(
+                        stream.get_frame(12), self.frames[12])
+
+    def test_blank_lines(self):
+        lines = bvh_text(*self.frames).split('\n')
+        motion = lines.index('Frame Time: 0.033333') + 1
+        # 空行と空白だけの行
+        lines.insert(motion + 20, '')
+        lines.insert(motion + 10, ' \t')
+        lines.insert(motion + 5, '')
+        lines.insert(motion, '')
+        for newline, block_size in itertools.product(('\n', '\r\n'), (7, bvh_stream.INDEX_BLOCK_SIZE)):
+            text = newline.join(lines)
+            for src in (text, text + newline * 2, text.rstrip()):
+                self.path.write_bytes(src.encode('utf-8'))
+                # 行が block をまたぐ
+                with bvh_stream.open_stream(self.path) as stream, \
+                        unittest.mock.patch.object(bvh_stream, 'INDEX_BLOCK_SIZE', block_size):
+                    self.assertEqual(len(stream.get_index()), 26)
+                    for frame in range(25):
+                        numpy.testing.assert_array_equal(
+                            stream.get_frame(frame), self.frames[frame])
+                    numpy.testing.assert_array_equal(
+                        stream.read_frames(3, 12), self.frames[3:12])
+                    self.assertEqual([len(chunk) for chunk in stream.iter_chunks(10)], [10, 10, 5])
+
+    def test_load(self):
+        self.path.write_text(bvh_text(*self.frames))
+        with bvh_stream.open_stream(self.path) as stream:
+            bvh = stream.load(5, 10)
+            self.assertEqual(bvh.frame_count, 5)
+            numpy.testing.assert_array_equal(bvh.data[0], self.frames[5])
+            # root is not shared
+            self.assertIsNot(bvh.root, stream.root)
+
+    def test_missing_frames(self):
+        self.path.write_text(bvh_text(*self.frames, frame_count=30))
+        with bvh_stream.open_stream(self.path) as stream:
+            with self.assertRaises(bvh_parser.BvhException):
+                stream.get_index()
+            with self.assertRaises(bvh_parser.BvhException):
+                list(stream.iter_chunks(10))
+
+
+if __name__ == '__main__':
+    unittest.main()
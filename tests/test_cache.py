@@ -0,0 +1,110 @@
+import unittest
+import pathlib
+import tempfile
+import os
+import numpy
+from formats import cache
+from test_vmd import vmd_bytes, key_frame, interpolation_bytes
+from test_bvh_parser import bvh_text
+from test_pmx import create_pmx
+
+
+class Test_FileCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache = cache.FileCache(pathlib.Path(self.dir.name) / 'cache')
+        self.path = pathlib.Path(self.dir.name) / 'test.bvh'
+        self.path.write_text(bvh_text(
+            (1, 2, 3, 10, 20, 30, 40, 50, 60),
+            (4, 5, 6, 90, 0, 0, 0, 90, 0)))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_bvh(self):
+        bvh = cache.load_bvh(self.path, self.cache)
+        self.assertIsNotNone(self.cache.get(self.path, 'bvh'))
+
+        cached = cache.load_bvh(self.path, self.cache)
+        self.assertIsInstance(cached.data, numpy.memmap)
+        self.assertEqual([node.name for node in cached.root.traverse()],
+                         [node.name for node in bvh.root.traverse()])
+        self.assertEqual([node.offset for node in cached.root.traverse()],
+                         [node.offset for node in bvh.root.traverse()])
+        numpy.testing.assert_array_equal(
+            cached.get_rotations(), bvh.get_rotations())
+        cached.set_time(1 / 30)
+        bvh.set_time(1 / 30)
+        numpy.testing.assert_array_equal(cached.rotations, bvh.rotations)
+
+    def test_invalidate(self):
+        cache.load_bvh(self.path, self.cache)
+
+        # touch only
+        stat = self.path.stat()
+        os.utime(self.path, ns=(stat.st_atime_ns,
+                 stat.st_mtime_ns + 1000000000))
+        self.assertIsNotNone(self.cache.get(self.path, 'bvh'))
+
+        # same size, different content
+        self.path.write_text(self.path.read_text().replace('90 0 0', '80 0 0'))
+        os.utime(self.path, ns=(stat.st_atime_ns,
+                 stat.st_mtime_ns + 2000000000))
+        self.assertIsNone(self.cache.get(self.path, 'bvh'))
+        bvh = cache.load_bvh(self.path, self.cache)
+        self.assertEqual(bvh.data[1, 3], 80)
+
+        # kind
+        self.assertIsNone(self.cache.get(self.path, 'vmd'))
+
+    def test_vmd(self):
+        path = pathlib.Path(self.dir.name) / 'test.vmd'
+        path.write_bytes(vmd_bytes(
+            key_frame('センター', 30, (10, 0, 0), (0, 0, 0, 1),
+                      interpolation_bytes((127, 0, 127, 0), (20, 20, 107, 107), (20, 20, 107, 107), (64, 0, 64, 127))),
+            key_frame('センター', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 30, (0, 0, 0), (0, 0, 0.7071, 0.7071)),
+        ))
+        vmd = cache.load_vmd(path, self.cache)
+        cached = cache.load_vmd(path, self.cache)
+        self.assertIsInstance(cached.curves[0].frames, numpy.memmap)
+        self.assertEqual([curve.name for curve in cached.curves], [
+                         curve.name for curve in vmd.curves])
+        for time_sec in (0, 0.3, 0.5, 1.2):
+            vmd.set_time(time_sec)
+            cached.set_time(time_sec)
+            numpy.testing.assert_array_equal(
+                cached.translations, vmd.translations)
+            numpy.testing.assert_array_equal(cached.rotations, vmd.rotations)
+
+    def test_empty_vmd(self):
+        path = pathlib.Path(self.dir.name) / 'camera.vmd'
+        path.write_bytes(vmd_bytes())
+        cache.load_vmd(path, self.cache)
+        cached = cache.load_vmd(path, self.cache)
+        self.assertEqual(cached.curves, [])
+        self.assertEqual(cached.target_model, 'model')
+
+    def test_pmx(self):
+        path = pathlib.Path(self.dir.name) / 'test.pmx'
+        path.write_bytes(create_pmx([
+            ((1, 2, 3), (0, 1, 0), (0, 0), 0, [0], []),
+            ((4, 5, 6), (0, 1, 0), (0, 0), 1, [0, 1], [0.25]),
+            ((7, 8, 9), (0, 1, 0), (0, 0), 0, [1], []),
+        ], 2, [('センター', (0, 1, 0), -1), ('頭', (0, 10, 0), 0)]))
+        pmx = cache.load_pmx(path, self.cache)
+        cached = cache.load_pmx(path, self.cache)
+        self.assertIsNot(cached, pmx)
+        self.assertEqual(cached.name_ja, pmx.name_ja)
+        self.assertEqual(cached.deform_bones, pmx.deform_bones)
+        self.assertEqual(bytes(cached.vertices), bytes(pmx.vertices))
+        self.assertEqual(list(cached.indices), list(pmx.indices))
+        self.assertEqual([(bone.name_ja, bone.parent_index, tuple(bone.position), tuple(bone.tail_position))
+                          for bone in cached.bones],
+                         [(bone.name_ja, bone.parent_index, tuple(bone.position), tuple(bone.tail_position))
+                          for bone in pmx.bones])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+import json
+import struct
+import base64
+import pathlib
+import tempfile
+import numpy
+from formats.gltf_loader import Gltf
+
+
+def create_glb(gltf: dict, bin: bytes) -> bytes:
+    json_chunk = json.dumps(gltf).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    bin += b'\0' * (-len(bin) % 4)
+    length = 12 + 8 + len(json_chunk) + 8 + len(bin)
+    return (struct.pack('<III', 0x46546C67, 2, length)
+            + struct.pack('<II', len(json_chunk), 0x4E4F534A) + json_chunk
+            + struct.pack('<II', len(bin), 0x004E4942) + bin)
+
+
+class Test_Gltf(unittest.TestCase):
+    def test_accessor(self):
+        # position(VEC3 float) と weight(VEC4 normalized ubyte) を交互に並べる
+        positions = numpy.arange(12, dtype=numpy.float32).reshape(4, 3)
+        weights = numpy.array([[255, 0, 0, 0], [128, 127, 0, 0],
+                               [0, 0, 255, 0], [51, 51, 51, 102]], dtype=numpy.uint8)
+        interleaved = b''.join(p.tobytes() + w.tobytes()
+                               for p, w in zip(positions, weights))
+        # MAT3 の unsigned short は列を 4 byte に揃える
+        mat3 = numpy.arange(9, dtype=numpy.uint16).reshape(3, 3)
+        mat3_bytes = b''.join(col.tobytes() + b'\0\0' for col in mat3)
+        mat4 = numpy.arange(32, dtype=numpy.float32).reshape(2, 4, 4)
+        sparse_indices = numpy.array([1, 3], dtype=numpy.uint16)
+        sparse_values = numpy.array([[1, 2, 3], [4, 5, 6]], dtype=numpy.float32)
+        bin = interleaved + mat3_bytes + mat4.tobytes() + \
+            sparse_indices.tobytes() + sparse_values.tobytes()
+        offsets = numpy.cumsum([0, len(interleaved), len(mat3_bytes),
+                               mat4.nbytes, sparse_indices.nbytes]).tolist()
+
+        gltf = {
+            'asset': {'version': '2.0'},
+            'buffers': [{'byteLength': len(bin)}],
+            'bufferViews': [
+                {'buffer': 0, 'byteOffset': offsets[0], 'byteLength': len(interleaved), 'byteStride': 16},
+                {'buffer': 0, 'byteOffset': offsets[1], 'byteLength': len(mat3_bytes)},
+                {'buffer': 0, 'byteOffset': offsets[2], 'byteLength': mat4.nbytes},
+                {'buffer': 0, 'byteOffset': offsets[3], 'byteLength': sparse_indices.nbytes},
+                {'buffer': 0, 'byteOffset': offsets[4], 'byteLength': sparse_values.nbytes},
+            ],
+            'accessors': [
+                {'bufferView': 0, 'componentType': 5126, 'type': 'VEC3', 'count': 4},
+                {'bufferView': 0, 'byteOffset': 12, 'componentType': 5121,
+                    'normalized': True, 'type': 'VEC4', 'count': 4},
+                {'bufferView': 1, 'componentType': 5123, 'type': 'MAT3', 'count': 1},
+                {'bufferView': 2, 'componentType': 5126, 'type': 'MAT4', 'count': 2},
+                # bufferView の無い sparse
+                {'componentType': 5126, 'type': 'VEC3', 'count': 4, 'sparse': {
+                    'count': 2,
+                    'indices': {'bufferView': 3, 'componentType': 5123},
+                    'values': {'bufferView': 4},
+                }},
+                # bufferView の有る sparse
+                {'bufferView': 0, 'componentType': 5126, 'type': 'VEC3', 'count': 4, 'sparse': {
+                    'count': 2,
+                    'indices': {'bufferView': 3, 'componentType': 5123},
+                    'values': {'bufferView': 4},
+                }},
+            ],
+        }
+        loaded = Gltf.load_glb(create_glb(gltf, bin))
+
+        actual = loaded.load_accessor(0)
+        numpy.testing.assert_array_equal(actual, positions)
+        # 複製しない
+        self.assertFalse(actual.flags.owndata)
+        self.assertFalse(actual.flags.writeable)
+
+        actual = loaded.load_accessor(1)
+        self.assertEqual(actual.dtype, numpy.float32)
+        numpy.testing.assert_allclose(actual, weights / 255)
+
+        numpy.testing.assert_array_equal(loaded.load_accessor(2), mat3[None])
+        numpy.testing.assert_array_equal(loaded.load_accessor(3), mat4)
+
+        expected = numpy.zeros((4, 3), dtype=numpy.float32)
+        expected[[1, 3]] = sparse_values
+        numpy.testing.assert_array_equal(loaded.load_accessor(4), expected)
+        expected = positions.copy()
+        expected[[1, 3]] = sparse_values
+        numpy.testing.assert_array_equal(loaded.load_accessor(5), expected)
+        # 元の bin は変わらない
+        numpy.testing.assert_array_equal(loaded.load_accessor(0), positions)
+
+    def test_skeleton_only(self):
+        gltf = {'asset': {'version': '2.0'}, 'nodes': [{'name': 'root'}]}
+        loaded = Gltf.load_glb(create_glb(gltf, b'\0' * 4), skeleton_only=True)
+        self.assertEqual(loaded.gltf['nodes'][0]['name'], 'root')
+        self.assertIsNone(loaded.bin)
+
+    def test_glb_path(self):
+        gltf = {'asset': {'version': '2.0'}, 'nodes': [{'name': 'root'}]}
+        data = create_glb(gltf, b'\0' * 64)
+        with tempfile.TemporaryDirectory() as dir:
+            path = pathlib.Path(dir) / 'model.glb'
+            path.write_bytes(data)
+            loaded = Gltf.load_glb_path(path)
+            self.assertEqual(len(loaded.bin), 64)
+
+            # bin chunk は読まないので途中で切れていてもよい
+            path.write_bytes(data[:-60])
+            loaded = Gltf.load_glb_path(path, skeleton_only=True)
+            self.assertEqual(loaded.gltf['nodes'][0]['name'], 'root')
+            self.assertIsNone(loaded.bin)
+
+    def test_gltf(self):
+        positions = numpy.arange(9, dtype=numpy.float32).reshape(3, 3)
+        indices = numpy.array([0, 2, 1], dtype=numpy.uint16)
+        uvs = numpy.arange(6, dtype=numpy.float32).reshape(3, 2)
+        with tempfile.TemporaryDirectory() as dir:
+            path = pathlib.Path(dir) / 'model.gltf'
+            (path.parent / 'positions.bin').write_bytes(positions.tobytes())
+            (path.parent / 'index data.bin').write_bytes(b'\0' * 8 + indices.tobytes())
+            gltf = {
+                'asset': {'version': '2.0'},
+                'buffers': [
+                    {'uri': 'positions.bin', 'byteLength': positions.nbytes},
+                    {'uri': 'index%20data.bin', 'byteLength': 8 + indices.nbytes},
+                    {'uri': 'data:application/octet-stream;base64,' +
+                        base64.b64encode(uvs.tobytes()).decode('ascii'), 'byteLength': uvs.nbytes},
+                ],
+                'bufferViews': [
+                    {'buffer': 0, 'byteLength': positions.nbytes},
+                    {'buffer': 1, 'byteOffset': 8, 'byteLength': indices.nbytes},
+                    {'buffer': 2, 'byteLength': uvs.nbytes},
+                ],
+                'accessors': [
+                    {'bufferView': 0, 'componentType': 5126, 'type': 'VEC3', 'count': 3},
+                    {'bufferView': 1, 'componentType': 5123, 'type': 'SCALAR', 'count': 3},
+                    {'bufferView': 2, 'componentType': 5126, 'type': 'VEC2', 'count': 3},
+                ],
+            }
+            path.write_text(json.dumps(gltf))
+
+            loaded = Gltf.load_gltf(path)
+            # buffer は使うまで開かない
+            self.assertEqual(loaded._buffers, {})
+            numpy.testing.assert_array_equal(loaded.load_accessor(1), indices)
+            self.assertEqual(list(loaded._buffers.keys()), [1])
+            numpy.testing.assert_array_equal(loaded.load_accessor(0), positions)
+            numpy.testing.assert_array_equal(loaded.load_accessor(2), uvs)
+            del loaded
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import pathlib
+import tempfile
+import os
+from formats import library
+from humanoid.humanoid_bones import HumanoidBone, HumanoidBodyParts
+from test_vmd import vmd_bytes, key_frame
+from test_bvh_parser import bvh_text
+
+
+class Test_Library(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.dir.name) / 'assets'
+        (self.root / 'sub').mkdir(parents=True)
+        (self.root / 'walk.bvh').write_text(bvh_text(
+            (0, 0, 0, 0, 0, 0, 0, 0, 0),
+            (0, 0, 0, 0, 0, 0, 0, 0, 0)))
+        (self.root / 'sub' / 'hand.vmd').write_bytes(vmd_bytes(
+            key_frame('左親指１', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('左手首', 10, (0, 0, 0), (0, 0, 0, 1)),
+        ))
+        (self.root / 'sub' / 'head.vmd').write_bytes(vmd_bytes(
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+        ))
+        (self.root / 'broken.pmx').write_bytes(b'broken')
+        (self.root / 'readme.txt').write_text('not an asset')
+        self.catalog = library.Catalog(pathlib.Path(self.dir.name) / 'catalog.db')
+
+    def tearDown(self):
+        self.catalog.close()
+        self.dir.cleanup()
+
+    def test_scan(self):
+        self.assertEqual(self.catalog.scan(self.root, max_workers=2), (4, 0))
+        self.assertEqual(len(self.catalog), 4)
+
+        walk = self.catalog.get(self.root / 'walk.bvh')
+        self.assertEqual(walk.format, 'bvh')
+        self.assertEqual(walk.frames, 2)
+        self.assertAlmostEqual(walk.fps, 30, places=2)
+        self.assertEqual(walk.bone_count, 2)
+        self.assertIsNone(walk.error)
+
+        hand = self.catalog.get(self.root / 'sub' / 'hand.vmd')
+        self.assertEqual(hand.frames, 11)
+        self.assertEqual(hand.get_parts(),
+                         HumanoidBodyParts.LeftArm | HumanoidBodyParts.LeftFingers)
+
+        self.assertIsNotNone(self.catalog.get(self.root / 'broken.pmx').error)
+
+        # query
+        names = [pathlib.Path(asset.path).name for asset in self.catalog.query(
+            has_parts=HumanoidBodyParts.LeftFingers)]
+        self.assertEqual(names, ['hand.vmd'])
+        names = [pathlib.Path(asset.path).name for asset in self.catalog.query(
+            formats=['vmd'], no_parts=HumanoidBodyParts.LeftFingers)]
+        self.assertEqual(names, ['head.vmd'])
+        names = [pathlib.Path(asset.path).name for asset in self.catalog.query(
+            has_bones=[HumanoidBone.leftThumbProximal])]
+        self.assertEqual(names, ['hand.vmd'])
+
+    def test_rescan(self):
+        self.catalog.scan(self.root, max_workers=1)
+        self.assertEqual(self.catalog.scan(self.root, max_workers=1), (0, 0))
+
+        head = self.root / 'sub' / 'head.vmd'
+        head.write_bytes(vmd_bytes(
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 20, (0, 0, 0), (0, 0, 0, 1)),
+        ))
+        stat = head.stat()
+        os.utime(head, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        (self.root / 'walk.bvh').unlink()
+        self.assertEqual(self.catalog.scan(self.root, max_workers=1), (1, 1))
+        self.assertEqual(self.catalog.get(head).frames, 21)
+        self.assertIsNone(self.catalog.get(self.root / 'walk.bvh'))
+
+    def test_rescan_parts(self):
+        self.catalog.scan(self.root, max_workers=1)
+        head = self.root / 'sub' / 'head.vmd'
+        head.write_bytes(vmd_bytes(
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('左親指１', 0, (0, 0, 0), (0, 0, 0, 1)),
+        ))
+        stat = head.stat()
+        os.utime(head, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        (self.root / 'sub' / 'hand.vmd').unlink()
+        self.assertEqual(self.catalog.scan(self.root, max_workers=1), (1, 1))
+        names = [pathlib.Path(asset.path).name for asset in self.catalog.query(
+            has_parts=HumanoidBodyParts.Trunk | HumanoidBodyParts.LeftFingers)]
+        self.assertEqual(names, ['head.vmd'])
+        self.assertEqual(self.catalog.query(
+            formats=['vmd'], no_parts=HumanoidBodyParts.LeftFingers | HumanoidBodyParts.Legs), [])
+        # 消えた file の part は残らない
+        self.assertEqual(self.catalog.connection.execute(
+            'SELECT COUNT(*) FROM asset_parts WHERE path LIKE ?', ('%hand.vmd',)).fetchone()[0], 0)
+
+    def test_parts_index(self):
+        plan = ' '.join(row[-1] for row in self.catalog.connection.execute(
+            'EXPLAIN QUERY PLAN SELECT path FROM asset_parts WHERE part = ?', (1,)))
+        self.assertIn('USING PRIMARY KEY', plan)
+
+    def test_sibling_root(self):
+        # assets2 の scan で assets の索引を消さない
+        sibling = pathlib.Path(self.dir.name) / 'assets2'
+        sibling.mkdir()
+        (sibling / 'head.vmd').write_bytes(vmd_bytes(
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+        ))
+        self.catalog.scan(self.root, max_workers=1)
+        self.assertEqual(self.catalog.scan(sibling, max_workers=1), (1, 0))
+        self.assertEqual(len(self.catalog), 5)
+        self.assertEqual(self.catalog.scan(self.root, max_workers=1), (0, 0))
+
+    def test_index_deleted(self):
+        self.assertIsNone(library.index_file(
+            str(self.root / 'deleted.vmd')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+import ctypes
+import glm
+import numpy
+from formats.gltf_loader import Gltf
+from formats.pmx_loader import Pmx
+from formats.pmd_loader import Pmd
+from builder import mesh_builder
+from test_gltf import create_glb
+from test_pmx import create_pmx
+from test_pmd import create_pmd
+
+
+def load_mesh(primitives, matrices=()):
+    '''
+    primitives: (positions, indices)。indices が None なら accessor 無し
+    matrices: MAT4 の accessor にする列優先の (n, 16)
+
+    (gltf, matrices の accessor の index)
+    '''
+    bin = bytearray()
+    views = []
+    accessors = []
+
+    def add(array: numpy.ndarray, component_type: int, accessor_type: str) -> int:
+        views.append({'buffer': 0, 'byteOffset': len(bin), 'byteLength': array.nbytes})
+        bin.extend(array.tobytes())
+        bin.extend(b'\0' * (-len(bin) % 4))
+        accessors.append({'bufferView': len(views) - 1, 'componentType': component_type,
+                          'type': accessor_type, 'count': len(array)})
+        return len(accessors) - 1
+
+    gltf_primitives = []
+    for positions, indices in primitives:
+        prim = {'attributes': {'POSITION': add(
+            numpy.array(positions, dtype=numpy.float32), 5126, 'VEC3')}}
+        if indices is not None:
+            prim['indices'] = add(numpy.array(
+                indices, dtype=numpy.uint16), 5123, 'SCALAR')
+        gltf_primitives.append(prim)
+
+    matrices_accessor = add(numpy.array(
+        matrices, dtype=numpy.float32), 5126, 'MAT4') if len(matrices) else None
+
+    gltf = {
+        'asset': {'version': '2.0'},
+        'buffers': [{'byteLength': len(bin)}],
+        'bufferViews': views,
+        'accessors': accessors,
+        'meshes': [{'primitives': gltf_primitives}],
+    }
+    return Gltf.load_glb(create_glb(gltf, bytes(bin))), matrices_accessor
+
+
+def vertex_array(vertices) -> numpy.ndarray:
+    return numpy.frombuffer(vertices, dtype=numpy.float32).reshape(len(vertices), -1)
+
+
+class Test_ReverseZ(unittest.TestCase):
+    def test_flip_winding(self):
+        indices = (ctypes.c_uint32 * 9)(0, 1, 2, 3, 4, 5, 6, 7, 8)
+        mesh_builder.flip_winding(indices)
+        self.assertEqual(list(indices), [0, 2, 1, 3, 5, 4, 6, 8, 7])
+
+    def test_pmx(self):
+        src = [((1, 2, 3), (0.6, 0, 0.8), (0, 0), 0, [0], []),
+               ((4, 5, 6), (0, 0.6, -0.8), (0, 0), 0, [0], []),
+               ((7, 8, 9), (0, 0, 1), (0, 0), 0, [0], [])]
+        pmx = Pmx(create_pmx(src, 1))
+        expected = vertex_array(pmx.vertices).copy()
+
+        vertices, indices = mesh_builder.pmx_mesh(pmx)
+        self.assertEqual(list(indices), [0, 2, 1])
+        actual = vertex_array(vertices)
+        # position.z, normal.z だけ 1 回反転する
+        expected[:, [2, 5]] *= -1
+        numpy.testing.assert_array_equal(actual, expected)
+        numpy.testing.assert_allclose(actual[:, 5], [-0.8, 0.8, -1], rtol=1e-6)
+
+        # 2 回目の build でも反転が戻らない
+        vertices, indices = mesh_builder.pmx_mesh(pmx)
+        self.assertEqual(list(indices), [0, 2, 1])
+        numpy.testing.assert_array_equal(vertex_array(vertices), expected)
+        self.assertEqual(list(pmx.indices), [0, 1, 2])
+
+    def test_pmd(self):
+        vertices = [((1, 2, 3), 0, 1, 100), ((4, 5, 6), 1, 1, 30), ((7, 8, 9), 2, 0, 0)]
+        pmd = Pmd(create_pmd(vertices, [('センター', 65535, (0, 0, 0))], []))
+        src = pmd.vertex_array.copy()
+
+        vertices, indices = mesh_builder.pmd_mesh(pmd)
+        self.assertEqual(list(indices), [0, 2, 1])
+        actual = vertex_array(vertices)
+        numpy.testing.assert_array_equal(actual[:, 0:2], src['position'][:, 0:2])
+        numpy.testing.assert_array_equal(actual[:, 2], -src['position'][:, 2])
+        numpy.testing.assert_array_equal(actual[:, 3:5], src['normal'][:, 0:2])
+        numpy.testing.assert_array_equal(actual[:, 5], -src['normal'][:, 2])
+        numpy.testing.assert_array_equal(actual[:, 8:10], [(0, 1), (1, 1), (2, 0)])
+        numpy.testing.assert_allclose(actual[:, 12], [1, 0.3, 0], rtol=1e-6)
+
+        # 2 回目の build でも反転が戻らない
+        vertices, indices = mesh_builder.pmd_mesh(pmd)
+        self.assertEqual(list(indices), [0, 2, 1])
+        numpy.testing.assert_array_equal(vertex_array(vertices), actual)
+        self.assertEqual(list(pmd.indices), [0, 1, 2])
+
+
+class Test_MergePrimitives(unittest.TestCase):
+    def test_offset(self):
+        gltf, _ = load_mesh([
+            ([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [0, 1, 2]),
+            ([(0, 0, 1), (1, 0, 1), (0, 1, 1), (1, 1, 1)], [3, 2, 1, 0, 1, 2]),
+            # indices 無し
+            ([(0, 0, 2), (1, 0, 2), (0, 1, 2)], None),
+        ])
+        vertices, indices = mesh_builder.merge_primitives(
+            gltf, gltf.gltf['meshes'][0], None)
+        self.assertEqual(len(vertices), 10)
+        self.assertEqual(indices._type_, ctypes.c_uint16)
+        self.assertEqual(list(indices), [0, 1, 2, 6, 5, 4, 3, 4, 5, 7, 8, 9])
+        array = vertex_array(vertices)
+        numpy.testing.assert_array_equal(
+            array[:, 2], [0, 0, 0, 1, 1, 1, 1, 2, 2, 2])
+        # skin が無ければ 0 番の bone に weight 1
+        numpy.testing.assert_array_equal(array[:, 8:12], 0)
+        numpy.testing.assert_array_equal(array[:, 12:16], 1)
+
+    def test_index_type(self):
+        for vertex_count, index_type in ((65536, ctypes.c_uint16), (65537, ctypes.c_uint32)):
+            gltf, _ = load_mesh([
+                ([(0, 0, 0)] * 3, [0, 1, 2]),
+                ([(0, 0, 0)] * (vertex_count - 3), None),
+            ])
+            vertices, indices = mesh_builder.merge_primitives(
+                gltf, gltf.gltf['meshes'][0], None)
+            self.assertEqual(len(vertices), vertex_count)
+            self.assertEqual(indices._type_, index_type)
+            array = numpy.ctypeslib.as_array(indices)
+            self.assertEqual(len(array), vertex_count)
+            self.assertEqual(array[-1], vertex_count - 1)
+
+    def test_vrm0(self):
+        gltf, _ = load_mesh([([(1, 2, 3), (4, 5, 6), (7, 8, 9)], [0, 1, 2])])
+        vertices, _ = mesh_builder.merge_primitives(
+            gltf, gltf.gltf['meshes'][0], 0)
+        numpy.testing.assert_array_equal(vertex_array(vertices)[:, 0:3], [
+            (-1, 2, -3), (-4, 5, -6), (-7, 8, -9)])
+
+
+class Test_InverseBindMatrices(unittest.TestCase):
+    def test_vrm0(self):
+        def matrix(angle: float, t: glm.vec3) -> glm.mat4:
+            return glm.inverse(glm.translate(t) * glm.rotate(angle, glm.vec3(1, 0, 0)))
+
+        def columns(m: glm.mat4):
+            # 列優先
+            return [m[c][r] for c in range(4) for r in range(4)]
+
+        src = [matrix(0.5, glm.vec3(1, 2, 3)), matrix(-1, glm.vec3(0, 1, 0))]
+        gltf, accessor = load_mesh(
+            [([(0, 0, 0)], None)], [columns(m) for m in src])
+        skin = {'joints': [0, 1], 'inverseBindMatrices': accessor}
+
+        actual = mesh_builder.load_inverse_bind_matrices(gltf, skin, None)
+        self.assertEqual(actual.shape, (2, 4, 4))
+        numpy.testing.assert_allclose(
+            actual.reshape(2, 16), [columns(m) for m in src], atol=1e-6)
+
+        # Y180 で回した bind pose の逆。x 軸回りは角度が反転する
+        actual = mesh_builder.load_inverse_bind_matrices(gltf, skin, 0)
+        numpy.testing.assert_allclose(actual.reshape(2, 16), [
+            columns(matrix(-0.5, glm.vec3(-1, 2, -3))),
+            columns(matrix(1, glm.vec3(0, 1, 0))),
+        ], atol=1e-6)
+        # 元の accessor は変わらない
+        numpy.testing.assert_allclose(gltf.load_accessor(
+            accessor).reshape(2, 16), [columns(m) for m in src], atol=1e-6)
+
+        self.assertIsNone(mesh_builder.load_inverse_bind_matrices(
+            gltf, {'joints': [0]}, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
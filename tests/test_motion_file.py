@@ -0,0 +1,109 @@
+import unittest
+import pathlib
+import tempfile
+import math
+import glm
+import numpy
+from formats.vmd_loader import Vmd
+from formats.vpd_loader import Vpd
+from formats.bvh import bvh_parser
+from humanoid import motion_file
+from humanoid.humanoid_bones import HumanoidBone
+from humanoid.pose import Empty
+from test_vmd import vmd_bytes, key_frame
+from test_bvh_parser import bvh_text
+
+VPD = '''Vocaloid Pose Data file
+
+model.osm;
+2;
+
+Bone0{下半身
+  1.000000,2.000000,3.000000;
+  0.000000,0.000000,0.000000,1.000000;
+}
+
+Bone1{頭
+  0.000000,0.000000,0.000000;
+  0.000000,0.707107,0.000000,0.707107;
+}
+'''
+
+
+class Test_MotionFile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.dir.name) / f'test{motion_file.SUFFIX}'
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_vmd(self):
+        q = glm.angleAxis(math.pi / 2, glm.vec3(0, 0, 1))
+        vmd = Vmd.load('test', vmd_bytes(
+            key_frame('下半身', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('下半身', 30, (10, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 30, (0, 0, 0), (q.x, q.y, q.z, q.w)),
+        ))
+        motion_file.write(self.path, vmd)
+
+        motion = motion_file.load(self.path)
+        self.assertFalse(motion.is_open())
+        self.assertEqual(motion.name, 'test')
+        self.assertEqual(motion.get_frame_count(), 31)
+        self.assertAlmostEqual(motion.get_end_time(), vmd.get_end_time())
+        self.assertEqual(motion.get_humanbones(), vmd.get_humanbones())
+
+        for frame in (0, 10, 30):
+            vmd.set_time(frame / 30)
+            motion.set_time(frame / 30)
+            expected = vmd.get_current_pose()
+            actual = motion.get_current_pose()
+            numpy.testing.assert_array_equal(actual.mask, expected.mask)
+            for humanoid_bone in (HumanoidBone.hips, HumanoidBone.head):
+                self.assertAlmostEqual(glm.distance(
+                    expected.get_translation(humanoid_bone), actual.get_translation(humanoid_bone)), 0, places=5)
+                self.assertAlmostEqual(abs(glm.dot(
+                    expected.get_rotation(humanoid_bone), actual.get_rotation(humanoid_bone))), 1, places=5)
+        self.assertTrue(motion.is_open())
+        self.assertIsInstance(motion.open().rotations, numpy.memmap)
+
+    def test_bvh(self):
+        # bvh は frame 数 x frame time が長さ
+        bvh = bvh_parser.parse(pathlib.Path('test.bvh'), bvh_text(
+            *[(i, 0, 0, 0, 0, 0, 0, 0, 0) for i in range(3)]))
+        motion_file.write(self.path, bvh)
+
+        motion = motion_file.load(self.path)
+        self.assertEqual(motion.get_frame_count(), 3)
+        self.assertAlmostEqual(motion.get_end_time(),
+                               bvh.get_end_time(), places=6)
+
+    def test_vpd(self):
+        vpd = Vpd.load('pose', VPD.encode('cp932'))
+        motion_file.write(self.path, vpd)
+
+        motion = motion_file.load(self.path)
+        self.assertEqual(motion.get_frame_count(), 1)
+        bones = motion.get_current_pose().bones
+        self.assertEqual([bone.humanoid_bone for bone in bones], [
+                         HumanoidBone.hips, HumanoidBone.head])
+        self.assertEqual(bones[0].transform.translation,
+                         vpd.pose.bones[0].transform.translation)
+
+    def test_empty(self):
+        motion_file.write(self.path, Empty())
+
+        motion = motion_file.load(self.path)
+        self.assertEqual(motion.get_frame_count(), 1)
+        self.assertEqual(len(motion.get_current_pose().bones), 0)
+
+    def test_invalid(self):
+        self.path.write_bytes(b'not a motion')
+        with self.assertRaises(motion_file.MotionFileException):
+            motion_file.load(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import random
+import glm
+import numpy
+from formats.node import Node
+from formats.node_array import NodeArray
+from formats.transform import Transform
+
+
+def random_quat() -> glm.quat:
+    return glm.angleAxis(random.uniform(-3, 3), glm.normalize(
+        glm.vec3(random.uniform(-1, 1), random.uniform(-1, 1), random.uniform(-1, 1))))
+
+
+def random_tree(count: int) -> Node:
+    root = Node('root', Transform(glm.vec3(1, 2, 3), random_quat(), glm.vec3(1)))
+    nodes = [root]
+    for i in range(count):
+        node = Node(f'{i}', Transform(glm.vec3(random.uniform(-1, 1), random.uniform(0, 1), 0),
+                                      random_quat(), glm.vec3(random.uniform(0.5, 2))))
+        random.choice(nodes).add_child(node)
+        nodes.append(node)
+    return root
+
+
+def assert_mat4(test: unittest.TestCase, expected: glm.mat4, actual: numpy.ndarray):
+    numpy.testing.assert_allclose(
+        numpy.array(expected.to_list()), actual, atol=1e-4)
+
+
+class Test_NodeArray(unittest.TestCase):
+    def test_world_matrix(self):
+        random.seed(0)
+        root = random_tree(40)
+        root.calc_bind_matrix(glm.mat4())
+        bind = [node.bind_matrix for node, _ in root.traverse_node_and_parent()]
+
+        nodes = NodeArray(root)
+        self.assertEqual(len(nodes), 41)
+        for i, node in enumerate(nodes.nodes):
+            if node.parent:
+                self.assertLess(nodes.parents[i], i)
+                self.assertIs(nodes.nodes[nodes.parents[i]], node.parent)
+
+        nodes.bind_matrices[:] = 0
+        nodes.calc_bind_matrices()
+        for i, node in enumerate(nodes.nodes):
+            assert_mat4(self, bind[i], nodes.bind_matrices[i])
+            assert_mat4(self, bind[i], numpy.array(node.bind_matrix.to_list()))
+
+        for node in nodes.nodes[::3]:
+            node.pose = Transform(glm.vec3(0, 0.1, 0), random_quat(), glm.vec3(1))
+        # 配列を介さない計算
+        root.calc_world_matrix(glm.mat4())
+        expected = [node.world_matrix for node in nodes.nodes]
+        nodes.world_matrices[:] = 0
+        nodes.calc_world_matrices()
+        for i, node in enumerate(nodes.nodes):
+            assert_mat4(self, expected[i], nodes.world_matrices[i])
+            assert_mat4(self, expected[i], numpy.array(node.world_matrix.to_list()))
+
+        # MeshRenderer の skinning 行列
+        skinning = numpy.linalg.inv(nodes.bind_matrices) @ nodes.world_matrices
+        for i, node in enumerate(nodes.nodes):
+            assert_mat4(self, node.skinning_matrix, skinning[i])
+
+        # init_trs の変更も配列に入る
+        node = nodes.nodes[5]
+        node.init_trs = node.init_trs._replace(translation=glm.vec3(0, 5, 0))
+        node.pose = None
+        root.calc_world_matrix(glm.mat4())
+        expected = [node.world_matrix for node in nodes.nodes]
+        nodes.calc_world_matrices()
+        for i in range(len(nodes)):
+            assert_mat4(self, expected[i], nodes.world_matrices[i])
+
+    def test_inverse_bind_matrix(self):
+        random.seed(2)
+        root = random_tree(20)
+        root.calc_bind_matrix(glm.mat4())
+        node = root.children[0]
+        assert_mat4(self, glm.inverse(node.bind_matrix),
+                    numpy.array(node.inverse_bind_matrix.to_list()))
+
+        nodes = NodeArray(root)
+        numpy.testing.assert_allclose(
+            numpy.linalg.inv(nodes.bind_matrices), nodes.inverse_bind_matrices, atol=1e-4)
+        version = nodes.bind_version
+        nodes.calc_bind_matrices()
+        self.assertGreater(nodes.bind_version, version)
+
+        # node から書いても逆行列が更新される
+        version = nodes.bind_version
+        node.bind_matrix = glm.translate(glm.vec3(1, 2, 3))
+        self.assertGreater(nodes.bind_version, version)
+        assert_mat4(self, glm.translate(glm.vec3(-1, -2, -3)),
+                    nodes.inverse_bind_matrices[nodes.index[node]])
+
+    def test_dirty(self):
+        random.seed(1)
+        root = random_tree(40)
+        nodes = NodeArray(root)
+        self.assertTrue(nodes.calc_world_matrices())
+        # 変更なし
+        self.assertFalse(nodes.calc_world_matrices())
+        self.assertFalse(nodes.dirty.any())
+
+        node = nodes.nodes[3]
+        node.pose = Transform(glm.vec3(0, 0.1, 0), random_quat(), glm.vec3(1))
+        subtree = set(x for x, _ in node.traverse_node_and_parent())
+        mask = nodes.get_dirty_mask()
+        for i, n in enumerate(nodes.nodes):
+            self.assertEqual(mask[i], n in subtree)
+
+        # 子孫の外は変わらない
+        before = nodes.world_matrices.copy()
+        self.assertTrue(nodes.calc_world_matrices())
+        actual = nodes.world_matrices.copy()
+        for i in range(len(nodes)):
+            if not mask[i]:
+                numpy.testing.assert_array_equal(before[i], actual[i])
+        # 配列を介さない計算
+        root.calc_world_matrix(glm.mat4())
+        for i, n in enumerate(nodes.nodes):
+            assert_mat4(self, n.world_matrix, actual[i])
+
+
+if __name__ == '__main__':
+    unittest.main()
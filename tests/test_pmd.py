@@ -0,0 +1,69 @@
+import unittest
+import struct
+import ctypes
+import numpy
+from formats.pmd_loader import Pmd, MorphVertex, SCALING_FACTOR
+
+
+def create_pmd(vertices, bones, morphs) -> bytes:
+    '''
+    vertices: (position, bone0, bone1, weight)
+    bones: (name, parent, position)
+    morphs: (name, [(index, position)])
+    '''
+    data = bytearray(b'Pmd') + struct.pack('f', 1.0) + bytes(20 + 256)
+    data += struct.pack('I', len(vertices))
+    for position, bone0, bone1, weight in vertices:
+        data += struct.pack('<8fHHbb', *position, 0, 1, 0, 0.5, 0.5, bone0, bone1, weight, 0)
+    data += struct.pack('I', 3) + struct.pack('3H', 0, 1, 2)
+    data += struct.pack('I', 0)
+    data += struct.pack('H', len(bones))
+    for name, parent, position in bones:
+        data += name.encode('cp932').ljust(20, b'\0')
+        data += struct.pack('<HHbH3f', parent, 0, 0, 0, *position)
+    # ik
+    data += struct.pack('H', 0)
+    data += struct.pack('H', len(morphs))
+    for name, morph_vertices in morphs:
+        data += name.encode('cp932').ljust(20, b'\0')
+        data += struct.pack('<IB', len(morph_vertices), 0)
+        for index, position in morph_vertices:
+            data += struct.pack('<I3f', index, *position)
+    return bytes(data)
+
+
+class Test_Pmd(unittest.TestCase):
+    def test_load(self):
+        vertices = [((1, 2, 3), 0, 1, 100), ((4, 5, 6), 1, 1, 30), ((7, 8, 9), 2, 0, 0)]
+        bones = [('センター', 65535, (0, 10, 0)), ('下半身', 0, (0, 20, 0)), ('上半身', 0, (0, 20, 1))]
+        morphs = [('base', [(0, (0, 0, 0)), (2, (1, 1, 1))]), ('あ', [(1, (0, 0.5, 0))])]
+        pmd = Pmd(create_pmd(vertices, bones, morphs))
+
+        self.assertEqual(len(pmd.vertices), 3)
+        numpy.testing.assert_allclose(
+            tuple(pmd.vertices[1].render.position), numpy.array((4, 5, 6)) * SCALING_FACTOR, rtol=1e-6)
+        self.assertEqual(pmd.vertices[1].option.weight, 30)
+        numpy.testing.assert_allclose(
+            tuple(pmd.bones[2].position), numpy.array((0, 20, 1)) * SCALING_FACTOR, rtol=1e-6)
+        self.assertEqual(pmd.bones[0].parent_index, 65535)
+        self.assertEqual(pmd.deform_bones, {0: 2, 1: 3, 2: 1})
+
+        self.assertEqual([morph.name for morph in pmd.morphs], ['base', 'あ'])
+        self.assertIsNone(pmd.morphs[1]._vertices)
+        # ファイル全体ではなく morph の頂点の分だけ持つ
+        self.assertEqual(len(pmd.morphs[1]._data), ctypes.sizeof(MorphVertex))
+        self.assertEqual(pmd.morphs[1].vertex_count, 1)
+        morph = pmd.morphs[1].vertices
+        self.assertEqual(len(morph), 1)
+        self.assertEqual(morph[0].index, 1)
+        self.assertEqual(tuple(morph[0].position), (0, 0.5, 0))
+        numpy.testing.assert_array_equal(pmd.morphs[0].vertex_array['index'], [0, 2])
+
+        skeleton = Pmd(create_pmd(vertices, bones, morphs), skeleton_only=True)
+        self.assertEqual(len(skeleton.vertices), 0)
+        self.assertEqual(len(skeleton.morphs), 0)
+        numpy.testing.assert_array_equal(skeleton.bone_array, pmd.bone_array)
+
+
+if __name__ == '__main__':
+    unittest.main()
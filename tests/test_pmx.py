@@ -0,0 +1,105 @@
+import unittest
+import struct
+import random
+import numpy
+from formats.pmx_loader import Pmx, SCALING_FACTOR
+
+
+def text(value: str) -> bytes:
+    data = value.encode('utf-16-le')
+    return struct.pack('I', len(data)) + data
+
+
+def create_pmx(vertices, bone_index_size: int, bones=()) -> bytes:
+    '''
+    vertices: (position, normal, uv, deform, bones, weights)
+    bones: (name, position, parent)
+    '''
+    index_format = {1: 'B', 2: 'H', 4: 'i'}[bone_index_size]
+    invalid = {1: 255, 2: 65535, 4: -1}[bone_index_size]
+
+    def index(value: int) -> bytes:
+        return struct.pack(index_format, invalid if value < 0 else value)
+
+    data = bytearray(b'PMX ') + struct.pack('f', 2.0) + bytes([8, 0, 0, 2, bone_index_size, bone_index_size, bone_index_size, 1, 1])
+    data += text('model') + text('model') + text('') + text('')
+    data += struct.pack('I', len(vertices))
+    for position, normal, uv, deform, joints, weights in vertices:
+        data += struct.pack('8f', *position, *normal, *uv)
+        data += bytes([deform])
+        data += b''.join(index(joint) for joint in joints)
+        data += struct.pack(f'{len(weights)}f', *weights)
+        if deform == 3:
+            # SDEF の C, R0, R1
+            data += struct.pack('9f', *range(9))
+        data += struct.pack('f', 1.0)
+    # indices, textures, materials
+    data += struct.pack('I', 3) + struct.pack('3H', 0, 1, 2)
+    data += struct.pack('I', 1) + text('tex.png')
+    data += struct.pack('I', 1) + text('material') + text('material')
+    data += bytes(65) + index(0) + index(-1) + bytes([0, 1, 0]) + text('') + struct.pack('I', 3)
+    # bones
+    data += struct.pack('I', len(bones))
+    for name, position, parent in bones:
+        data += text(name) + text(name) + struct.pack('3f', *position) + index(parent)
+        # transform_layer, flags, tail_position
+        data += struct.pack('<IH3f', 0, 0, 0, 1, 0)
+    return bytes(data)
+
+
+class Test_Pmx(unittest.TestCase):
+    def test_vertices(self):
+        random.seed(0)
+        for bone_index_size in (1, 2, 4):
+            src = []
+            for i in range(64):
+                deform = random.choice([0, 1, 2, 3])
+                bone_count = (1, 2, 4, 2)[deform]
+                bones = [random.randrange(-1, 10) for _ in range(bone_count)]
+                weights = [random.random() for _ in range((0, 1, 4, 1)[deform])]
+                position = [random.uniform(-10, 10) for _ in range(3)]
+                src.append((position, (0, 1, 0), (0.5, 0.25), deform, bones, weights))
+
+            pmx = Pmx(create_pmx(src, bone_index_size))
+            self.assertEqual(len(pmx.vertices), 64)
+            self.assertEqual(list(pmx.indices), [0, 1, 2])
+
+            counts = {}
+            for v, (position, normal, uv, deform, bones, weights) in zip(pmx.vertices, src):
+                numpy.testing.assert_allclose(
+                    (v.position.x, v.position.y, v.position.z),
+                    numpy.array(position) * SCALING_FACTOR, rtol=1e-5)
+                self.assertEqual((v.uv.x, v.uv.y), uv)
+                expected = bones + [-1] * (4 - len(bones))
+                self.assertEqual([v.bone.x, v.bone.y, v.bone.z, v.bone.w], expected)
+                match deform:
+                    case 0:
+                        expected = [1, 0, 0, 0]
+                    case 1 | 3:
+                        expected = [weights[0], 1 - weights[0], 0, 0]
+                    case 2:
+                        expected = weights
+                numpy.testing.assert_allclose(
+                    [v.weight.x, v.weight.y, v.weight.z, v.weight.w], expected, atol=1e-6)
+                for bone in bones:
+                    if bone >= 0:
+                        counts[bone] = counts.get(bone, 0) + 1
+            self.assertEqual(pmx.deform_bones, counts)
+
+    def test_skeleton_only(self):
+        vertices = [((0, 0, 0), (0, 1, 0), (0, 0), 2, [0, 1, 2, 3], [0.25] * 4),
+                    ((0, 1, 0), (0, 1, 0), (0, 0), 3, [1, 0], [0.5])]
+        bones = [('センター', (0, 1, 0), -1), ('下半身', (0, 10, 0), 0)]
+        data = create_pmx(vertices, 2, bones)
+        pmx = Pmx(data)
+        skeleton = Pmx(data, skeleton_only=True)
+        self.assertEqual(len(pmx.vertices), 2)
+        self.assertEqual(len(skeleton.vertices), 0)
+        self.assertEqual(len(skeleton.indices), 0)
+        self.assertEqual([(b.name_ja, tuple(b.position), b.parent_index) for b in skeleton.bones],
+                         [(b.name_ja, tuple(b.position), b.parent_index) for b in pmx.bones])
+        self.assertEqual([b.name_ja for b in skeleton.bones], ['センター', '下半身'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import math
+import glm
+import numpy
+from formats.transform import Transform
+from humanoid.humanoid_bones import HumanoidBone, HUMANOID_BONE_ORDINAL
+from humanoid.pose import Pose, BonePose
+
+
+class Test_Pose(unittest.TestCase):
+    def test_bones(self):
+        q = glm.angleAxis(math.pi / 2, glm.vec3(0, 1, 0))
+        pose = Pose('test')
+        pose.bones.append(BonePose('センター', HumanoidBone.unknown,
+                          Transform.from_translation(glm.vec3(1, 2, 3))))
+        pose.bones.append(BonePose('頭', HumanoidBone.head,
+                          Transform(glm.vec3(0, 1, 0), q, glm.vec3(1))))
+        self.assertEqual(len(pose.bones), 2)
+        self.assertEqual(pose.mask.sum(), 1)
+        self.assertTrue(pose.has(HumanoidBone.head))
+        self.assertFalse(pose.has(HumanoidBone.neck))
+        self.assertAlmostEqual(
+            abs(glm.dot(pose.get_rotation(HumanoidBone.head), q)), 1, places=6)
+        self.assertEqual(pose.get_translation(HumanoidBone.head), glm.vec3(0, 1, 0))
+        self.assertEqual(pose.get_rotation(HumanoidBone.neck), glm.quat())
+
+        # replace
+        pose.bones[1] = pose.bones[1]._replace(
+            transform=Transform.from_rotation(glm.quat()))
+        self.assertEqual(pose.get_rotation(HumanoidBone.head), glm.quat())
+
+        pose.bones = []
+        self.assertFalse(pose.mask.any())
+
+    def test_bone_list(self):
+        def bone(name: str, humanoid_bone: HumanoidBone, y: float) -> BonePose:
+            return BonePose(name, humanoid_bone, Transform.from_translation(glm.vec3(0, y, 0)))
+
+        center = bone('センター', HumanoidBone.unknown, 0)
+        head = bone('頭', HumanoidBone.head, 1)
+        head2 = bone('頭2', HumanoidBone.head, 2)
+        neck = bone('首', HumanoidBone.neck, 3)
+        pose = Pose('test')
+
+        def assert_bones(*bones: BonePose):
+            self.assertEqual(list(pose.bones), list(bones))
+            expected = Pose('expected')
+            for b in bones:
+                expected.bones.append(b)
+            numpy.testing.assert_array_equal(pose.mask, expected.mask)
+            numpy.testing.assert_array_equal(
+                pose.rotations, expected.rotations)
+            numpy.testing.assert_array_equal(
+                pose.translations, expected.translations)
+
+        pose.bones += [center, head]
+        assert_bones(center, head)
+        pose.bones.extend([neck])
+        assert_bones(center, head, neck)
+        # 同じ humanoid bone は最初のもの
+        pose.bones.insert(0, head2)
+        assert_bones(head2, center, head, neck)
+        self.assertEqual(pose.get_translation(HumanoidBone.head), glm.vec3(0, 2, 0))
+        self.assertIs(pose.bones.pop(0), head2)
+        assert_bones(center, head, neck)
+        self.assertEqual(pose.get_translation(HumanoidBone.head), glm.vec3(0, 1, 0))
+        pose.bones.remove(neck)
+        assert_bones(center, head)
+        self.assertFalse(pose.has(HumanoidBone.neck))
+        pose.bones[1] = neck
+        assert_bones(center, neck)
+        self.assertFalse(pose.has(HumanoidBone.head))
+        pose.bones[0:1] = [head2, head]
+        assert_bones(head2, head, neck)
+        del pose.bones[0]
+        assert_bones(head, neck)
+        del pose.bones[:]
+        assert_bones()
+        pose.bones += [head, head2]
+        pose.bones.reverse()
+        assert_bones(head2, head)
+        pose.bones.sort(key=lambda b: b.name)
+        assert_bones(head, head2)
+        pose.bones *= 0
+        assert_bones()
+        pose.bones.append(neck)
+        pose.bones.clear()
+        assert_bones()
+
+    def test_json(self):
+        q = glm.angleAxis(math.pi / 3, glm.vec3(1, 0, 0))
+        src = {'hips': (0, 0, 0, 1), 'leftHand': (q.x, q.y, q.z, q.w)}
+        pose = Pose.from_json('test', src)
+        self.assertAlmostEqual(
+            abs(glm.dot(pose.get_rotation(HumanoidBone.leftHand), q)), 1, places=6)
+        self.assertEqual([bone.humanoid_bone for bone in pose.bones],
+                         [HumanoidBone.hips, HumanoidBone.leftHand])
+        actual = pose.to_json()
+        self.assertEqual(list(actual.keys()), list(src.keys()))
+        numpy.testing.assert_allclose(
+            actual['leftHand'], src['leftHand'], atol=1e-6)
+
+    def test_from_arrays(self):
+        bones = [HumanoidBone.spine, HumanoidBone.hips]
+        rotations = numpy.array([(0, 1, 0, 0), (1, 0, 0, 0)], dtype=numpy.float32)
+        translations = numpy.array([(0, 1, 0), (0, 2, 0)], dtype=numpy.float32)
+        pose = Pose.from_arrays('test', bones, rotations, translations)
+        numpy.testing.assert_array_equal(
+            pose.rotations[HUMANOID_BONE_ORDINAL[HumanoidBone.hips]], (1, 0, 0, 0))
+        self.assertEqual(pose.get_translation(HumanoidBone.spine), glm.vec3(0, 1, 0))
+        # ordinal order
+        self.assertEqual([bone.name for bone in pose.bones], ['hips', 'spine'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+import unittest
+import struct
+import math
+import random
+import glm
+import numpy
+from formats import bezier
+from formats.vmd_loader import Vmd
+from humanoid.baked_motion import BakeCache, bake
+from humanoid.pose import Empty, Pose, BonePose
+from formats.transform import Transform
+from humanoid.humanoid_bones import HumanoidBone, HumanoidBodyParts, get_bone_mask
+
+LINEAR = (20, 20, 107, 107)
+
+
+def interpolation_bytes(*channels) -> bytes:
+    # x, y, z, rotation
+    data = bytearray(64)
+    for c, (x1, y1, x2, y2) in enumerate(channels):
+        data[c] = x1
+        data[4+c] = y1
+        data[8+c] = x2
+        data[12+c] = y2
+    return bytes(data)
+
+
+def key_frame(name: str, frame: int, t, r, interpolation=interpolation_bytes(LINEAR, LINEAR, LINEAR, LINEAR)) -> bytes:
+    return struct.pack('<15sI3f4f64s', name.encode('cp932'), frame, *t, *r, interpolation)
+
+
+def vmd_bytes(*key_frames: bytes) -> bytes:
+    return (b'Vocaloid Motion Data 0002'.ljust(30, b'\0')
+            + b'model'.ljust(20, b'\0')
+            + struct.pack('<I', len(key_frames))
+            + b''.join(key_frames))
+
+
+def slow_bezier(x1, y1, x2, y2, x):
+    # bisection
+    lo = 0.0
+    hi = 1.0
+    for _ in range(64):
+        t = (lo + hi) / 2
+        s = 1 - t
+        if 3*s*s*t*x1 + 3*s*t*t*x2 + t*t*t < x:
+            lo = t
+        else:
+            hi = t
+    s = 1 - t
+    return 3*s*s*t*y1 + 3*s*t*t*y2 + t*t*t
+
+
+class Test_Bezier(unittest.TestCase):
+    def test_decode(self):
+        data = numpy.frombuffer(interpolation_bytes(
+            (1, 2, 3, 4), (5, 6, 7, 8), (9, 10, 11, 12), (13, 14, 15, 16)), dtype=numpy.uint8)
+        cp = bezier.decode_vmd_interpolation(data)
+        self.assertEqual(cp.shape, (1, 4, 4))
+        self.assertEqual(list(cp[0, 2]), [9, 10, 11, 12])
+
+    def test_evaluate(self):
+        cp = numpy.array([[100, 13, 25, 114], [13, 114, 114, 13],
+                          LINEAR, (127, 0, 127, 0)], dtype=numpy.uint8)
+        table = bezier.BezierTable(cp)
+        for x in numpy.linspace(0, 1, 33):
+            for i in range(len(cp)):
+                expected = slow_bezier(*(cp[i] / 127), x)
+                actual = table.evaluate(table.indices[i], x)
+                self.assertAlmostEqual(expected, float(actual), delta=1e-4)
+
+
+class Test_Vmd(unittest.TestCase):
+    def test_set_time(self):
+        # z axis is not changed by reverse_z
+        q = glm.angleAxis(math.pi / 2, glm.vec3(0, 0, 1))
+        ease = interpolation_bytes(
+            (127, 0, 127, 0), LINEAR, LINEAR, (64, 0, 64, 127))
+        vmd = Vmd.load('test', vmd_bytes(
+            key_frame('センター', 30, (10, 0, 0), (0, 0, 0, 1), ease),
+            key_frame('センター', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 30, (0, 0, 0), (q.x, q.y, q.z, q.w)),
+        ))
+        self.assertEqual(vmd.max_frame, 30)
+        self.assertAlmostEqual(vmd.get_end_time(), 1)
+
+        def get(name: str):
+            for bone in vmd.get_current_pose().bones:
+                if bone.name == name:
+                    return bone.transform
+            raise KeyError(name)
+
+        vmd.set_time(0)
+        self.assertAlmostEqual(get('センター').translation.x, 0)
+
+        vmd.set_time(1)
+        self.assertAlmostEqual(get('センター').translation.x, 10, places=5)
+        self.assertAlmostEqual(abs(glm.dot(get('頭').rotation, q)), 1, places=5)
+
+        vmd.set_time(0.5)
+        x = get('センター').translation.x
+        self.assertAlmostEqual(
+            x, 10 * slow_bezier(1, 0, 1, 0, 0.5), delta=1e-3)
+        # linear
+        r = get('頭').rotation
+        expected = glm.slerp(glm.quat(), q, 0.5)
+        self.assertAlmostEqual(abs(glm.dot(r, expected)), 1, places=5)
+
+        # after end
+        vmd.set_time(3)
+        self.assertAlmostEqual(get('センター').translation.x, 10, places=5)
+
+    def test_mask(self):
+        vmd = Vmd.load('test', vmd_bytes(
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('左手首', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('左親指１', 0, (0, 0, 0), (0, 0, 0, 1)),
+        ))
+        parts = vmd.get_humanboneparts()
+        self.assertEqual(parts, HumanoidBodyParts.Trunk |
+                         HumanoidBodyParts.LeftArm | HumanoidBodyParts.LeftFingers)
+        self.assertIs(parts, vmd.get_humanboneparts())
+        mask = vmd.get_bone_mask()
+        self.assertTrue(mask & get_bone_mask([HumanoidBone.leftThumbProximal]))
+        self.assertFalse(mask & get_bone_mask([HumanoidBone.rightThumbProximal]))
+        self.assertEqual(mask, get_bone_mask(vmd.get_humanbones()))
+
+    def test_batch_sampling(self):
+        random.seed(0)
+        keys = []
+        for name in ('センター', '頭', '首', '左腕'):
+            for frame in random.sample(range(100), 12):
+                axis = glm.normalize(
+                    glm.vec3(random.random(), random.random(), random.random()))
+                q = glm.angleAxis(random.uniform(-3, 3), axis)
+                keys.append(key_frame(name, frame, (random.random(), random.random(), random.random()),
+                                      (q.x, q.y, q.z, q.w),
+                                      interpolation_bytes(*[(random.randrange(128), random.randrange(128),
+                                                             random.randrange(128), random.randrange(128)) for _ in range(4)])))
+        vmd = Vmd.load('test', vmd_bytes(*keys))
+
+        # forward playback, then scrubbing
+        frames = [x * 0.5 for x in range(-4, 220)] + \
+            [random.uniform(-10, 110) for _ in range(100)]
+        for frame in frames:
+            vmd.set_time(frame / 30)
+            for i, curve in enumerate(vmd.curves):
+                expected = curve.get_transform(frame).reverse_z()
+                t = vmd.translations[i]
+                self.assertAlmostEqual(
+                    glm.distance(expected.translation, glm.vec3(*t)), 0, places=4)
+                x, y, z, w = vmd.rotations[i]
+                self.assertAlmostEqual(
+                    abs(glm.dot(expected.rotation, glm.quat(w, x, y, z))), 1, places=4)
+
+    def test_load_name_garbage(self):
+        name = 'センター'.encode('cp932')
+        garbage = (name + b'\0').ljust(15, b'\xfd')
+        vmd = Vmd.load('test', vmd_bytes(
+            key_frame('センター', 10, (1, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+            struct.pack('<15sI3f4f64s', garbage, 0, 0, 0,
+                        0, 0, 0, 0, 1, interpolation_bytes(LINEAR, LINEAR, LINEAR, LINEAR)),
+        ))
+        self.assertEqual(['センター', '頭'], [curve.name for curve in vmd.curves])
+        self.assertEqual([0, 10], list(vmd.curves[0].frames))
+
+    def test_no_bone_keys(self):
+        # camera, morph だけの vmd
+        vmd = Vmd.load('camera', vmd_bytes())
+        self.assertEqual(vmd.curves, [])
+        vmd.set_time(0)
+        vmd.set_time(1.5)
+        self.assertEqual(len(vmd.get_current_pose().bones), 0)
+
+
+class Test_BakedMotion(unittest.TestCase):
+    def load(self, name: str) -> Vmd:
+        q = glm.angleAxis(math.pi / 2, glm.vec3(0, 0, 1))
+        return Vmd.load(name, vmd_bytes(
+            key_frame('下半身', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('下半身', 30, (10, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 0, (0, 0, 0), (0, 0, 0, 1)),
+            key_frame('頭', 30, (0, 0, 0), (q.x, q.y, q.z, q.w)),
+            # humanoid でない bone は Pose の配列に入らない
+            key_frame('センター', 0, (0, 0, 0), (0, 0, 0, 1)),
+        ))
+
+    def test_bake(self):
+        vmd = self.load('test')
+        cache = BakeCache()
+        baked = cache.get(vmd)
+        self.assertEqual(len(baked), 31)
+        self.assertEqual(baked.rotations.shape, (31, 3, 4))
+        self.assertEqual(baked.rotations.dtype, numpy.float32)
+        for frame in (0, 7, 15, 30):
+            vmd.set_time(frame / 30)
+            expected = vmd.get_current_pose()
+            actual = baked.get_pose(frame / 30)
+            numpy.testing.assert_array_equal(actual.mask, expected.mask)
+            for humanoid_bone in (HumanoidBone.hips, HumanoidBone.head):
+                self.assertAlmostEqual(glm.distance(
+                    expected.get_translation(humanoid_bone), actual.get_translation(humanoid_bone)), 0, places=5)
+                self.assertAlmostEqual(abs(glm.dot(
+                    expected.get_rotation(humanoid_bone), actual.get_rotation(humanoid_bone))), 1, places=5)
+        self.assertEqual([bone.humanoid_bone for bone in actual.bones],
+                         [HumanoidBone.hips, HumanoidBone.head])
+        # clamp
+        self.assertIs(baked.get_pose(10), baked.get_pose(1))
+
+    def test_lru(self):
+        a = self.load('a')
+        b = self.load('b')
+        c = self.load('c')
+        cache = BakeCache()
+        nbytes = cache.get(a).nbytes
+        cache.set_budget(nbytes * 2)
+        cache.get(b)
+        cache.get(a)
+        cache.get(c)
+        # b is least recently used
+        self.assertIn(a, cache)
+        self.assertNotIn(b, cache)
+        self.assertIn(c, cache)
+        self.assertEqual(cache.nbytes, nbytes * 2)
+        # the last one is kept even if over budget
+        cache.set_budget(0)
+        self.assertEqual(len(cache), 1)
+        self.assertIn(c, cache)
+
+    def test_bones_changed(self):
+        class Changing(Empty):
+            def set_time(self, time_sec: float):
+                self.pose = Pose(self.name)
+                if time_sec > 0:
+                    self.pose.bones.append(BonePose(
+                        '頭', HumanoidBone.head, Transform.identity()))
+
+            def get_end_time(self) -> float:
+                return 1
+
+        with self.assertRaises(ValueError):
+            bake(Changing())
+
+    def test_bake_empty(self):
+        baked = bake(Empty())
+        self.assertEqual(len(baked), 1)
+        self.assertEqual(baked.rotations.shape, (1, 0, 4))
+        self.assertEqual(baked.translations.shape, (1, 0, 3))
+        self.assertEqual(len(baked.get_pose(0).bones), 0)
+
+    def test_use_bake(self):
+        vmd = self.load('test')
+        vmd.set_time(0.5)
+        x = vmd.get_current_pose().get_translation(HumanoidBone.hips).x
+        vmd.use_bake = True
+        vmd.set_time(0.5)
+        self.assertAlmostEqual(
+            vmd.get_current_pose().get_translation(HumanoidBone.hips).x, x, places=5)
+        vmd.use_bake = False
+        vmd.set_time(0.25)
+        self.assertAlmostEqual(
+            vmd.get_current_pose().get_translation(HumanoidBone.hips).x, 2.5, places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()